@@ -0,0 +1,248 @@
+"""
+Скрипт выгрузки данных из PostgreSQL в CSV или Parquet (обратный к migrate_csv_to_postgres.py).
+
+Таблицы читаются серверным курсором (stream_results + yield_per), память не
+зависит от размера таблиц. Все таблицы выгружаются в одной транзакции
+REPEATABLE READ - снимок согласован по внешним ключам.
+
+Инкрементальная выгрузка (--incremental) берёт только строки, изменённые с
+прошлого запуска: водяные знаки по updated_at/last_activity/created_at хранятся
+в файле. Подписки не имеют отметки изменения и выгружаются целиком.
+
+Результат загружается обратно миграцией:
+    python export_postgres_to_csv.py --output data/backup/full
+    python export_postgres_to_csv.py --format parquet --incremental
+    python migrate_csv_to_postgres.py --source data/backup/full
+"""
+import argparse
+import csv
+import enum
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# Добавляем путь к src в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sqlalchemy import func, select
+from sqlalchemy.sql import sqltypes
+
+from src.database.database import get_session
+from src.database.models import User, Payment, Subscription, Invite
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet - опционально
+    pa = None
+    pq = None
+
+WATERMARK_FILE = 'data/.export_watermarks.json'
+DEFAULT_BATCH_SIZE = 10000
+PARQUET_COMPRESSION = 'zstd'
+
+
+class ExportSpec:
+    """Таблица для выгрузки: колонки в формате миграции и колонка водяного знака"""
+
+    def __init__(self, name: str, title: str, model, watermark=None):
+        self.name = name
+        self.title = title
+        self.table = model.__table__
+        # Суррогатный id не выгружаем - записи сопоставляются по естественным ключам
+        self.columns = [column for column in self.table.columns if column.name != 'id']
+        self.watermark = watermark
+
+
+TABLES = [
+    ExportSpec('users', '👥 Пользователи', User, User.last_activity),
+    ExportSpec('payments', '💳 Платежи', Payment, Payment.updated_at),
+    ExportSpec('subscriptions', '📅 Подписки', Subscription),
+    ExportSpec('invites', '🔗 Инвайты', Invite, func.coalesce(Invite.used_at, Invite.created_at)),
+]
+
+
+def load_watermarks(path: str) -> Dict[str, str]:
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_watermarks(path: str, watermarks: Dict[str, str]):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(watermarks, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _csv_value(value):
+    """Значение в том виде, в котором его читает migrate_csv_to_postgres.py"""
+    if value is None:
+        return ''
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def _parquet_value(value):
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def stream_rows(db, spec: ExportSpec, since: Optional[datetime], batch_size: int) -> Iterator[List[tuple]]:
+    """Строки таблицы пачками через серверный курсор"""
+    query = select(*spec.columns)
+    if since is not None and spec.watermark is not None:
+        # >= : строки с тем же временем, что и прошлый знак, выгружаются повторно, миграция их перезапишет
+        query = query.where(spec.watermark >= since)
+
+    result = db.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+    for partition in result.partitions():
+        yield partition
+
+
+class CsvWriter:
+    def __init__(self, path: str, columns: List[str]):
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows: List[tuple]):
+        self.writer.writerows([_csv_value(value) for value in row] for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+def arrow_schema(columns):
+    """Схема Parquet по типам колонок SQLAlchemy"""
+    types = {
+        sqltypes.Integer: pa.int64(),
+        sqltypes.Float: pa.float64(),
+        sqltypes.Boolean: pa.bool_(),
+        sqltypes.DateTime: pa.timestamp('us'),
+        sqltypes.Enum: pa.string(),
+        sqltypes.String: pa.string(),
+    }
+    fields = []
+    for column in columns:
+        arrow_type = next(t for base, t in types.items() if isinstance(column.type, base))
+        fields.append(pa.field(column.name, arrow_type, nullable=column.nullable))
+    return pa.schema(fields)
+
+
+class ParquetWriter:
+    """Каждая пачка курсора - отдельная row group"""
+
+    def __init__(self, path: str, columns):
+        self.columns = [column.name for column in columns]
+        self.schema = arrow_schema(columns)
+        self.writer = pq.ParquetWriter(path, self.schema, compression=PARQUET_COMPRESSION)
+
+    def write(self, rows: List[tuple]):
+        data = {
+            column: [_parquet_value(row[index]) for row in rows]
+            for index, column in enumerate(self.columns)
+        }
+        self.writer.write_table(pa.Table.from_pydict(data, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def export_table(db, spec: ExportSpec, output_dir: str, file_format: str,
+                 since: Optional[datetime], batch_size: int) -> Dict[str, object]:
+    """Выгружает одну таблицу; возвращает количество строк и новый водяной знак"""
+    path = os.path.join(output_dir, f'{spec.name}.{file_format}')
+    if file_format == 'parquet':
+        writer = ParquetWriter(path, spec.columns)
+    else:
+        writer = CsvWriter(path, [column.name for column in spec.columns])
+
+    # Знак берём до чтения строк: всё, что изменится во время выгрузки, попадёт в следующую
+    watermark = db.execute(select(func.max(spec.watermark))).scalar() if spec.watermark is not None else None
+
+    started = time.perf_counter()
+    rows = 0
+    try:
+        for batch in stream_rows(db, spec, since, batch_size):
+            writer.write(batch)
+            rows += len(batch)
+            rate = rows / (time.perf_counter() - started)
+            print(f"   {spec.title}: {rows:,} строк ({rate:,.0f} строк/с)")
+    finally:
+        writer.close()
+
+    print(f"✅ {spec.title}: {rows:,} строк → {path}")
+    return {'rows': rows, 'watermark': watermark}
+
+
+def export_all(output_dir: str, file_format: str = 'csv', incremental: bool = False,
+               watermark_path: str = WATERMARK_FILE, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, int]:
+    """Выгружает все таблицы одним согласованным снимком"""
+    if file_format == 'parquet' and pa is None:
+        raise RuntimeError("Для Parquet установите pyarrow: pip install pyarrow")
+
+    os.makedirs(output_dir, exist_ok=True)
+    watermarks = load_watermarks(watermark_path) if incremental else {}
+    results = {}
+
+    db = get_session()
+    try:
+        if db.get_bind().dialect.name == 'postgresql':
+            db.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+
+        new_watermarks = {}
+        for spec in TABLES:
+            since = watermarks.get(spec.name)
+            exported = export_table(
+                db, spec, output_dir, file_format,
+                datetime.fromisoformat(since) if since else None, batch_size
+            )
+            results[spec.name] = exported['rows']
+            if exported['watermark'] is not None:
+                new_watermarks[spec.name] = exported['watermark'].isoformat()
+            elif since:
+                new_watermarks[spec.name] = since
+        db.commit()
+    finally:
+        db.close()
+
+    save_watermarks(watermark_path, new_watermarks)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Выгрузка данных из PostgreSQL в CSV/Parquet')
+    parser.add_argument('--output', help='Папка выгрузки (по умолчанию data/backup/<дата>)')
+    parser.add_argument('--format', choices=('csv', 'parquet'), default='csv')
+    parser.add_argument('--incremental', action='store_true', help='Только изменения с прошлой выгрузки')
+    parser.add_argument('--watermarks', default=WATERMARK_FILE, help='Файл водяных знаков')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Строк на одну выборку курсора')
+    args = parser.parse_args()
+
+    output_dir = args.output or os.path.join('data', 'backup', datetime.now().strftime('%Y%m%d_%H%M%S'))
+
+    print("=" * 60)
+    print(f"📤 ВЫГРУЗКА ДАННЫХ В {args.format.upper()}{' (ИНКРЕМЕНТАЛЬНАЯ)' if args.incremental else ''}")
+    print("=" * 60)
+
+    started = time.perf_counter()
+    results = export_all(output_dir, args.format, args.incremental, args.watermarks, args.batch_size)
+    duration = time.perf_counter() - started
+
+    print("\n" + "=" * 60)
+    print(f"✅ ВЫГРУЖЕНО {sum(results.values()):,} строк за {duration:.1f} с → {output_dir}")
+    print("=" * 60)
+    print(f"\n💡 Восстановление: python migrate_csv_to_postgres.py --source {output_dir}")
+
+
+if __name__ == '__main__':
+    main()
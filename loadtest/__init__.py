@@ -0,0 +1 @@
+"""Инструменты нагрузочного тестирования бота без обращений к Telegram"""
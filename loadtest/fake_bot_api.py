@@ -0,0 +1,297 @@
+"""
+Локальный фейковый Telegram Bot API (плюс заглушки TronGrid и эквайринга).
+
+Отвечает на запросы бота с настраиваемой задержкой и долей ответов 429,
+хранит исходящие сообщения и очередь апдейтов для getUpdates.
+
+Отдельный запуск (бот подключается через TELEGRAM_API_URL=http://127.0.0.1:8081):
+    python -m loadtest.fake_bot_api --port 8081 --latency-ms 30 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from collections import defaultdict, deque
+from typing import Optional
+
+from aiohttp import web
+
+PAYMENT_ID_RE = re.compile(r'PAY_\d+_\d+')
+
+
+class FakeBotApiState:
+    """Состояние фейкового API: исходящие сообщения, апдейты, «оплаченные» платежи"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, retry_after: int = 1, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+        self.message_ids = itertools.count(1)
+        self.update_ids = itertools.count(1)
+        self.updates: asyncio.Queue = asyncio.Queue()
+
+        self.calls = defaultdict(int)
+        self.throttled = defaultdict(int)
+        self.last_text = {}
+        self.last_payment_id = {}
+        self.invite_links = itertools.count(1)
+
+        # Платежи USDT, которые считаются оплаченными (новые в начале)
+        self.paid = deque()
+        self.started_at = time.time()
+
+    def push_update(self, update: dict):
+        """Кладёт апдейт в очередь getUpdates"""
+        update.setdefault('update_id', next(self.update_ids))
+        self.updates.put_nowait(update)
+
+    def mark_paid(self, payment_id: str, amount_usdt: float = 1_000_000.0, confirmed: bool = True):
+        self.paid.appendleft({
+            'payment_id': payment_id,
+            'amount': amount_usdt,
+            'timestamp': int(time.time() * 1000),
+            'confirmed': confirmed
+        })
+
+    def confirm(self, payment_id: str):
+        for transfer in self.paid:
+            if transfer['payment_id'] == payment_id:
+                transfer['confirmed'] = True
+
+    def _remember_text(self, chat_id: int, text: str):
+        self.last_text[chat_id] = text
+        match = PAYMENT_ID_RE.search(text or '')
+        if match:
+            self.last_payment_id[chat_id] = match.group(0)
+
+
+def _ok(result):
+    return web.json_response({'ok': True, 'result': result})
+
+
+def _message(chat_id: int, message_id: int, text: str) -> dict:
+    return {
+        'message_id': message_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'text': text or ''
+    }
+
+
+async def _read_params(request: web.Request) -> dict:
+    if request.content_type == 'application/json':
+        return await request.json()
+    params = dict(await request.post())
+    if not params:
+        params = dict(request.query)
+    return params
+
+
+async def bot_method(request: web.Request) -> web.Response:
+    state: FakeBotApiState = request.app['state']
+    method = request.match_info['method']
+    params = await _read_params(request)
+    state.calls[method] += 1
+
+    if method != 'getUpdates':
+        delay = state.latency_ms + state.random.uniform(0, state.jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+        if state.error_rate and state.random.random() < state.error_rate:
+            state.throttled[method] += 1
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {state.retry_after}',
+                'parameters': {'retry_after': state.retry_after}
+            })
+
+    handler = METHODS.get(method)
+    if handler is None:
+        return _ok(True)
+    return await handler(state, params)
+
+
+async def get_me(state, params):
+    return _ok({
+        'id': 123456789, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot',
+        'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False
+    })
+
+
+async def get_updates(state, params):
+    timeout = float(params.get('timeout') or 0)
+    limit = int(params.get('limit') or 100)
+    updates = []
+    try:
+        updates.append(await asyncio.wait_for(state.updates.get(), timeout=timeout or 0.01))
+    except asyncio.TimeoutError:
+        return _ok([])
+    while len(updates) < limit and not state.updates.empty():
+        updates.append(state.updates.get_nowait())
+    return _ok(updates)
+
+
+async def send_message(state, params):
+    chat_id = int(params['chat_id'])
+    text = params.get('text', '')
+    state._remember_text(chat_id, text)
+    return _ok(_message(chat_id, next(state.message_ids), text))
+
+
+async def edit_message_text(state, params):
+    chat_id = int(params.get('chat_id') or 0)
+    text = params.get('text', '')
+    state._remember_text(chat_id, text)
+    return _ok(_message(chat_id, int(params.get('message_id') or 0), text))
+
+
+async def create_chat_invite_link(state, params):
+    return _ok({
+        'invite_link': f'https://t.me/+fake{next(state.invite_links):010d}',
+        'creator': {'id': 123456789, 'is_bot': True, 'first_name': 'FakeBot'},
+        'creates_join_request': False,
+        'is_primary': False,
+        'is_revoked': False,
+        'member_limit': int(params.get('member_limit') or 1),
+        'expire_date': int(params.get('expire_date') or 0) or None
+    })
+
+
+async def return_true(state, params):
+    return _ok(True)
+
+
+METHODS = {
+    'getMe': get_me,
+    'getUpdates': get_updates,
+    'sendMessage': send_message,
+    'editMessageText': edit_message_text,
+    'answerCallbackQuery': return_true,
+    'createChatInviteLink': create_chat_invite_link,
+    'approveChatJoinRequest': return_true,
+    'declineChatJoinRequest': return_true,
+    'banChatMember': return_true,
+}
+
+
+async def trongrid_trc20(request: web.Request) -> web.Response:
+    """Заглушка TronGrid: входящие переводы USDT для «оплаченных» платежей, с пагинацией по fingerprint"""
+    state: FakeBotApiState = request.app['state']
+    address = request.match_info['address']
+    limit = min(int(request.query.get('limit', 20)), 200)
+    offset = int(request.query.get('fingerprint') or 0)
+    min_timestamp = int(request.query.get('min_timestamp') or 0)
+    only_confirmed = request.query.get('only_confirmed') == 'true'
+    only_unconfirmed = request.query.get('only_unconfirmed') == 'true'
+
+    transfers = [
+        p for p in state.paid
+        if p['timestamp'] >= min_timestamp
+        and not (only_confirmed and not p['confirmed']) and not (only_unconfirmed and p['confirmed'])
+    ]
+    if request.query.get('order_by') == 'block_timestamp,asc':
+        transfers.reverse()
+    page = transfers[offset:offset + limit]
+
+    data = [
+        {
+            'transaction_id': f"tx_{p['payment_id']}",
+            'token_info': {'symbol': 'USDT', 'decimals': 6},
+            'block_timestamp': p['timestamp'],
+            'from': 'TFakeSenderAddress',
+            'to': address.lower(),
+            'type': 'Transfer',
+            'value': str(int(p['amount'] * 10 ** 6)),
+            'data': p['payment_id'],
+            'confirmed': p['confirmed']
+        }
+        for p in page
+    ]
+    meta = {'at': int(time.time() * 1000), 'page_size': len(data)}
+    if offset + limit < len(transfers):
+        meta['fingerprint'] = str(offset + limit)
+
+    return web.json_response({'data': data, 'success': True, 'meta': meta})
+
+
+async def acquirer_create(request: web.Request) -> web.Response:
+    """Заглушка эквайринга: всегда создаёт платёж"""
+    data = await request.json()
+    order_id = data.get('merchant_order_id')
+    return web.json_response({
+        'success': True,
+        'url': f'https://pay.example.com/{order_id}',
+        'payment_id': f'EXT_{order_id}'
+    })
+
+
+async def push_updates(request: web.Request) -> web.Response:
+    """Кладёт апдейт (или список апдейтов) в очередь getUpdates - для бота в отдельном процессе"""
+    state: FakeBotApiState = request.app['state']
+    payload = await request.json()
+    for update in payload if isinstance(payload, list) else [payload]:
+        state.push_update(update)
+    return web.json_response({'ok': True, 'queued': state.updates.qsize()})
+
+
+async def get_stats(request: web.Request) -> web.Response:
+    state: FakeBotApiState = request.app['state']
+    return web.json_response({'calls': state.calls, 'throttled': state.throttled})
+
+
+def create_app(state: FakeBotApiState) -> web.Application:
+    app = web.Application()
+    app['state'] = state
+    app.router.add_route('*', '/bot{token}/{method}', bot_method)
+    app.router.add_get('/v1/accounts/{address}/transactions/trc20', trongrid_trc20)
+    app.router.add_post('/api/merchant/order/create/by-api', acquirer_create)
+    app.router.add_post('/_updates', push_updates)
+    app.router.add_get('/_stats', get_stats)
+    return app
+
+
+async def start_server(state: FakeBotApiState, host: str = '127.0.0.1', port: int = 0):
+    """Запускает сервер в текущем event loop; возвращает (runner, base_url)"""
+    runner = web.AppRunner(create_app(state), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://{host}:{port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Фейковый Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Задержка ответа')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Случайная добавка к задержке')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+
+    async def run():
+        state = FakeBotApiState(args.latency_ms, args.jitter_ms, args.error_rate, args.retry_after)
+        runner, url = await start_server(state, args.host, args.port)
+        print(f"Фейковый Bot API: {url}")
+        try:
+            while True:
+                await asyncio.sleep(60)
+                print(json.dumps({'calls': state.calls, 'throttled': state.throttled}, ensure_ascii=False))
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Нагрузочный генератор: пользователи проходят сценарий
+/start → тариф → срок → способ оплаты (USDT) → проверка оплаты.
+
+Апдейты подаются прямо в dp.feed_update, исходящие запросы бота уходят
+в локальный фейковый Bot API (он же отвечает за TronGrid и эквайринг).
+
+    python -m loadtest.load_generator --users 2000 --concurrency 200 --latency-ms 20 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import tempfile
+import time
+
+from loadtest.fake_bot_api import FakeBotApiState, start_server
+from loadtest.report import LatencyRecorder, build_report, print_report, save_report
+
+FAKE_TOKEN = '123456789:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA'
+CRYPTO_ADDRESS = 'TFakeShopAddress'
+
+
+def configure_environment(base_url: str):
+    """Переменные окружения для src.* - должны быть заданы до импорта бота"""
+    os.environ['TELEGRAM_API_URL'] = base_url
+    os.environ['TRON_NODE_URL'] = base_url
+    os.environ['ACQUIRING_API_URL'] = base_url
+    os.environ['CRYPTO_PAYMENT_ADDRESS'] = CRYPTO_ADDRESS
+    os.environ['TRONGRID_API_KEY'] = 'fake'
+    # Пользователь проверяет оплату сразу после перевода - журнал догружается на каждом промахе
+    os.environ['TRON_SYNC_MIN_INTERVAL'] = '0'
+    os.environ['TRON_SYNC_OVERLAP'] = '5'
+    os.environ.setdefault('BOT_TOKEN', FAKE_TOKEN)
+    os.environ.setdefault(
+        'DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='loadtest_'), 'loadtest.db')}"
+    )
+
+
+class UpdateFactory:
+    """Собирает сырые апдейты Telegram от имени пользователя"""
+
+    def __init__(self):
+        self.update_ids = itertools.count(1)
+        self.callback_ids = itertools.count(1)
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': 'Load', 'username': f'load_{user_id}'}
+
+    def message(self, user_id: int, text: str) -> dict:
+        return {
+            'update_id': next(self.update_ids),
+            'message': {
+                'message_id': 1,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': self._user(user_id),
+                'text': text
+            }
+        }
+
+    def callback(self, user_id: int, data: str) -> dict:
+        return {
+            'update_id': next(self.update_ids),
+            'callback_query': {
+                'id': str(next(self.callback_ids)),
+                'from': self._user(user_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': {
+                    'message_id': 1,
+                    'date': int(time.time()),
+                    'chat': {'id': user_id, 'type': 'private'},
+                    'text': '...'
+                }
+            }
+        }
+
+
+async def feed(dp, bot, raw_update: dict) -> bool:
+    """Отдаёт апдейт диспетчеру; возвращает False, если обработчик упал"""
+    from aiogram.types import Update
+
+    update = Update.model_validate(raw_update, context={'bot': bot})
+    try:
+        await dp.feed_update(bot, update)
+        return True
+    except Exception:
+        return False
+
+
+async def walk_user(user_id, dp, bot, state, factory, recorder, tariff_id, think_ms):
+    steps = [
+        ('start', lambda: factory.message(user_id, '/start')),
+        ('tariff', lambda: factory.callback(user_id, f'tariff:{tariff_id}')),
+        ('pay', lambda: factory.callback(user_id, f'pay:{tariff_id}:30_days')),
+        ('method', lambda: factory.callback(user_id, f'method:usdt:{tariff_id}:30_days')),
+        ('confirm', None),
+    ]
+
+    for step, make_update in steps:
+        if step == 'confirm':
+            payment_id = state.last_payment_id.get(user_id)
+            if payment_id is None:
+                recorder.add(step, 0.0, error=True)
+                return
+            # Пользователь «оплатил» - перевод появится в заглушке TronGrid
+            state.mark_paid(payment_id)
+            raw_update = factory.callback(user_id, f'confirm:{payment_id}')
+        else:
+            raw_update = make_update()
+
+        start = time.perf_counter()
+        ok = await feed(dp, bot, raw_update)
+        recorder.add(step, (time.perf_counter() - start) * 1000, error=not ok)
+
+        if think_ms:
+            await asyncio.sleep(think_ms / 1000)
+
+
+async def run(args) -> dict:
+    state = FakeBotApiState(args.latency_ms, args.jitter_ms, args.error_rate, args.retry_after, seed=args.seed)
+    runner, base_url = await start_server(state)
+    configure_environment(base_url)
+
+    from src.bot import bot, dp
+    from src.database.database import init_db
+    from src import handlers  # noqa: F401 - регистрация обработчиков
+
+    init_db()
+
+    recorder = LatencyRecorder()
+    factory = UpdateFactory()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    first_user_id = args.first_user_id or int(time.time()) * 1000
+
+    async def limited(user_id):
+        async with semaphore:
+            await walk_user(user_id, dp, bot, state, factory, recorder, args.tariff, args.think_ms)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(first_user_id + i) for i in range(args.users)))
+    duration = time.perf_counter() - started
+
+    confirmed = sum(
+        1 for i in range(args.users)
+        if 'Оплата подтверждена' in state.last_text.get(first_user_id + i, '')
+    )
+
+    await bot.session.close()
+    await runner.cleanup()
+
+    return build_report(
+        recorder, duration,
+        users=args.users,
+        confirmed=confirmed,
+        telegram_calls=dict(state.calls),
+        throttled=dict(state.throttled)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон сценария оплаты')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=100, help='Одновременно активных пользователей')
+    parser.add_argument('--tariff', default='basic_1')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='Пауза пользователя между шагами')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Задержка фейкового Bot API')
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--first-user-id', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Сохранить отчёт в JSON')
+    parser.add_argument('--log-level', default='ERROR', help='Уровень логов бота во время прогона')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    save_report(report, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Воспроизведение записанных апдейтов (RECORD_UPDATES_FILE) против локальной БД
+и фейкового Bot API.
+
+Апдейты подаются в dp.feed_update с исходными интервалами, ускоренными в N раз,
+или без пауз (--speed 0). Апдейты одного пользователя обрабатываются строго
+по порядку, разных - параллельно, как при обычном поллинге.
+
+    python -m loadtest.replay logs/updates.jsonl.gz --speed 10 --json new.json
+    python -m loadtest.replay logs/updates.jsonl.gz --speed 0 --compare base.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Iterator, Optional
+
+from loadtest.fake_bot_api import FakeBotApiState, start_server
+from loadtest.load_generator import configure_environment, feed
+from loadtest.report import (
+    LatencyRecorder, build_report, diff_reports, load_report, percentile, print_diff, print_report, save_report
+)
+
+
+def read_records(path: str) -> Iterator[dict]:
+    """Читает записи {ts, update} из gzip JSONL (или обычного JSONL)"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def classify(update: dict) -> str:
+    """Шаг отчёта по типу апдейта: команда, префикс callback_data или тип"""
+    if 'message' in update:
+        text = update['message'].get('text') or ''
+        return text.split()[0] if text.startswith('/') else 'message'
+    if 'callback_query' in update:
+        return (update['callback_query'].get('data') or '').split(':')[0] or 'callback'
+    return next((key for key in update if key != 'update_id'), 'unknown')
+
+
+def sender_id(update: dict) -> Optional[int]:
+    for key in ('message', 'callback_query', 'chat_member', 'my_chat_member', 'chat_join_request'):
+        event = update.get(key)
+        if event:
+            return (event.get('from') or {}).get('id')
+    return None
+
+
+def prepare_confirm(update: dict, state: FakeBotApiState):
+    """
+    Платёж при воспроизведении создаётся заново, поэтому payment_id в кнопке
+    «Проверить оплату» подменяется на выданный в этом прогоне и помечается оплаченным
+    """
+    callback = update.get('callback_query') or {}
+    if not (callback.get('data') or '').startswith('confirm:'):
+        return
+    payment_id = state.last_payment_id.get(callback['from']['id'])
+    if payment_id:
+        callback['data'] = f'confirm:{payment_id}'
+        state.mark_paid(payment_id)
+
+
+async def replay(records, dp, bot, state, speed: float, recorder: LatencyRecorder, lags: list):
+    user_locks = defaultdict(asyncio.Lock)
+    tasks = []
+
+    async def handle(update: dict, lock: asyncio.Lock):
+        async with lock:
+            prepare_confirm(update, state)
+            start = time.perf_counter()
+            ok = await feed(dp, bot, update)
+            recorder.add(classify(update), (time.perf_counter() - start) * 1000, error=not ok)
+
+    first_ts = None
+    started = time.perf_counter()
+    for record in records:
+        update = record['update']
+        if speed:
+            first_ts = record['ts'] if first_ts is None else first_ts
+            due = (record['ts'] - first_ts) / speed
+            delay = due - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(-delay, 0) * 1000)
+
+        # Lock берётся в порядке создания задач - порядок апдейтов пользователя сохраняется
+        lock = user_locks[sender_id(update)] if sender_id(update) is not None else asyncio.Lock()
+        tasks.append(asyncio.create_task(handle(update, lock)))
+        await asyncio.sleep(0)
+
+    await asyncio.gather(*tasks)
+
+
+async def run(args) -> dict:
+    state = FakeBotApiState(args.latency_ms, args.jitter_ms, args.error_rate, args.retry_after, seed=args.seed)
+    runner, base_url = await start_server(state)
+    configure_environment(base_url)
+
+    from src.bot import bot, dp
+    from src.database.database import init_db
+    from src import handlers  # noqa: F401 - регистрация обработчиков
+
+    init_db()
+
+    recorder = LatencyRecorder()
+    lags = []
+    started = time.perf_counter()
+    await replay(read_records(args.file), dp, bot, state, args.speed, recorder, lags)
+    duration = time.perf_counter() - started
+
+    await bot.session.close()
+    await runner.cleanup()
+
+    lags.sort()
+    return build_report(
+        recorder, duration,
+        source=args.file,
+        speed=args.speed or 'max',
+        schedule_lag_p99_ms=round(percentile(lags, 99), 2),
+        telegram_calls=dict(state.calls),
+        throttled=dict(state.throttled)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизведение записанных апдейтов')
+    parser.add_argument('file', help='Файл записи (RECORD_UPDATES_FILE)')
+    parser.add_argument('--speed', type=float, default=1.0, help='Ускорение: 1 - реальное время, 0 - без пауз')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Задержка фейкового Bot API')
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Сохранить отчёт в JSON')
+    parser.add_argument('--compare', help='Отчёт предыдущей сборки для сравнения')
+    parser.add_argument('--log-level', default='ERROR', help='Уровень логов бота во время прогона')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    save_report(report, args.json)
+
+    if args.compare:
+        print()
+        print_diff(diff_reports(load_report(args.compare), report))
+
+
+if __name__ == '__main__':
+    main()
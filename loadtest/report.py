@@ -0,0 +1,124 @@
+"""Отчёт нагрузочного прогона: пропускная способность и перцентили задержек по шагам"""
+import json
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(q / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class LatencyRecorder:
+    """Копит задержки (мс) и ошибки по шагам"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def add(self, step: str, latency_ms: float, error: bool = False):
+        self.latencies[step].append(latency_ms)
+        if error:
+            self.errors[step] += 1
+
+    def summary(self) -> Dict[str, dict]:
+        result = {}
+        for step, values in self.latencies.items():
+            values = sorted(values)
+            result[step] = {
+                'count': len(values),
+                'errors': self.errors.get(step, 0),
+                'p50_ms': round(percentile(values, 50), 2),
+                'p90_ms': round(percentile(values, 90), 2),
+                'p99_ms': round(percentile(values, 99), 2),
+                'max_ms': round(values[-1], 2) if values else 0.0,
+            }
+        return result
+
+
+def build_report(recorder: LatencyRecorder, duration_s: float, **extra) -> dict:
+    steps = recorder.summary()
+    updates = sum(step['count'] for step in steps.values())
+    report = {
+        'updates': updates,
+        'duration_s': round(duration_s, 3),
+        'updates_per_sec': round(updates / duration_s, 1) if duration_s else 0.0,
+        'steps': steps,
+    }
+    report.update(extra)
+    return report
+
+
+def print_report(report: dict):
+    print(f"Апдейтов: {report['updates']} за {report['duration_s']} с "
+          f"({report['updates_per_sec']} апдейтов/с)")
+    print(f"{'шаг':<14}{'кол-во':>8}{'ошибок':>8}{'p50, мс':>10}{'p90, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    for step, s in report['steps'].items():
+        print(f"{step:<14}{s['count']:>8}{s['errors']:>8}{s['p50_ms']:>10}{s['p90_ms']:>10}"
+              f"{s['p99_ms']:>10}{s['max_ms']:>10}")
+    for key, value in report.items():
+        if key not in ('updates', 'duration_s', 'updates_per_sec', 'steps'):
+            print(f"{key}: {value}")
+
+
+def save_report(report: dict, path: Optional[str]):
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def load_report(path: str) -> dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _change(old: float, new: float) -> str:
+    if not old:
+        return '—'
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def diff_reports(base: dict, new: dict) -> dict:
+    """Сравнение двух отчётов (например, прогонов одной записи на разных сборках)"""
+    steps = {}
+    for step in sorted(set(base['steps']) | set(new['steps'])):
+        old_step = base['steps'].get(step, {})
+        new_step = new['steps'].get(step, {})
+        steps[step] = {
+            metric: (old_step.get(metric, 0), new_step.get(metric, 0))
+            for metric in ('count', 'errors', 'p50_ms', 'p90_ms', 'p99_ms')
+        }
+    return {
+        'updates_per_sec': (base['updates_per_sec'], new['updates_per_sec']),
+        'steps': steps,
+    }
+
+
+def print_diff(diff: dict):
+    old, new = diff['updates_per_sec']
+    print(f"Апдейтов/с: {old} → {new} ({_change(old, new)})")
+    print(f"{'шаг':<14}{'ошибок':>12}{'p50, мс':>30}{'p99, мс':>30}")
+    for step, m in diff['steps'].items():
+        errors = f"{m['errors'][0]}→{m['errors'][1]}"
+        p50 = f"{m['p50_ms'][0]}→{m['p50_ms'][1]} ({_change(*m['p50_ms'])})"
+        p99 = f"{m['p99_ms'][0]}→{m['p99_ms'][1]} ({_change(*m['p99_ms'])})"
+        print(f"{step:<14}{errors:>12}{p50:>30}{p99:>30}")
+
+
+def main():
+    """python -m loadtest.report base.json new.json - сравнить два отчёта"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Сравнение отчётов нагрузочных прогонов')
+    parser.add_argument('base', help='Отчёт базовой сборки')
+    parser.add_argument('new', help='Отчёт новой сборки')
+    args = parser.parse_args()
+
+    print_diff(diff_reports(load_report(args.base), load_report(args.new)))
+
+
+if __name__ == '__main__':
+    main()
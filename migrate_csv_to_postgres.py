@@ -1,200 +1,520 @@
-"""Скрипт миграции данных из CSV в PostgreSQL"""
+"""
+Скрипт миграции данных из CSV в PostgreSQL.
+
+Файлы читаются потоково, пачками по --chunk-size строк. В PostgreSQL пачка
+заливается через COPY во временную таблицу и переносится одним
+INSERT ... ON CONFLICT, в остальных СУБД - пакетными executemany-апсертами.
+Каждая пачка коммитится отдельно, прогресс пишется в файл чекпоинта, поэтому
+упавший запуск продолжается с места остановки. Повторная загрузка тех же строк
+безопасна - записи обновляются по естественному ключу.
+
+Папка выгрузки export_postgres_to_csv.py (CSV или Parquet) загружается через
+--source.
+
+Порядок с учётом внешних ключей: пользователи, затем параллельно платежи и
+инвайты, подписки - как только загружены платежи.
+
+    python migrate_csv_to_postgres.py --chunk-size 20000
+    python migrate_csv_to_postgres.py --restart     # начать заново, игнорируя чекпоинт
+    python migrate_csv_to_postgres.py --source data/backup/20240101_120000
+"""
+import argparse
+import copy
 import csv
+import io
+import json
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
 
 # Добавляем путь к src в PYTHONPATH
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.database.database import init_db, get_db
+from sqlalchemy import bindparam, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.database.database import init_db, get_engine, get_session
+from src.database.partitions import is_partitioned
 from src.database.models import User, Payment, Subscription, Invite, PaymentStatus, PaymentMethod, SubscriptionStatus
 from src.config import USERS_DB, PAYMENTS_DB, SUBSCRIPTIONS_DB, INVITES_DB
 
+CHECKPOINT_FILE = 'data/.migration_checkpoint.json'
+DEFAULT_CHUNK_SIZE = 10000
+
+# Маркер NULL в потоке COPY
+COPY_NULL = '\\N'
+
+# Сколько ошибочных строк каждой таблицы выводить подробно
+MAX_REPORTED_ERRORS = 10
+
 
 def parse_datetime(date_str: str) -> datetime:
     """Парсит дату из строки"""
+    if isinstance(date_str, datetime):
+        # Parquet хранит даты нативно
+        return date_str
     try:
         return datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
     except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(date_str)
+    except (TypeError, ValueError):
         return datetime.utcnow()
 
 
-def migrate_users():
-    """Миграция пользователей"""
-    if not os.path.exists(USERS_DB):
-        print(f"⚠️  Файл {USERS_DB} не найден, пропускаем пользователей")
-        return
-    
-    with get_db() as db:
-        with open(USERS_DB, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            count = 0
-            
-            for row in reader:
-                try:
-                    user = User(
-                        user_id=int(row['user_id']),
-                        username=row.get('username', ''),
-                        registration_date=parse_datetime(row.get('registration_date', '')),
-                        last_activity=parse_datetime(row.get('last_activity', ''))
-                    )
-                    db.add(user)
-                    count += 1
-                except Exception as e:
-                    print(f"❌ Ошибка при миграции пользователя {row.get('user_id')}: {e}")
-            
-            print(f"✅ Мигрировано пользователей: {count}")
-
-
-def migrate_payments():
-    """Миграция платежей"""
-    if not os.path.exists(PAYMENTS_DB):
-        print(f"⚠️  Файл {PAYMENTS_DB} не найден, пропускаем платежи")
-        return
-    
-    with get_db() as db:
-        with open(PAYMENTS_DB, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            count = 0
-            
-            for row in reader:
-                try:
-                    # Конвертируем метод оплаты
-                    method_str = row.get('method', 'card').lower()
-                    if 'usdt' in method_str:
-                        method = PaymentMethod.USDT
-                    elif 'сбп' in method_str or 'sbp' in method_str:
-                        method = PaymentMethod.SBP
-                    else:
-                        method = PaymentMethod.CARD
-                    
-                    # Конвертируем статус
-                    status_str = row.get('status', 'pending').lower()
-                    if 'completed' in status_str or 'success' in status_str:
-                        status = PaymentStatus.COMPLETED
-                    elif 'failed' in status_str:
-                        status = PaymentStatus.FAILED
-                    elif 'cancelled' in status_str:
-                        status = PaymentStatus.CANCELLED
-                    else:
-                        status = PaymentStatus.PENDING
-                    
-                    payment = Payment(
-                        user_id=int(row['user_id']),
-                        payment_id=row['payment_id'],
-                        external_id=row.get('external_id', ''),
-                        tariff=row.get('tariff', ''),
-                        amount=float(row.get('amount', 0)),
-                        status=status,
-                        method=method,
-                        payment_date=parse_datetime(row.get('payment_date', ''))
-                    )
-                    db.add(payment)
-                    count += 1
-                except Exception as e:
-                    print(f"❌ Ошибка при миграции платежа {row.get('payment_id')}: {e}")
-            
-            print(f"✅ Мигрировано платежей: {count}")
-
-
-def migrate_subscriptions():
-    """Миграция подписок"""
-    if not os.path.exists(SUBSCRIPTIONS_DB):
-        print(f"⚠️  Файл {SUBSCRIPTIONS_DB} не найден, пропускаем подписки")
+def parse_optional_datetime(date_str: Optional[str]) -> Optional[datetime]:
+    return parse_datetime(date_str) if date_str else None
+
+
+def parse_optional_int(value) -> Optional[int]:
+    """Пустая строка CSV или None из Parquet - NULL"""
+    return int(value) if value not in (None, '') else None
+
+
+# ПРЕОБРАЗОВАНИЕ СТРОК
+
+def convert_user(row: dict) -> dict:
+    return {
+        'user_id': int(row['user_id']),
+        'username': row.get('username', ''),
+        'registration_date': parse_datetime(row.get('registration_date', '')),
+        'last_activity': parse_datetime(row.get('last_activity', ''))
+    }
+
+
+def convert_payment(row: dict) -> dict:
+    # Конвертируем метод оплаты
+    method_str = row.get('method', 'card').lower()
+    if 'usdt' in method_str:
+        method = PaymentMethod.USDT
+    elif 'сбп' in method_str or 'sbp' in method_str:
+        method = PaymentMethod.SBP
+    else:
+        method = PaymentMethod.CARD
+
+    # Конвертируем статус
+    status_str = row.get('status', 'pending').lower()
+    if 'completed' in status_str or 'success' in status_str:
+        status = PaymentStatus.COMPLETED
+    elif 'failed' in status_str:
+        status = PaymentStatus.FAILED
+    elif 'cancelled' in status_str:
+        status = PaymentStatus.CANCELLED
+    else:
+        status = PaymentStatus.PENDING
+
+    payment_date = parse_datetime(row.get('payment_date', ''))
+    return {
+        'user_id': int(row['user_id']),
+        'payment_id': row['payment_id'],
+        'external_id': row.get('external_id', ''),
+        'tariff': row.get('tariff', ''),
+        'amount': float(row.get('amount', 0)),
+        'status': status,
+        'method': method,
+        'payment_date': payment_date,
+        'updated_at': parse_optional_datetime(row.get('updated_at')) or payment_date
+    }
+
+
+def convert_subscription(row: dict) -> dict:
+    status_str = row.get('status', 'active').lower()
+    if 'expired' in status_str:
+        status = SubscriptionStatus.EXPIRED
+    elif 'cancelled' in status_str:
+        status = SubscriptionStatus.CANCELLED
+    else:
+        status = SubscriptionStatus.ACTIVE
+
+    return {
+        'user_id': int(row['user_id']),
+        'payment_id': row.get('payment_id', ''),
+        'tariff': row.get('tariff', ''),
+        'start_date': parse_datetime(row.get('start_date', '')),
+        'end_date': parse_datetime(row.get('end_date', '')),
+        'status': status
+    }
+
+
+def convert_invite(row: dict) -> dict:
+    return {
+        # Свободная ссылка пула выгружается без user_id
+        'user_id': parse_optional_int(row.get('user_id')),
+        'chat_id': int(row['chat_id']),
+        'invite_link': row['invite_link'],
+        'is_used': str(row.get('is_used', 'False')).lower() == 'true',
+        'created_at': parse_datetime(row.get('created_at', '')),
+        'used_at': parse_optional_datetime(row.get('used_at')),
+        'expires_at': parse_optional_datetime(row.get('expires_at')),
+        'assigned_at': parse_optional_datetime(row.get('assigned_at'))
+    }
+
+
+class TableSpec:
+    """Описание загрузки таблицы: файл, преобразование строк и ключ для апсерта"""
+
+    def __init__(self, name: str, title: str, model, path: str, convert: Callable[[dict], dict],
+                 key: str, unique_key: bool = True):
+        self.name = name
+        self.title = title
+        self.table = model.__table__
+        self.path = path
+        self.convert = convert
+        self.key = key
+        # Для ключа без UNIQUE-ограничения (subscriptions.payment_id) ON CONFLICT недоступен
+        self.unique_key = unique_key
+
+    def with_path(self, path: str) -> 'TableSpec':
+        """Та же таблица, но из другого файла"""
+        spec = copy.copy(self)
+        spec.path = path
+        return spec
+
+
+TABLES = {
+    'users': TableSpec('users', '👥 Пользователи', User, USERS_DB, convert_user, 'user_id'),
+    'payments': TableSpec('payments', '💳 Платежи', Payment, PAYMENTS_DB, convert_payment, 'payment_id'),
+    'subscriptions': TableSpec('subscriptions', '📅 Подписки', Subscription, SUBSCRIPTIONS_DB,
+                               convert_subscription, 'payment_id', unique_key=False),
+    'invites': TableSpec('invites', '🔗 Инвайты', Invite, INVITES_DB, convert_invite, 'invite_link'),
+}
+
+
+# ЧЕКПОИНТ
+
+class Checkpoint:
+    """
+    Сколько строк каждого файла уже загружено.
+    Привязан к размеру файла: если файл изменился, таблица грузится заново.
+    """
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = {}
+        if not restart and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    def rows_done(self, spec: TableSpec) -> int:
+        entry = self.state.get(spec.name)
+        if not entry or entry.get('source') != spec.path or entry.get('size') != os.path.getsize(spec.path):
+            return 0
+        return entry['rows']
+
+    def is_finished(self, spec: TableSpec) -> bool:
+        return self.rows_done(spec) > 0 and self.state[spec.name].get('finished', False)
+
+    def save(self, spec: TableSpec, rows: int, finished: bool = False):
+        with self.lock:
+            self.state[spec.name] = {
+                'source': spec.path,
+                'size': os.path.getsize(spec.path),
+                'rows': rows,
+                'finished': finished
+            }
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ЗАГРУЗКА
+
+def read_chunks(path: str, chunk_size: int, skip: int = 0) -> Iterator[List[dict]]:
+    """Потоково читает CSV (или Parquet) пачками по chunk_size строк, пропуская первые skip"""
+    if path.endswith('.parquet'):
+        yield from read_parquet_chunks(path, chunk_size, skip)
         return
-    
-    with get_db() as db:
-        with open(SUBSCRIPTIONS_DB, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            count = 0
-            
-            for row in reader:
-                try:
-                    status_str = row.get('status', 'active').lower()
-                    if 'expired' in status_str:
-                        status = SubscriptionStatus.EXPIRED
-                    elif 'cancelled' in status_str:
-                        status = SubscriptionStatus.CANCELLED
-                    else:
-                        status = SubscriptionStatus.ACTIVE
-                    
-                    subscription = Subscription(
-                        user_id=int(row['user_id']),
-                        payment_id=row.get('payment_id', ''),
-                        tariff=row.get('tariff', ''),
-                        start_date=parse_datetime(row.get('start_date', '')),
-                        end_date=parse_datetime(row.get('end_date', '')),
-                        status=status
-                    )
-                    db.add(subscription)
-                    count += 1
-                except Exception as e:
-                    print(f"❌ Ошибка при миграции подписки для {row.get('user_id')}: {e}")
-            
-            print(f"✅ Мигрировано подписок: {count}")
-
-
-def migrate_invites():
-    """Миграция инвайтов"""
-    if not os.path.exists(INVITES_DB):
-        print(f"⚠️  Файл {INVITES_DB} не найден, пропускаем инвайты")
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        chunk = []
+        for index, row in enumerate(reader):
+            if index < skip:
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def read_parquet_chunks(path: str, chunk_size: int, skip: int = 0) -> Iterator[List[dict]]:
+    """Parquet из export_postgres_to_csv.py, читается по row group'ам"""
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        rows = batch.to_pylist()
+        if skip >= len(rows):
+            skip -= len(rows)
+            continue
+        yield rows[skip:]
+        skip = 0
+
+
+def tables_from_dir(source_dir: str) -> Dict[str, TableSpec]:
+    """Таблицы из папки выгрузки: <таблица>.parquet или <таблица>.csv"""
+    tables = {}
+    for name, spec in TABLES.items():
+        parquet_path = os.path.join(source_dir, f'{name}.parquet')
+        path = parquet_path if os.path.exists(parquet_path) else os.path.join(source_dir, f'{name}.csv')
+        tables[name] = spec.with_path(path)
+    return tables
+
+
+def _dedupe(spec: TableSpec, rows: List[dict]) -> List[dict]:
+    """Оставляет последнюю версию каждой записи внутри пачки"""
+    return list({row[spec.key]: row for row in rows}.values())
+
+
+def _copy_value(value):
+    if isinstance(value, (PaymentStatus, PaymentMethod, SubscriptionStatus)):
+        # SQLEnum хранит в PostgreSQL имена членов перечисления
+        return value.name
+    return value
+
+
+def load_chunk_copy(db, spec: TableSpec, rows: List[dict]):
+    """PostgreSQL: COPY во временную таблицу и перенос одним INSERT ... SELECT"""
+    columns = list(rows[0])
+    column_list = ', '.join(columns)
+    tmp = f'tmp_migrate_{spec.name}'
+
+    buffer = io.StringIO()
+    # Все строки в кавычках, чтобы пустая строка не превратилась в NULL
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        writer.writerow([COPY_NULL if row[column] is None else _copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+
+    connection = db.connection()
+    connection.exec_driver_sql(
+        f'CREATE TEMP TABLE {tmp} ON COMMIT DROP AS SELECT {column_list} FROM {spec.name} WITH NO DATA'
+    )
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {tmp} ({column_list}) FROM STDIN "
+            f"WITH (FORMAT csv, NULL '{COPY_NULL}', FORCE_NULL ({column_list}))",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+    updates = [column for column in columns if column != spec.key]
+    if spec.unique_key:
+        assignments = ', '.join(f'{column} = EXCLUDED.{column}' for column in updates)
+        connection.exec_driver_sql(
+            f'INSERT INTO {spec.name} ({column_list}) '
+            f'SELECT DISTINCT ON ({spec.key}) {column_list} FROM {tmp} ORDER BY {spec.key} '
+            f'ON CONFLICT ({spec.key}) DO UPDATE SET {assignments}'
+        )
+    else:
+        assignments = ', '.join(f'{column} = t.{column}' for column in updates)
+        connection.exec_driver_sql(
+            f'UPDATE {spec.name} AS s SET {assignments} FROM {tmp} AS t WHERE s.{spec.key} = t.{spec.key}'
+        )
+        connection.exec_driver_sql(
+            f'INSERT INTO {spec.name} ({column_list}) '
+            f'SELECT DISTINCT ON ({spec.key}) {column_list} FROM {tmp} AS t '
+            f'WHERE NOT EXISTS (SELECT 1 FROM {spec.name} AS s WHERE s.{spec.key} = t.{spec.key}) '
+            f'ORDER BY {spec.key}'
+        )
+
+
+def load_chunk_executemany(db, spec: TableSpec, rows: List[dict]):
+    """Любая СУБД: существующие записи обновляются, новые вставляются, оба шага пакетно"""
+    rows = _dedupe(spec, rows)
+    key_column = spec.table.c[spec.key]
+    existing = set(db.execute(select(key_column).where(key_column.in_([row[spec.key] for row in rows]))).scalars())
+
+    to_update = [row for row in rows if row[spec.key] in existing]
+    to_insert = [row for row in rows if row[spec.key] not in existing]
+
+    if to_update:
+        columns = [column for column in to_update[0] if column != spec.key]
+        statement = (
+            spec.table.update()
+            .where(key_column == bindparam('_key'))
+            .values({column: bindparam(column) for column in columns})
+        )
+        db.execute(statement, [dict(row, _key=row[spec.key]) for row in to_update])
+    if to_insert:
+        db.execute(spec.table.insert(), to_insert)
+
+
+def _load_rows_one_by_one(spec: TableSpec, rows: List[dict], errors: List[str]) -> int:
+    """Пачка не загрузилась целиком - грузим построчно, чтобы отсеять только плохие строки"""
+    loaded = 0
+    for row in rows:
+        db = get_session()
+        try:
+            load_chunk_executemany(db, spec, [row])
+            db.commit()
+            loaded += 1
+        except SQLAlchemyError as e:
+            db.rollback()
+            errors.append(f"{row.get(spec.key)}: {str(e).splitlines()[0]}")
+        finally:
+            db.close()
+    return loaded
+
+
+def migrate_table(spec: TableSpec, checkpoint: Checkpoint, chunk_size: int) -> Dict[str, int]:
+    """Загружает одну таблицу пачками; возвращает счётчики"""
+    stats = {'loaded': 0, 'skipped': 0}
+    if not os.path.exists(spec.path):
+        print(f"⚠️  Файл {spec.path} не найден, пропускаем {spec.name}")
+        return stats
+    if checkpoint.is_finished(spec):
+        print(f"⏭  {spec.title}: уже загружены по чекпоинту")
+        return stats
+
+    done = checkpoint.rows_done(spec)
+    if done:
+        print(f"↪️  {spec.title}: продолжаем с строки {done:,}")
+
+    errors: List[str] = []
+    started = time.perf_counter()
+    processed = 0
+
+    for raw_rows in read_chunks(spec.path, chunk_size, skip=done):
+        rows = []
+        for raw in raw_rows:
+            try:
+                rows.append(spec.convert(raw))
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append(f"{raw.get(spec.key)}: {e!r}")
+
+        if rows:
+            db = get_session()
+            dialect = db.get_bind().dialect
+            try:
+                if dialect.name == 'postgresql':
+                    load_chunk_copy(db, spec, rows)
+                else:
+                    load_chunk_executemany(db, spec, rows)
+                db.commit()
+                stats['loaded'] += len(rows)
+            except (SQLAlchemyError, dialect.loaded_dbapi.Error):
+                # COPY идёт напрямую через драйвер, его ошибки SQLAlchemy не оборачивает
+                db.rollback()
+                stats['loaded'] += _load_rows_one_by_one(spec, rows, errors)
+            finally:
+                db.close()
+
+        done += len(raw_rows)
+        processed += len(raw_rows)
+        checkpoint.save(spec, done)
+
+        rate = processed / (time.perf_counter() - started)
+        print(f"   {spec.title}: {done:,} строк ({rate:,.0f} строк/с)")
+
+    checkpoint.save(spec, done, finished=True)
+    stats['skipped'] = len(errors)
+
+    for error in errors[:MAX_REPORTED_ERRORS]:
+        print(f"❌ {spec.name} {error}")
+    if len(errors) > MAX_REPORTED_ERRORS:
+        print(f"❌ ... и ещё {len(errors) - MAX_REPORTED_ERRORS} ошибок в {spec.name}")
+
+    print(f"✅ {spec.title}: загружено {stats['loaded']:,}, пропущено {stats['skipped']:,}")
+    return stats
+
+
+def ensure_payments_not_partitioned():
+    """
+    Загрузка опирается на ON CONFLICT (payment_id) и внешний ключ подписок на
+    платежи - в секционированной payments (src.database.partitions) нет ни того, ни другого.
+    """
+    engine = get_engine()
+    if engine.dialect.name != 'postgresql':
         return
-    
-    with get_db() as db:
-        with open(INVITES_DB, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            count = 0
-            
-            for row in reader:
-                try:
-                    is_used = row.get('is_used', 'False').lower() == 'true'
-                    
-                    invite = Invite(
-                        user_id=int(row['user_id']),
-                        chat_id=int(row['chat_id']),
-                        invite_link=row['invite_link'],
-                        is_used=is_used,
-                        created_at=parse_datetime(row.get('created_at', ''))
-                    )
-                    db.add(invite)
-                    count += 1
-                except Exception as e:
-                    print(f"❌ Ошибка при миграции инвайта: {e}")
-            
-            print(f"✅ Мигрировано инвайтов: {count}")
+    with engine.connect() as connection:
+        if is_partitioned(connection):
+            raise RuntimeError(
+                "payments секционирована: ON CONFLICT (payment_id) недоступен, "
+                "миграцию нужно выполнять до python -m src.database.partitions --convert"
+            )
+
+
+def migrate_all(chunk_size: int = DEFAULT_CHUNK_SIZE, checkpoint_path: str = CHECKPOINT_FILE,
+                restart: bool = False, tables: Dict[str, TableSpec] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Загружает все таблицы с учётом внешних ключей:
+    users → (payments → subscriptions) || invites
+    """
+    ensure_payments_not_partitioned()
+    tables = tables or TABLES
+    checkpoint = Checkpoint(checkpoint_path, restart=restart)
+
+    results = {'users': migrate_table(tables['users'], checkpoint, chunk_size)}
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='migrate') as pool:
+        invites = pool.submit(migrate_table, tables['invites'], checkpoint, chunk_size)
+
+        def payments_then_subscriptions():
+            results['payments'] = migrate_table(tables['payments'], checkpoint, chunk_size)
+            results['subscriptions'] = migrate_table(tables['subscriptions'], checkpoint, chunk_size)
+
+        pool.submit(payments_then_subscriptions).result()
+        results['invites'] = invites.result()
+
+    # Всё загружено - следующий запуск начнёт с нуля
+    checkpoint.clear()
+    return results
 
 
 def main():
     """Главная функция миграции"""
+    parser = argparse.ArgumentParser(description='Миграция данных из CSV в PostgreSQL')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Строк в одной транзакции')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE, help='Файл чекпоинта')
+    parser.add_argument('--restart', action='store_true', help='Игнорировать чекпоинт и начать заново')
+    parser.add_argument('--source', help='Папка выгрузки export_postgres_to_csv.py (CSV или Parquet)')
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🔄 МИГРАЦИЯ ДАННЫХ ИЗ CSV В POSTGRESQL")
     print("=" * 60)
-    
+
     print("\n📦 Инициализация базы данных...")
     init_db()
-    
-    print("\n👥 Миграция пользователей...")
-    migrate_users()
-    
-    print("\n💳 Миграция платежей...")
-    migrate_payments()
-    
-    print("\n📅 Миграция подписок...")
-    migrate_subscriptions()
-    
-    print("\n🔗 Миграция инвайтов...")
-    migrate_invites()
-    
+    try:
+        ensure_payments_not_partitioned()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    tables = tables_from_dir(args.source) if args.source else None
+    results = migrate_all(args.chunk_size, args.checkpoint, args.restart, tables)
+    duration = time.perf_counter() - started
+    loaded = sum(stats['loaded'] for stats in results.values())
+
     print("\n" + "=" * 60)
-    print("✅ МИГРАЦИЯ ЗАВЕРШЕНА!")
+    print(f"✅ МИГРАЦИЯ ЗАВЕРШЕНА: {loaded:,} строк за {duration:.1f} с")
     print("=" * 60)
     print("\n💡 Что дальше:")
     print("1. Проверь данные в PostgreSQL")
     print("2. Сделай бэкап CSV файлов")
-    print("3. Обнови src/database/db_manager.py (замени на новую версию)")
-    print("4. Перезапусти бота")
+    print("3. Пересчитай агрегаты аналитики: python -m src.database.rollups --rebuild")
+    print("4. Пересчитай доступ к каналам: python -m src.database.entitlements --rebuild")
+    print("5. Перезапусти бота")
 
 
 if __name__ == '__main__':
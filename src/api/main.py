@@ -1,8 +1,15 @@
 """FastAPI приложение для REST API"""
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.api.routes import stats, users, payments, webhook
+from src.api.routes import stats, users, payments, subscriptions, webhook, analytics
+from src.database.query_counter import count_queries
+from src.services.catalog import catalog_watcher, reload_catalog
+from src.utils import tracing
+from src.utils.logger import setup_logger, shutdown_logger
+from src.utils.metrics import render_metrics
 
 # Создаём FastAPI приложение
 app = FastAPI(
@@ -20,10 +27,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("startup")
+async def on_startup():
+    setup_logger()
+    # Справочник тарифов (проверка tariff_id в массовых операциях)
+    await reload_catalog()
+    app.state.catalog_watcher = asyncio.create_task(catalog_watcher())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    app.state.catalog_watcher.cancel()
+    shutdown_logger()
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Спан и счётчик SQL-запросов на каждый HTTP-запрос"""
+    name = f"{request.method} {request.url.path}"
+    with tracing.start_span(name), count_queries(name):
+        return await call_next(request)
+
+
 # Подключаем роуты
 app.include_router(stats.router, prefix="/api", tags=["Statistics"])
+app.include_router(analytics.router, prefix="/api", tags=["Analytics"])
 app.include_router(users.router, prefix="/api", tags=["Users"])
 app.include_router(payments.router, prefix="/api", tags=["Payments"])
+app.include_router(subscriptions.router, prefix="/api", tags=["Subscriptions"])
 app.include_router(webhook.router, prefix="/api", tags=["Webhooks"])
 
 
@@ -41,4 +73,11 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Проверка здоровья API"""
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в формате Prometheus"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,232 @@
+"""Эндпоинты аналитики: выручка и конверсия (revenue_daily), когорты (cohort_*)"""
+import csv
+import io
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Query, Response
+from sqlalchemy import func
+
+from src.database.database import get_db
+from src.database.models import CohortActivity, CohortUsers, PaymentMethod, RevenueDaily
+from src.database.rollups import COHORT_COUNTERS, month_start, months_between
+
+router = APIRouter()
+
+PERIOD_PATTERN = '^(day|week|month)$'
+GROUP_BY_PATTERN = '^(tariff|method)$'
+DEFAULT_RANGE_DAYS = 90
+
+COHORT_CSV_COLUMNS = ('cohort_month', 'users', 'period', *COHORT_COUNTERS, 'active', 'retention', 'churn_rate')
+
+GROUP_COLUMNS = {
+    'tariff': RevenueDaily.tariff,
+    'method': RevenueDaily.method,
+}
+
+
+def bucket_start(day: date, period: str) -> date:
+    """Начало дня, недели (понедельник) или месяца"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def aggregate(period: str, group_by: Optional[str], date_from: Optional[date], date_to: Optional[date]):
+    """
+    Суммирует дневные строки агрегата по периодам (и тарифу/методу).
+    База сворачивает их до дней × группа, недели и месяцы досчитываются
+    в Python - так запрос не зависит от диалекта SQL.
+    """
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=DEFAULT_RANGE_DAYS)
+    group_columns = [GROUP_COLUMNS[group_by]] if group_by else []
+
+    with get_db(read_only=True) as db:
+        rows = db.query(
+            RevenueDaily.day, *group_columns,
+            func.sum(RevenueDaily.payments_created), func.sum(RevenueDaily.payments_completed),
+            func.sum(RevenueDaily.revenue), func.sum(RevenueDaily.time_to_pay_seconds)
+        ).filter(
+            RevenueDaily.day >= date_from,
+            RevenueDaily.day <= date_to
+        ).group_by(RevenueDaily.day, *group_columns).all()
+
+    totals = defaultdict(lambda: {'created': 0, 'completed': 0, 'revenue': 0.0, 'time_to_pay_seconds': 0.0})
+    for row in rows:
+        day, *group, created, completed, revenue, seconds = row
+        group = group[0] if group else None
+        if isinstance(group, PaymentMethod):
+            group = group.value
+        entry = totals[(bucket_start(day, period), group)]
+        entry['created'] += created
+        entry['completed'] += completed
+        entry['revenue'] += revenue
+        entry['time_to_pay_seconds'] += seconds
+
+    buckets = []
+    for (start, group), entry in sorted(totals.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+        bucket = {'period_start': start.isoformat()}
+        if group_by:
+            bucket[group_by] = group
+        bucket.update(entry)
+        buckets.append(bucket)
+
+    return {
+        'period': period,
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'group_by': group_by,
+    }, buckets
+
+
+@router.get("/analytics/revenue")
+async def get_revenue(
+        period: str = Query(default='day', pattern=PERIOD_PATTERN, description="day, week или month"),
+        group_by: Optional[str] = Query(default=None, pattern=GROUP_BY_PATTERN, description="tariff или method"),
+        date_from: Optional[date] = Query(default=None, description="Начало периода (по умолчанию 90 дней назад)"),
+        date_to: Optional[date] = Query(default=None, description="Конец периода включительно")
+):
+    """
+    Выручка по периодам
+
+    Оплаченные платежи считаются в день оплаты.
+    """
+    meta, buckets = aggregate(period, group_by, date_from, date_to)
+    return {
+        **meta,
+        'currency': 'RUB',
+        'total': round(sum(b['revenue'] for b in buckets), 2),
+        'buckets': [
+            {
+                **{key: b[key] for key in ('period_start', group_by) if key},
+                'revenue': round(b['revenue'], 2),
+                'payments': b['completed']
+            }
+            for b in buckets
+        ]
+    }
+
+
+@router.get("/analytics/conversion")
+async def get_conversion(
+        period: str = Query(default='day', pattern=PERIOD_PATTERN, description="day, week или month"),
+        group_by: Optional[str] = Query(default=None, pattern=GROUP_BY_PATTERN, description="tariff или method"),
+        date_from: Optional[date] = Query(default=None, description="Начало периода (по умолчанию 90 дней назад)"),
+        date_to: Optional[date] = Query(default=None, description="Конец периода включительно")
+):
+    """
+    Конверсия pending → completed: оплачено / создано за период
+    """
+    meta, buckets = aggregate(period, group_by, date_from, date_to)
+    return {
+        **meta,
+        'buckets': [
+            {
+                **{key: b[key] for key in ('period_start', group_by) if key},
+                'created': b['created'],
+                'completed': b['completed'],
+                'conversion_rate': round(b['completed'] / b['created'], 4) if b['created'] else None
+            }
+            for b in buckets
+        ]
+    }
+
+
+@router.get("/analytics/time-to-pay")
+async def get_time_to_pay(
+        period: str = Query(default='day', pattern=PERIOD_PATTERN, description="day, week или month"),
+        group_by: Optional[str] = Query(default=None, pattern=GROUP_BY_PATTERN, description="tariff или method"),
+        date_from: Optional[date] = Query(default=None, description="Начало периода (по умолчанию 90 дней назад)"),
+        date_to: Optional[date] = Query(default=None, description="Конец периода включительно")
+):
+    """
+    Среднее время от создания платежа до оплаты, секунды
+    """
+    meta, buckets = aggregate(period, group_by, date_from, date_to)
+    return {
+        **meta,
+        'buckets': [
+            {
+                **{key: b[key] for key in ('period_start', group_by) if key},
+                'completed': b['completed'],
+                'avg_seconds': round(b['time_to_pay_seconds'] / b['completed'], 1) if b['completed'] else None
+            }
+            for b in buckets
+        ]
+    }
+
+
+def cohort_matrix(date_from: Optional[date], date_to: Optional[date]):
+    """
+    Когорты по месяцу регистрации с кривыми удержания и оттока.
+    active - пользователи когорты с доступом на конец периода,
+    churn_rate - доля потерявших доступ среди активных на начало периода.
+    """
+    today = date.today()
+    date_to = month_start(date_to or today)
+    date_from = month_start(date_from or date(today.year - 1, today.month, 1))
+
+    with get_db(read_only=True) as db:
+        sizes = dict(db.query(CohortUsers.cohort_month, CohortUsers.users).filter(
+            CohortUsers.cohort_month.between(date_from, date_to)
+        ).all())
+        cells = db.query(
+            CohortActivity.cohort_month, CohortActivity.period,
+            *(getattr(CohortActivity, name) for name in COHORT_COUNTERS)
+        ).filter(
+            CohortActivity.cohort_month.between(date_from, date_to)
+        ).all()
+
+    by_cell = {(cell.cohort_month, cell.period): cell for cell in cells}
+    cohorts = []
+    for cohort in sorted(set(sizes) | {cohort for cohort, _ in by_cell}):
+        users = sizes.get(cohort, 0)
+        active = 0
+        periods = []
+        for period in range(months_between(cohort, today) + 1):
+            cell = by_cell.get((cohort, period))
+            counters = {name: getattr(cell, name) if cell else 0 for name in COHORT_COUNTERS}
+            active_before = active
+            active += counters['activations'] - counters['churned']
+            periods.append({
+                'period': period,
+                **counters,
+                'active': active,
+                'retention': round(active / users, 4) if users else None,
+                'churn_rate': round(counters['churned'] / active_before, 4) if active_before else None
+            })
+        cohorts.append({'cohort_month': cohort.isoformat(), 'users': users, 'periods': periods})
+
+    return {'date_from': date_from.isoformat(), 'date_to': date_to.isoformat(), 'cohorts': cohorts}
+
+
+@router.get("/analytics/cohorts")
+async def get_cohorts(
+        date_from: Optional[date] = Query(default=None, description="Первая когорта (по умолчанию год назад)"),
+        date_to: Optional[date] = Query(default=None, description="Последняя когорта"),
+        format: str = Query(default='json', pattern='^(json|csv)$', description="json или csv")
+):
+    """
+    Месячные когорты пользователей: первые и повторные подписки,
+    удержание и отток по месяцам после регистрации
+    """
+    matrix = cohort_matrix(date_from, date_to)
+    if format == 'json':
+        return matrix
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COHORT_CSV_COLUMNS)
+    writer.writeheader()
+    for cohort in matrix['cohorts']:
+        for period in cohort['periods']:
+            writer.writerow({'cohort_month': cohort['cohort_month'], 'users': cohort['users'], **period})
+
+    return Response(
+        content=buffer.getvalue(),
+        media_type='text/csv',
+        headers={'Content-Disposition': 'attachment; filename="cohorts.csv"'}
+    )
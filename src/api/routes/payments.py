@@ -1,12 +1,49 @@
 """Эндпоинт для работы с платежами"""
+import csv
+import enum
+import io
+import json
+from datetime import date, datetime, timedelta
+
 from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 
 from src.database.database import get_db
-from src.database.models import Payment, PaymentStatus
+from src.database.db_manager import search_transfers
+from src.database.models import Payment, PaymentMethod, PaymentStatus
 
 router = APIRouter()
 
+# Колонки выгрузки /payments/export
+EXPORT_COLUMNS = (
+    Payment.payment_id, Payment.user_id, Payment.tariff, Payment.amount, Payment.status,
+    Payment.method, Payment.payment_date, Payment.updated_at, Payment.external_id
+)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+# Строк в одной порции серверного курсора и одном куске ответа
+EXPORT_BATCH_SIZE = 2000
+
+EXPORT_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _enum_pattern(enum_class) -> str:
+    return '^(' + '|'.join(member.value for member in enum_class) + ')$'
+
+
+def _export_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
 
 @router.get("/payments")
 async def get_payments(
@@ -22,7 +59,7 @@ async def get_payments(
     - limit: количество платежей (от 1 до 100)
     - offset: смещение для пагинации
     """
-    with get_db() as db:
+    with get_db(read_only=True) as db:
         query = db.query(Payment)
 
         # Фильтр по статусу если указан
@@ -59,6 +96,92 @@ async def get_payments(
         }
 
 
+def iter_payment_batches(filters: list, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Платежи порциями по batch_size строк через серверный курсор (yield_per).
+    Сессия открывается только когда клиент начал читать ответ и живёт до конца
+    выгрузки; порядок по id идёт по первичному ключу без сортировки всей выборки.
+    """
+    with get_db(read_only=True) as db:
+        result = db.execute(
+            select(*EXPORT_COLUMNS).where(*filters).order_by(Payment.id).execution_options(yield_per=batch_size)
+        )
+        for partition in result.partitions():
+            yield [[_export_value(value) for value in row] for row in partition]
+
+
+def ndjson_chunks(batches):
+    for batch in batches:
+        yield ''.join(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n' for row in batch)
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    yield buffer.getvalue()
+
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+@router.get("/payments/export")
+async def export_payments(
+        status: Optional[str] = Query(default=None, pattern=_enum_pattern(PaymentStatus), description="Фильтр по статусу"),
+        method: Optional[str] = Query(default=None, pattern=_enum_pattern(PaymentMethod), description="Фильтр по методу оплаты"),
+        date_from: Optional[date] = Query(default=None, description="Дата создания от"),
+        date_to: Optional[date] = Query(default=None, description="Дата создания до (включительно)"),
+        format: str = Query(default='ndjson', pattern='^(ndjson|csv)$', description="ndjson или csv")
+):
+    """
+    Выгрузка всех подходящих платежей потоком, без limit/offset
+
+    Память не зависит от объёма: строки читаются порциями и сразу уходят клиенту.
+    """
+    filters = []
+    if status:
+        filters.append(Payment.status == PaymentStatus(status))
+    if method:
+        filters.append(Payment.method == PaymentMethod(method))
+    if date_from:
+        filters.append(Payment.payment_date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        filters.append(Payment.payment_date < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+
+    chunks = csv_chunks if format == 'csv' else ndjson_chunks
+    return StreamingResponse(
+        chunks(iter_payment_batches(filters, EXPORT_BATCH_SIZE)),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="payments.{format}"'}
+    )
+
+
+@router.get("/payments/transfers")
+async def get_transfers(
+        payment_id: Optional[str] = Query(default=None, description="ID платежа из данных перевода"),
+        from_address: Optional[str] = Query(default=None, description="Адрес отправителя"),
+        transaction_id: Optional[str] = Query(default=None, description="Хеш транзакции"),
+        limit: int = Query(default=50, ge=1, le=100, description="Количество переводов")
+):
+    """
+    Переводы USDT из локального журнала (новые первыми)
+
+    Параметры:
+    - payment_id, from_address, transaction_id: фильтры (индексный поиск)
+    - limit: количество переводов (от 1 до 100)
+    """
+    transfers = search_transfers(payment_id, from_address, transaction_id, limit)
+    return {
+        "transfers": [
+            {key: _export_value(value) for key, value in transfer.items()}
+            for transfer in transfers
+        ]
+    }
+
+
 @router.get("/payments/{payment_id}")
 async def get_payment(payment_id: str):
     """
@@ -68,7 +191,9 @@ async def get_payment(payment_id: str):
     - payment_id: ID платежа
     """
     with get_db() as db:
-        payment = db.query(Payment).filter(Payment.payment_id == payment_id).first()
+        payment = db.query(Payment).options(joinedload(Payment.user)).filter(
+            Payment.payment_id == payment_id
+        ).first()
 
         if not payment:
             return {"error": "Payment not found"}, 404
@@ -19,7 +19,7 @@ async def get_statistics():
     - Количество активных подписок
     - Общую сумму платежей
     """
-    with get_db() as db:
+    with get_db(read_only=True) as db:
         # Общее количество пользователей
         total_users = db.query(func.count(User.id)).scalar()
 
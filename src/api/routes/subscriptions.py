@@ -0,0 +1,110 @@
+"""Эндпоинты подписок"""
+import json
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+from src.database.db_manager import get_expiring_subscriptions
+from src.services import bulk
+from src.services.catalog import DURATION_DAYS, current
+
+router = APIRouter()
+
+# Максимум операций в одной массовой задаче
+BULK_MAX_OPERATIONS = 50_000
+
+# Строк на один запрос к базе при потоковой выдаче
+EXPIRING_PAGE_SIZE = 1000
+
+
+def iter_expiring(until: datetime, page_size: int = EXPIRING_PAGE_SIZE):
+    """
+    NDJSON-строки подписок, истекающих до until.
+    Страницы читаются по ключу (end_date, id) - каждая отдельной короткой
+    сессией, соединение не удерживается, пока клиент читает ответ.
+    """
+    after = None
+    while True:
+        page = get_expiring_subscriptions(until, after, page_size)
+        for row in page:
+            yield json.dumps({
+                'user_id': row['user_id'],
+                'username': row['username'],
+                'tariff': row['tariff'],
+                'end_date': row['end_date'].isoformat(),
+                'reminder_sent_at': row['reminder_sent_at'].isoformat() if row['reminder_sent_at'] else None
+            }, ensure_ascii=False) + '\n'
+        if len(page) < page_size:
+            return
+        after = (page[-1]['end_date'], page[-1]['id'])
+
+
+@router.get("/subscriptions/expiring")
+async def get_expiring(
+        days: float = Query(default=3, gt=0, le=366, description="Истекают в ближайшие N дней")
+):
+    """
+    Активные подписки, истекающие в ближайшие N дней, по возрастанию даты окончания
+
+    Ответ - NDJSON (одна подписка на строку), отдаётся потоком.
+    """
+    until = datetime.utcnow() + timedelta(days=days)
+    return StreamingResponse(iter_expiring(until, EXPIRING_PAGE_SIZE), media_type='application/x-ndjson')
+
+
+class BulkOperation(BaseModel):
+    user_id: int
+    tariff_id: str
+    action: Literal['grant', 'extend', 'revoke']
+    days: Optional[int] = Field(default=None, gt=0, le=3650)
+
+    @field_validator('tariff_id')
+    @classmethod
+    def known_tariff(cls, tariff_id: str) -> str:
+        if current().tariff(tariff_id) is None:
+            raise ValueError(f'unknown tariff_id: {tariff_id}')
+        return tariff_id
+
+    @model_validator(mode='after')
+    def days_match_action(self):
+        if self.action == 'extend' and not self.days:
+            raise ValueError('extend requires days')
+        # Выданная подписка называется по сроку тарифа - другой длины у неё быть не может
+        if self.action == 'grant' and self.days not in DURATION_DAYS.values():
+            timed = sorted(days for days in DURATION_DAYS.values() if days)
+            raise ValueError(f'grant days must be one of {timed} or omitted (forever)')
+        return self
+
+
+class BulkRequest(BaseModel):
+    operations: List[BulkOperation] = Field(min_length=1, max_length=BULK_MAX_OPERATIONS)
+
+
+@router.post("/subscriptions/bulk", status_code=202)
+async def create_bulk_job(request: BulkRequest, background_tasks: BackgroundTasks):
+    """
+    Массовая выдача, продление или отзыв подписок
+
+    Операции:
+    - grant: новая подписка на срок тарифа (days=30, без days - навсегда) и инвайты в каналы
+    - extend: продлить активные подписки тарифа на days дней
+    - revoke: отменить подписки тарифа и исключить из его каналов
+
+    Пачка применяется одной транзакцией, каналы синхронизируются с ограничением
+    скорости. Возвращает job_id для GET /api/subscriptions/bulk/{job_id}.
+    """
+    job = bulk.create_job([operation.model_dump() for operation in request.operations])
+    background_tasks.add_task(bulk.run_job, job)
+    return job.to_dict()
+
+
+@router.get("/subscriptions/bulk/{job_id}")
+async def get_bulk_job(job_id: str):
+    """Статус и прогресс массовой операции"""
+    job = bulk.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
@@ -1,9 +1,10 @@
 """Эндпоинт для работы с пользователями"""
 from fastapi import APIRouter, Query
 from typing import Optional
+from sqlalchemy import func
 
 from src.database.database import get_db
-from src.database.models import User
+from src.database.models import User, Payment, Subscription
 
 router = APIRouter()
 
@@ -20,7 +21,7 @@ async def get_users(
     - limit: количество пользователей (от 1 до 100)
     - offset: смещение для пагинации
     """
-    with get_db() as db:
+    with get_db(read_only=True) as db:
         users = db.query(User).offset(offset).limit(limit).all()
 
         return {
@@ -53,9 +54,13 @@ async def get_user(user_id: int):
         if not user:
             return {"error": "User not found"}, 404
 
-        # Считаем статистику пользователя
-        payments_count = len(user.payments)
-        subscriptions_count = len(user.subscriptions)
+        # Считаем статистику пользователя (COUNT вместо загрузки коллекций)
+        payments_count = db.query(func.count(Payment.id)).filter(
+            Payment.user_id == user_id
+        ).scalar()
+        subscriptions_count = db.query(func.count(Subscription.id)).filter(
+            Subscription.user_id == user_id
+        ).scalar()
 
         return {
             "user_id": user.user_id,
@@ -43,24 +43,24 @@ async def payment_webhook(request: Request):
             # Здесь можно активировать подписку
             # (требует доработки для получения данных пользователя и тарифа)
 
-            logger.info(f"Webhook: платёж {payment_id} успешно обработан")
+            logger.info("Webhook: платёж %s успешно обработан", payment_id)
 
             return {"status": "ok", "message": "Payment processed"}
 
         elif status in [2, 'failed', 'error']:
             # Платёж отклонён
             update_payment_status(payment_id, 'failed', external_id)
-            logger.warning(f"Webhook: платёж {payment_id} отклонён")
+            logger.warning("Webhook: платёж %s отклонён", payment_id)
 
             return {"status": "ok", "message": "Payment failed"}
 
         else:
             # Неизвестный статус
-            logger.warning(f"Webhook: неизвестный статус {status} для платежа {payment_id}")
+            logger.warning("Webhook: неизвестный статус %s для платежа %s", status, payment_id)
             return {"status": "ok", "message": "Unknown status"}
 
     except Exception as e:
-        logger.error(f"Ошибка обработки webhook: {e}", exc_info=True)
+        logger.error("Ошибка обработки webhook: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
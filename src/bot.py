@@ -1,7 +1,16 @@
 """Инициализация бота и диспетчера"""
 from aiogram import Bot, Dispatcher
-from src.config import BOT_TOKEN
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from src.config import BOT_TOKEN, TELEGRAM_API_URL
+from src.middlewares import setup_middlewares
+
+# Сессия к альтернативному Bot API серверу, если он задан
+session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
 
 # Создаем экземпляры бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
\ No newline at end of file
+bot = Bot(token=BOT_TOKEN, session=session)
+dp = Dispatcher()
+
+setup_middlewares(dp, bot)
@@ -2,12 +2,15 @@
 import os
 from dotenv import load_dotenv
 
-# Загружаем переменные из .env файла
-load_dotenv()
+# Загружаем переменные из .env в корне проекта (или из ENV_FILE). Явный путь
+# вместо поиска по каталогам: load_dotenv() без пути обходит стек вызовов и родительские папки
+ENV_FILE = os.getenv('ENV_FILE', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env'))
+load_dotenv(ENV_FILE)
 
 # ТОКЕНЫ И КЛЮЧИ
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 ADMIN_ID = int(os.getenv('ADMIN_ID', 0))
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')  # Свой Bot API сервер (например, фейковый для нагрузочных тестов)
 
 # ПЛАТЕЖИ (карты/СБП)
 SHOP_ID = int(os.getenv('SHOP_ID', 0))
@@ -20,6 +23,11 @@ CRYPTO_PAYMENT_NETWORK = os.getenv('CRYPTO_PAYMENT_NETWORK', 'TRC-20')
 CRYPTO_EXCHANGE_RATE = float(os.getenv('CRYPTO_EXCHANGE_RATE', 90))  # Курс USDT к RUB
 TRONGRID_API_KEY = os.getenv('TRONGRID_API_KEY')
 TRON_NODE_URL = os.getenv('TRON_NODE_URL', 'https://api.trongrid.io')
+TRON_SYNC_INTERVAL = int(os.getenv('TRON_SYNC_INTERVAL', 15))  # Секунд между загрузками переводов (0 — только по запросу)
+TRON_SYNC_LOOKBACK = int(os.getenv('TRON_SYNC_LOOKBACK', 86400))  # Глубина первой загрузки, секунд
+TRON_SYNC_OVERLAP = int(os.getenv('TRON_SYNC_OVERLAP', 300))  # Перекрытие окна загрузки, секунд
+TRON_SYNC_MIN_INTERVAL = float(os.getenv('TRON_SYNC_MIN_INTERVAL', 5))  # Не чаще раза в N секунд по запросу проверки
+TRON_PAGE_SIZE = int(os.getenv('TRON_PAGE_SIZE', 200))  # Переводов на страницу TronGrid (максимум 200)
 
 # ФАЙЛЫ ДАННЫХ
 USERS_DB = 'data/users.csv'
@@ -28,7 +36,80 @@ SUBSCRIPTIONS_DB = 'data/subscriptions.csv'
 INVITES_DB = 'data/invites.csv'
 LOG_FILE = 'logs/bot_activity.log'
 
+# ЛОГИРОВАНИЕ
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()  # text или json
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # При переполнении записи отбрасываются
+
+# МЕТРИКИ
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))  # Порт /metrics процесса бота (0 — выключено)
+
+# ТРАССИРОВКА
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', 1000))  # Порог медленного апдейта/запроса
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0.01))  # Доля остальных трейсов, попадающих в файл
+TRACE_FILE = os.getenv('TRACE_FILE', 'logs/traces.jsonl')
+
+# ЗАПИСЬ АПДЕЙТОВ (для воспроизведения через loadtest.replay)
+RECORD_UPDATES_FILE = os.getenv('RECORD_UPDATES_FILE', '')  # Например logs/updates.jsonl.gz (пусто — выключено)
+RECORD_UPDATES_SALT = os.getenv('RECORD_UPDATES_SALT', '')  # Соль для обезличивания ID
+
+# ИСТЕЧЕНИЕ ПОДПИСОК
+SUBSCRIPTION_EXPIRY_INTERVAL = int(os.getenv('SUBSCRIPTION_EXPIRY_INTERVAL', 300))  # Секунд между проходами (0 — выключено)
+SUBSCRIPTION_EXPIRY_BATCH_SIZE = int(os.getenv('SUBSCRIPTION_EXPIRY_BATCH_SIZE', 1000))  # Подписок за одну транзакцию
+
+# НАПОМИНАНИЯ О ПРОДЛЕНИИ
+REMINDER_DAYS_BEFORE = float(os.getenv('REMINDER_DAYS_BEFORE', 3))  # За сколько дней до окончания напоминать
+REMINDER_CHECK_INTERVAL = int(os.getenv('REMINDER_CHECK_INTERVAL', 600))  # Секунд между проходами
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', 500))  # Подписок за одну выборку
+
+# ИНДЕКС ДОСТУПА В ПАМЯТИ (проверка вступления в канал без запроса к базе)
+ENTITLEMENT_POLL_INTERVAL = float(os.getenv('ENTITLEMENT_POLL_INTERVAL', 1))  # Секунд между опросами изменений (0 — выключено)
+ENTITLEMENT_RELOAD_INTERVAL = int(os.getenv('ENTITLEMENT_RELOAD_INTERVAL', 3600))  # Полная перезагрузка индекса
+ENTITLEMENT_MAX_DELTA = int(os.getenv('ENTITLEMENT_MAX_DELTA', 50000))  # Изменений поверх снимка до перезагрузки
+
+# ЗАЯВКИ НА ВСТУПЛЕНИЕ (каналы с одобрением заявок)
+JOIN_BATCH_SIZE = int(os.getenv('JOIN_BATCH_SIZE', 100))  # Заявок на одну проверку доступа
+JOIN_BATCH_WAIT = float(os.getenv('JOIN_BATCH_WAIT', 0.2))  # Секунд ожидания неполной пачки
+JOIN_REQUEST_RATE = float(os.getenv('JOIN_REQUEST_RATE', 25))  # Одобрений/отказов в секунду
+JOIN_QUEUE_SIZE = int(os.getenv('JOIN_QUEUE_SIZE', 100000))  # При переполнении приём апдейтов ждёт
+
+# ПУЛ ИНВАЙТОВ (заранее созданные одноразовые ссылки по каналам)
+INVITE_POOL_SIZE = int(os.getenv('INVITE_POOL_SIZE', 50))  # До скольких свободных ссылок пополнять канал
+INVITE_POOL_LOW_WATER = int(os.getenv('INVITE_POOL_LOW_WATER', 20))  # Пополнять, когда свободных меньше
+INVITE_POOL_CHECK_INTERVAL = int(os.getenv('INVITE_POOL_CHECK_INTERVAL', 30))  # Секунд между проверками пула
+INVITE_POOL_RATE = float(os.getenv('INVITE_POOL_RATE', 5))  # Вызовов create/revoke в секунду
+INVITE_LINK_TTL = int(os.getenv('INVITE_LINK_TTL', 172800))  # Срок ссылки из пула в Telegram, секунд
+INVITE_MIN_VALIDITY = int(os.getenv('INVITE_MIN_VALIDITY', 86400))  # Сколько ссылка должна жить после выдачи
+
+# ОЧИСТКА ИНВАЙТОВ
+INVITE_SWEEP_INTERVAL = int(os.getenv('INVITE_SWEEP_INTERVAL', 86400))  # Секунд между очистками (0 — выключено)
+INVITE_LEGACY_TTL = int(os.getenv('INVITE_LEGACY_TTL', 86400))  # Срок ссылок без expires_at, секунд
+INVITE_RETENTION_DAYS = int(os.getenv('INVITE_RETENTION_DAYS', 90))  # Сколько хранить использованные ссылки
+INVITE_ARCHIVE = int(os.getenv('INVITE_ARCHIVE', 1))  # 1 — переносить в invites_archive, 0 — удалять
+INVITE_SWEEP_BATCH_SIZE = int(os.getenv('INVITE_SWEEP_BATCH_SIZE', 5000))  # Строк за одну транзакцию
+INVITE_SWEEP_REVOKE_LIMIT = int(os.getenv('INVITE_SWEEP_REVOKE_LIMIT', 1000))  # Отзывов в Telegram за очистку
+
+# Секционирование payments (PostgreSQL, после python -m src.database.partitions --convert)
+PAYMENTS_PARTITIONS_AHEAD = int(os.getenv('PAYMENTS_PARTITIONS_AHEAD', 3))  # Месячных секций впрок
+PAYMENTS_ARCHIVE_AFTER_MONTHS = int(os.getenv('PAYMENTS_ARCHIVE_AFTER_MONTHS', 0))  # Архив FAILED/CANCELLED старше N месяцев (0 — выключено)
+PAYMENTS_MAINTENANCE_INTERVAL = int(os.getenv('PAYMENTS_MAINTENANCE_INTERVAL', 86400))  # Секунд между обслуживаниями
+
+# Отмена брошенных платежей: сколько секунд PENDING-платёж ждёт оплаты по каждому методу (0 — не отменять)
+PENDING_TTL_CARD = int(os.getenv('PENDING_TTL_CARD', 3600))
+PENDING_TTL_SBP = int(os.getenv('PENDING_TTL_SBP', 3600))
+PENDING_TTL_USDT = int(os.getenv('PENDING_TTL_USDT', 86400))  # Проверка USDT смотрит переводы за 24 часа
+PENDING_SWEEP_INTERVAL = int(os.getenv('PENDING_SWEEP_INTERVAL', 600))  # Секунд между проходами (0 — выключено)
+PENDING_SWEEP_BATCH_SIZE = int(os.getenv('PENDING_SWEEP_BATCH_SIZE', 1000))  # Платежей за одну транзакцию
+PENDING_CHECK_CONCURRENCY = int(os.getenv('PENDING_CHECK_CONCURRENCY', 10))  # Одновременных запросов к эквайрингу
+
+# Справочник тарифов: как часто перечитывать без уведомления PostgreSQL
+CATALOG_POLL_INTERVAL = float(os.getenv('CATALOG_POLL_INTERVAL', 30))
+
+# РАССЫЛКИ
+SEND_RATE_PER_SECOND = float(os.getenv('SEND_RATE_PER_SECOND', 25))  # Telegram допускает ~30 сообщений/с на бота
+
 # В реальном проекте сюда подставятся реальные ID из .env
+# Начальный справочник: после публикации версии в catalog_versions действует она (src.services.catalog)
 CHANNELS = {
     'basic_1': -1,
     'basic_2': -2,
@@ -1,14 +1,18 @@
 """Менеджер базы данных на PostgreSQL + SQLAlchemy"""
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterable, Iterator, Tuple
 import logging
 
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, case, func, insert, literal, or_, select, text, tuple_, update
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased, joinedload
 
+from src.services.catalog import DURATION_DAYS, parse_tariff, tariff_display_name, tariff_names
+from src.utils.metrics import observe_db, PAYMENTS_CREATED, PAYMENTS_CONFIRMED, PAYMENTS_EXPIRED
+from . import entitlements, rollups
 from .database import get_db
 from .models import (
-    User, Payment, Subscription, Invite,
+    User, Payment, Subscription, Invite, InviteArchive, Entitlement, CryptoTransfer, CatalogVersion,
     PaymentStatus, PaymentMethod, SubscriptionStatus
 )
 
@@ -17,6 +21,7 @@ logger = logging.getLogger(__name__)
 
 # ПОЛЬЗОВАТЕЛИ
 
+@observe_db
 def save_user(user_id: int, username: str = None) -> User:
     """
     Сохраняет или обновляет пользователя в базе.
@@ -31,13 +36,14 @@ def save_user(user_id: int, username: str = None) -> User:
     with get_db() as db:
         # Ищем существующего пользователя
         user = db.query(User).filter(User.user_id == user_id).first()
+        created = user is None
 
         if user:
             # Обновляем существующего
             if username:
                 user.username = username
             user.last_activity = datetime.utcnow()
-            logger.debug(f"Пользователь {user_id} обновлён")
+            logger.debug("Пользователь %s обновлён", user_id)
         else:
             # Создаём нового
             user = User(
@@ -45,13 +51,16 @@ def save_user(user_id: int, username: str = None) -> User:
                 username=username or ''
             )
             db.add(user)
-            logger.info(f"Создан новый пользователь {user_id}")
+            logger.info("Создан новый пользователь %s", user_id)
 
         db.flush()
         db.refresh(user)
+        if created:
+            rollups.on_user_created(db, user)
         return user
 
 
+@observe_db
 def get_user(user_id: int) -> Optional[User]:
     """Возвращает пользователя по Telegram ID"""
     with get_db() as db:
@@ -60,6 +69,7 @@ def get_user(user_id: int) -> Optional[User]:
 
 # ПЛАТЕЖИ
 
+@observe_db
 def save_payment(
         user_id: int,
         username: str,
@@ -107,11 +117,19 @@ def save_payment(
         db.add(payment)
         db.flush()
         db.refresh(payment)
+        rollups.on_payment_created(db, payment)
 
-        logger.info(f"Платёж {payment_id} создан (статус: {status}, метод: {method})")
-        return payment
+        logger.info(
+            "Платёж %s создан (статус: %s, метод: %s)", payment_id, status, method,
+            extra={'user_id': user_id, 'payment_id': payment_id}
+        )
+
+    # Счётчик - только после коммита: откаченная транзакция платежа не создала
+    PAYMENTS_CREATED.labels(method=payment_method.value).inc()
+    return payment
 
 
+@observe_db
 def update_payment_status(payment_id: str, status: str, external_id: str = None) -> bool:
     """
     Обновляет статус платежа.
@@ -124,21 +142,35 @@ def update_payment_status(payment_id: str, status: str, external_id: str = None)
     Returns:
         bool: True если обновлено успешно
     """
+    confirmed_method = None
     with get_db() as db:
-        payment = db.query(Payment).filter(Payment.payment_id == payment_id).first()
+        # Блокируем строку: два одновременных подтверждения не должны оба посчитать оплату
+        payment = db.query(Payment).filter(Payment.payment_id == payment_id).with_for_update().first()
 
         if not payment:
-            logger.warning(f"Платёж {payment_id} не найден")
+            logger.warning("Платёж %s не найден", payment_id)
             return False
 
-        payment.status = PaymentStatus(status.lower())
+        new_status = PaymentStatus(status.lower())
+        if new_status == PaymentStatus.COMPLETED and payment.status != PaymentStatus.COMPLETED:
+            rollups.on_payment_completed(db, payment, datetime.utcnow())
+            confirmed_method = payment.method.value
+
+        payment.status = new_status
         if external_id:
             payment.external_id = external_id
 
-        logger.info(f"Статус платежа {payment_id} обновлён на {status}")
-        return True
+        logger.info(
+            "Статус платежа %s обновлён на %s", payment_id, status,
+            extra={'user_id': payment.user_id, 'payment_id': payment_id}
+        )
+
+    if confirmed_method:
+        PAYMENTS_CONFIRMED.labels(method=confirmed_method).inc()
+    return True
 
 
+@observe_db
 def get_payment(payment_id: str) -> Optional[Dict]:
     """
     Возвращает информацию о платеже.
@@ -147,26 +179,93 @@ def get_payment(payment_id: str) -> Optional[Dict]:
         Dict с данными платежа или None
     """
     with get_db() as db:
-        payment = db.query(Payment).filter(Payment.payment_id == payment_id).first()
+        # Пользователь нужен ради username - подтягиваем его тем же запросом
+        payment = db.query(Payment).options(joinedload(Payment.user)).filter(
+            Payment.payment_id == payment_id
+        ).first()
 
         if not payment:
             return None
 
-        return {
-            'user_id': payment.user_id,
-            'username': payment.user.username,
-            'tariff': payment.tariff,
-            'amount': payment.amount,
-            'payment_id': payment.payment_id,
-            'status': payment.status.value,
-            'method': payment.method.value,
-            'payment_date': payment.payment_date.strftime("%Y-%m-%d %H:%M:%S"),
-            'external_id': payment.external_id or ''
-        }
+        return _payment_dict(payment)
+
+
+def _payment_dict(payment: Payment) -> Dict:
+    return {
+        'user_id': payment.user_id,
+        'username': payment.user.username,
+        'tariff': payment.tariff,
+        'amount': payment.amount,
+        'payment_id': payment.payment_id,
+        'status': payment.status.value,
+        'method': payment.method.value,
+        'payment_date': payment.payment_date.strftime("%Y-%m-%d %H:%M:%S"),
+        'external_id': payment.external_id or ''
+    }
+
+
+@observe_db
+def confirm_paid_payment(payment_id: str, external_id: str = None) -> Optional[Dict]:
+    """
+    Подтверждает оплаченный платёж и создаёт подписку одной транзакцией
+    (кнопка «Проверить оплату» и отмена брошенных платежей).
+
+    Строка платежа блокируется: из двух одновременных подтверждений подписку
+    создаёт только первое. Возвращает данные платежа, как get_payment, или
+    None - платёж не найден или уже подтверждён.
+    """
+    with get_db() as db:
+        payment = db.query(Payment).filter(Payment.payment_id == payment_id).with_for_update().first()
+        if not payment or payment.status == PaymentStatus.COMPLETED:
+            return None
+
+        rollups.on_payment_completed(db, payment, datetime.utcnow())
+        payment.status = PaymentStatus.COMPLETED
+        if external_id:
+            payment.external_id = external_id
+        _add_subscription(db, payment.user_id, payment.tariff, payment_id)
+
+        confirmed = _payment_dict(payment)
+        logger.info(
+            "Платёж %s подтверждён, подписка создана", payment_id,
+            extra={'user_id': payment.user_id, 'payment_id': payment_id}
+        )
+
+    PAYMENTS_CONFIRMED.labels(method=confirmed['method']).inc()
+    return confirmed
+
+
+@observe_db
+def get_stale_pending(method: str, created_before: datetime, after_id: int, limit: int) -> List[Tuple[int, str, str]]:
+    """До limit PENDING-платежей метода, созданных раньше created_before, с id > after_id: (id, payment_id, external_id)"""
+    with get_db(read_only=True) as db:
+        rows = db.query(Payment.id, Payment.payment_id, Payment.external_id).filter(
+            Payment.status == PaymentStatus.PENDING,
+            Payment.method == PaymentMethod(method),
+            Payment.payment_date < created_before,
+            Payment.id > after_id
+        ).order_by(Payment.id).limit(limit).all()
+        return [tuple(row) for row in rows]
+
+
+@observe_db
+def cancel_pending_payments(method: str, ids: List[int]) -> int:
+    """Переводит платежи из PENDING в CANCELLED одним UPDATE; уже изменённые статусы не трогает"""
+    if not ids:
+        return 0
+    with get_db() as db:
+        cancelled = db.execute(
+            update(Payment).where(Payment.id.in_(ids), Payment.status == PaymentStatus.PENDING).values(
+                status=PaymentStatus.CANCELLED, updated_at=datetime.utcnow()
+            )
+        ).rowcount
+    PAYMENTS_EXPIRED.labels(method=method).inc(cancelled)
+    return cancelled
 
 
 # ПОДПИСКИ
 
+@observe_db
 def save_subscription(user_id: int, username: str, tariff: str, payment_id: str) -> Subscription:
     """
     Создаёт новую подписку.
@@ -183,32 +282,42 @@ def save_subscription(user_id: int, username: str, tariff: str, payment_id: str)
     with get_db() as db:
         # Убеждаемся что пользователь существует
         save_user(user_id, username)
-
-        start_date = datetime.utcnow()
-
-        # Определяем дату окончания
-        if "Навсегда" in tariff or tariff == "all":
-            end_date = datetime(2100, 1, 1)  # "Вечная" подписка
-        else:
-            end_date = start_date + timedelta(days=30)
-
-        subscription = Subscription(
-            user_id=user_id,
-            payment_id=payment_id,
-            tariff=tariff,
-            start_date=start_date,
-            end_date=end_date,
-            status=SubscriptionStatus.ACTIVE
-        )
-
-        db.add(subscription)
-        db.flush()
-        db.refresh(subscription)
-
-        logger.info(f"Подписка для пользователя {user_id} создана (тариф: {tariff})")
-        return subscription
-
-
+        return _add_subscription(db, user_id, tariff, payment_id)
+
+
+def _add_subscription(db, user_id: int, tariff: str, payment_id: str) -> Subscription:
+    """Подписка по оплаченному тарифу с когортами и доступом - в транзакции вызывающего"""
+    start_date = datetime.utcnow()
+
+    # Определяем дату окончания
+    if "Навсегда" in tariff or tariff == "all":
+        end_date = datetime(2100, 1, 1)  # "Вечная" подписка
+    else:
+        end_date = start_date + timedelta(days=30)
+
+    subscription = Subscription(
+        user_id=user_id,
+        payment_id=payment_id,
+        tariff=tariff,
+        start_date=start_date,
+        end_date=end_date,
+        status=SubscriptionStatus.ACTIVE
+    )
+
+    db.add(subscription)
+    db.flush()
+    db.refresh(subscription)
+    rollups.on_subscription_created(db, subscription)
+    entitlements.grant(db, user_id, tariff, end_date)
+
+    logger.info(
+        "Подписка для пользователя %s создана (тариф: %s)", user_id, tariff,
+        extra={'user_id': user_id, 'payment_id': payment_id}
+    )
+    return subscription
+
+
+@observe_db
 def update_subscription_status(payment_id: str, status: str) -> bool:
     """Обновляет статус подписки по ID платежа"""
     with get_db() as db:
@@ -217,14 +326,21 @@ def update_subscription_status(payment_id: str, status: str) -> bool:
         ).first()
 
         if not subscription:
-            logger.warning(f"Подписка с payment_id={payment_id} не найдена")
+            logger.warning("Подписка с payment_id=%s не найдена", payment_id)
             return False
 
-        subscription.status = SubscriptionStatus(status.lower())
-        logger.info(f"Статус подписки {payment_id} обновлён на {status}")
+        new_status = SubscriptionStatus(status.lower())
+        if subscription.status == SubscriptionStatus.ACTIVE and new_status != SubscriptionStatus.ACTIVE:
+            rollups.on_subscription_ended(db, subscription)
+
+        subscription.status = new_status
+        db.flush()
+        entitlements.refresh_users(db, [subscription.user_id])
+        logger.info("Статус подписки %s обновлён на %s", payment_id, status)
         return True
 
 
+@observe_db
 def get_active_subscription(user_id: int) -> Optional[Dict]:
     """
     Возвращает активную подписку пользователя.
@@ -235,7 +351,7 @@ def get_active_subscription(user_id: int) -> Optional[Dict]:
     with get_db() as db:
         now = datetime.utcnow()
 
-        subscription = db.query(Subscription).filter(
+        subscription = db.query(Subscription).options(joinedload(Subscription.user)).filter(
             and_(
                 Subscription.user_id == user_id,
                 Subscription.status == SubscriptionStatus.ACTIVE,
@@ -257,12 +373,13 @@ def get_active_subscription(user_id: int) -> Optional[Dict]:
         }
 
 
+@observe_db
 def get_all_active_subscriptions() -> List[Dict]:
     """Возвращает список всех активных подписок"""
     with get_db() as db:
         now = datetime.utcnow()
 
-        subscriptions = db.query(Subscription).filter(
+        subscriptions = db.query(Subscription).options(joinedload(Subscription.user)).filter(
             and_(
                 Subscription.status == SubscriptionStatus.ACTIVE,
                 Subscription.end_date > now
@@ -283,10 +400,11 @@ def get_all_active_subscriptions() -> List[Dict]:
         ]
 
 
+@observe_db
 def expire_subscription(user_id: int, tariff: str) -> bool:
     """Помечает подписку как истёкшую"""
     with get_db() as db:
-        subscription = db.query(Subscription).filter(
+        subscription = db.query(Subscription).options(joinedload(Subscription.user)).filter(
             and_(
                 Subscription.user_id == user_id,
                 Subscription.tariff == tariff,
@@ -297,44 +415,388 @@ def expire_subscription(user_id: int, tariff: str) -> bool:
         if not subscription:
             return False
 
+        rollups.on_subscription_ended(db, subscription)
         subscription.status = SubscriptionStatus.EXPIRED
-        logger.info(f"Подписка пользователя {user_id} на {tariff} истекла")
+        db.flush()
+        entitlements.refresh_users(db, [user_id])
+        logger.info("Подписка пользователя %s на %s истекла", user_id, tariff)
         return True
 
 
+@observe_db
+def expire_ended_subscriptions(now: datetime, limit: int) -> Dict[str, int]:
+    """
+    Переводит в EXPIRED закончившиеся ACTIVE-подписки примерно limit штук за вызов
+    (все закончившиеся подписки выбранных пользователей - одной транзакцией).
+    Отток пишется в когорты одним набором upsert'ов, доступ пересчитывается.
+    Возвращает {'expired': ..., 'churned': ...}; expired == 0 - закончившихся нет.
+    """
+    ended = and_(Subscription.status == SubscriptionStatus.ACTIVE, Subscription.end_date <= now)
+    with get_db() as db:
+        user_ids = {row.user_id for row in db.execute(
+            select(Subscription.user_id).where(ended).order_by(Subscription.id).limit(limit)
+            .with_for_update(skip_locked=True)
+        )}
+        if not user_ids:
+            return {'expired': 0, 'churned': 0}
+
+        # Все закончившиеся подписки пользователя истекают вместе: отток считается один раз
+        lost_access_at, expired = {}, 0
+        for chunk in rollups.chunked(sorted(user_ids)):
+            rows = db.execute(
+                update(Subscription).where(ended, Subscription.user_id.in_(chunk)).values(
+                    status=SubscriptionStatus.EXPIRED
+                ).returning(Subscription.user_id, Subscription.end_date).execution_options(synchronize_session=False)
+            ).all()
+            expired += len(rows)
+            for user_id, end_date in rows:
+                lost_access_at[user_id] = max(end_date, lost_access_at.get(user_id, end_date))
+
+        still_active = set()
+        for chunk in rollups.chunked(sorted(lost_access_at)):
+            still_active.update(user_id for user_id, in db.query(Subscription.user_id).filter(
+                Subscription.user_id.in_(chunk),
+                Subscription.status == SubscriptionStatus.ACTIVE,
+                Subscription.end_date > now
+            ).distinct())
+
+        churned = [(user_id, moment, 'churned') for user_id, moment in lost_access_at.items() if user_id not in still_active]
+        rollups.cohort_events_bulk(db, churned)
+        entitlements.refresh_users(db, lost_access_at)
+
+    return {'expired': expired, 'churned': len(churned)}
+
+
+# НАПОМИНАНИЯ О ПРОДЛЕНИИ
+
+@observe_db
+def get_expiring_subscriptions(
+        until: datetime, after: Optional[Tuple[datetime, int]] = None, limit: int = 1000
+) -> List[Dict]:
+    """
+    Страница активных подписок, истекающих до until, по возрастанию end_date.
+
+    Args:
+        until: Верхняя граница end_date
+        after: (end_date, id) последней строки предыдущей страницы
+        limit: Размер страницы
+
+    Returns:
+        List[Dict]: Подписки с username; пустой список - конец выборки
+    """
+    with get_db(read_only=True) as db:
+        query = db.query(
+            Subscription.id, Subscription.user_id, User.username, Subscription.tariff,
+            Subscription.end_date, Subscription.reminder_sent_at
+        ).join(User, User.user_id == Subscription.user_id).filter(
+            Subscription.status == SubscriptionStatus.ACTIVE,
+            Subscription.end_date > datetime.utcnow(),
+            Subscription.end_date <= until
+        )
+        if after:
+            query = query.filter(tuple_(Subscription.end_date, Subscription.id) > after)
+
+        rows = query.order_by(Subscription.end_date, Subscription.id).limit(limit).all()
+        return [row._asdict() for row in rows]
+
+
+@observe_db
+def claim_due_reminders(until: datetime, limit: int) -> List[Dict]:
+    """
+    Атомарно помечает до limit подписок, истекающих до until, как получившие
+    напоминание и возвращает их. Каждая подписка выдаётся только один раз,
+    параллельные вызовы не пересекаются (SKIP LOCKED).
+    """
+    now = datetime.utcnow()
+    # Уже продлившему пользователю напоминать не о чем: у него есть более поздняя подписка на тот же тариф
+    renewal = aliased(Subscription)
+    renewed = select(renewal.id).where(
+        renewal.user_id == Subscription.user_id,
+        renewal.tariff == Subscription.tariff,
+        renewal.status == SubscriptionStatus.ACTIVE,
+        renewal.end_date > Subscription.end_date
+    ).exists()
+    due = select(Subscription.id).where(
+        Subscription.status == SubscriptionStatus.ACTIVE,
+        Subscription.end_date > now,
+        Subscription.end_date <= until,
+        Subscription.reminder_sent_at.is_(None),
+        ~renewed
+    ).order_by(Subscription.end_date).limit(limit).with_for_update(skip_locked=True)
+
+    with get_db() as db:
+        rows = db.execute(
+            update(Subscription).where(
+                Subscription.id.in_(due.scalar_subquery()),
+                Subscription.reminder_sent_at.is_(None)
+            ).values(reminder_sent_at=now).returning(
+                Subscription.id, Subscription.user_id, Subscription.tariff, Subscription.end_date
+            ).execution_options(synchronize_session=False)
+        ).all()
+        return [row._asdict() for row in rows]
+
+
+@observe_db
+def release_reminders(subscription_ids: Iterable[int]) -> int:
+    """Снимает отметку с подписок, напоминание которым так и не ушло"""
+    subscription_ids = list(subscription_ids)
+    if not subscription_ids:
+        return 0
+    with get_db() as db:
+        return db.execute(
+            update(Subscription).where(Subscription.id.in_(subscription_ids)).values(
+                reminder_sent_at=None
+            ).execution_options(synchronize_session=False)
+        ).rowcount
+
+
+# МАССОВЫЕ ОПЕРАЦИИ
+
+BULK_ACTIONS = ('grant', 'extend', 'revoke')
+
+# Дата окончания подписки "навсегда"
+FOREVER_END_DATE = datetime(2100, 1, 1)
+
+
+def _plus_days(db, column, days: int):
+    if db.get_bind().dialect.name == 'sqlite':
+        # datetime() отбрасывает микросекунды - дописываем их из исходного значения
+        return func.datetime(column, f'{days:+d} days').op('||')(func.substr(column, 20))
+    return column + timedelta(days=days)
+
+
+@observe_db
+def bulk_apply_subscriptions(operations: List[Dict], reference: str) -> Dict:
+    """
+    Применяет пачку операций одной транзакцией: запросы идут на всю пачку
+    (по IN-спискам), а не на каждого пользователя.
+
+    Args:
+        operations: Словари user_id, tariff_id, action (grant/extend/revoke), days.
+            grant без days - подписка навсегда, с days - только на срок тарифа
+            из DURATION_DAYS (иначе ValueError); последняя операция над парой
+            (пользователь, тариф) перекрывает предыдущие
+        reference: Метка пачки для ID ручных платежей (MANUAL_<reference>_<n>)
+
+    Returns:
+        Dict: granted, extended, revoked - сколько подписок затронуто,
+        grants - [(user_id, tariff_id)] для выдачи доступа,
+        revokes - [(user_id, tariff_id, [оставшиеся tariff_id])] для отзыва
+    """
+    now = datetime.utcnow()
+    latest = {(op['user_id'], op['tariff_id']): op for op in operations}
+    by_action = {action: [op for op in latest.values() if op['action'] == action] for action in BULK_ACTIONS}
+
+    # Название тарифа с подписью срока должно совпадать с реальной длиной подписки
+    durations = {days: duration for duration, days in DURATION_DAYS.items()}
+    unnamed = sorted({op['days'] for op in by_action['grant'] if op['days'] not in durations})
+    if unnamed:
+        raise ValueError(f"grant на {unnamed} дней: у тарифов нет такого срока")
+    result = {'granted': 0, 'extended': 0, 'revoked': 0, 'grants': [], 'revokes': []}
+
+    with get_db() as db:
+        grants = by_action['grant']
+        if grants:
+            user_ids = sorted({op['user_id'] for op in grants})
+            existing = set()
+            history = {}
+            for chunk in rollups.chunked(user_ids):
+                existing.update(db.scalars(select(User.user_id).where(User.user_id.in_(chunk))))
+                history.update({
+                    user_id: [previous, active]
+                    for user_id, previous, active in db.query(
+                        Subscription.user_id, func.count(Subscription.id),
+                        func.count(case((and_(Subscription.status == SubscriptionStatus.ACTIVE,
+                                              Subscription.end_date > now), 1)))
+                    ).filter(Subscription.user_id.in_(chunk)).group_by(Subscription.user_id)
+                })
+
+            new_users = [user_id for user_id in user_ids if user_id not in existing]
+            if new_users:
+                db.execute(insert(User), [
+                    {'user_id': user_id, 'username': '', 'registration_date': now, 'last_activity': now}
+                    for user_id in new_users
+                ])
+                rollups.on_users_created_bulk(db, now, len(new_users))
+
+            payments, subscriptions, events = [], [], []
+            for number, op in enumerate(grants):
+                user_id = op['user_id']
+                tariff = tariff_display_name(op['tariff_id'], durations[op['days']])
+                payment_id = f"MANUAL_{reference}_{number}"
+                payments.append({
+                    'user_id': user_id, 'payment_id': payment_id, 'tariff': tariff, 'amount': 0.0,
+                    'status': PaymentStatus.COMPLETED, 'method': PaymentMethod.MANUAL,
+                    'payment_date': now, 'updated_at': now
+                })
+                subscriptions.append({
+                    'user_id': user_id, 'payment_id': payment_id, 'tariff': tariff, 'start_date': now,
+                    'end_date': now + timedelta(days=op['days']) if op['days'] else FOREVER_END_DATE,
+                    'status': SubscriptionStatus.ACTIVE
+                })
+
+                previous, active = history.setdefault(user_id, [0, 0])
+                events.append((user_id, now, 'renewals' if previous else 'first_subscriptions'))
+                if not active:
+                    events.append((user_id, now, 'activations'))
+                history[user_id] = [previous + 1, active + 1]
+
+            db.execute(insert(Payment), payments)
+            db.execute(insert(Subscription), subscriptions)
+            rollups.cohort_events_bulk(db, events)
+            result['granted'] = len(grants)
+            result['grants'] = [(op['user_id'], op['tariff_id']) for op in grants]
+
+        # Продление: один UPDATE на тариф и срок
+        extend_groups = {}
+        for op in by_action['extend']:
+            extend_groups.setdefault((op['tariff_id'], op['days']), []).append(op['user_id'])
+        for (tariff_id, days), user_ids in extend_groups.items():
+            for chunk in rollups.chunked(user_ids):
+                result['extended'] += db.execute(
+                    update(Subscription).where(
+                        Subscription.user_id.in_(chunk),
+                        Subscription.tariff.in_(tariff_names(tariff_id)),
+                        Subscription.status == SubscriptionStatus.ACTIVE,
+                        Subscription.end_date > now
+                    ).values(
+                        end_date=_plus_days(db, Subscription.end_date, days),
+                        reminder_sent_at=None  # Новый срок - новое напоминание
+                    ).execution_options(synchronize_session=False)
+                ).rowcount
+
+        # Отзыв: отменяем подписки тарифа, отток - у кого не осталось других
+        revoke_groups = {}
+        for op in by_action['revoke']:
+            revoke_groups.setdefault(op['tariff_id'], []).append(op['user_id'])
+        revoked = set()
+        for tariff_id, user_ids in revoke_groups.items():
+            for chunk in rollups.chunked(user_ids):
+                rows = db.query(Subscription.id, Subscription.user_id).filter(
+                    Subscription.user_id.in_(chunk),
+                    Subscription.tariff.in_(tariff_names(tariff_id)),
+                    Subscription.status == SubscriptionStatus.ACTIVE
+                ).all()
+                if not rows:
+                    continue
+                db.execute(
+                    update(Subscription).where(Subscription.id.in_([row.id for row in rows])).values(
+                        status=SubscriptionStatus.CANCELLED
+                    ).execution_options(synchronize_session=False)
+                )
+                result['revoked'] += len(rows)
+                revoked.update((row.user_id, tariff_id) for row in rows)
+
+        if revoked:
+            remaining = {}
+            for chunk in rollups.chunked(sorted({user_id for user_id, _ in revoked})):
+                for user_id, tariff in db.query(Subscription.user_id, Subscription.tariff).filter(
+                        Subscription.user_id.in_(chunk),
+                        Subscription.status == SubscriptionStatus.ACTIVE,
+                        Subscription.end_date > now
+                ):
+                    parsed = parse_tariff(tariff)
+                    remaining.setdefault(user_id, set()).add(parsed[0] if parsed else tariff)
+
+            churned = {user_id for user_id, _ in revoked if user_id not in remaining}
+            rollups.cohort_events_bulk(db, [(user_id, now, 'churned') for user_id in sorted(churned)])
+            result['revokes'] = [
+                (user_id, tariff_id, sorted(remaining.get(user_id, ())))
+                for user_id, tariff_id in sorted(revoked)
+            ]
+
+        entitlements.refresh_users(db, {user_id for user_id, _ in latest})
+
+    logger.info(
+        "📦 Массовая операция %s: выдано %d, продлено %d, отозвано %d",
+        reference, result['granted'], result['extended'], result['revoked']
+    )
+    return result
+
+
+# ДОСТУП К КАНАЛАМ
+
+@observe_db
+def has_entitlement(user_id: int, chat_id: int) -> bool:
+    """Есть ли у пользователя действующий доступ именно к этому каналу"""
+    with get_db() as db:
+        entitlement = db.get(Entitlement, (chat_id, user_id))
+        return entitlement is not None and entitlement.valid_until > datetime.utcnow()
+
+
+@observe_db
+def filter_entitled(pairs: List[Tuple[int, int]]) -> set:
+    """Какие из пар (chat_id, user_id) имеют действующий доступ - одним запросом на пачку"""
+    if not pairs:
+        return set()
+    with get_db() as db:
+        rows = db.query(Entitlement.chat_id, Entitlement.user_id).filter(
+            Entitlement.user_id.in_({user_id for _, user_id in pairs}),
+            Entitlement.chat_id.in_({chat_id for chat_id, _ in pairs}),
+            Entitlement.valid_until > datetime.utcnow()
+        ).all()
+    return {tuple(row) for row in rows} & set(pairs)
+
+
+def iter_entitlements(batch_size: int = 10000) -> Iterator[List[Tuple]]:
+    """Весь действующий доступ пачками (chat_id, user_id, valid_until), по порядку chat_id, user_id"""
+    with get_db() as db:
+        result = db.execute(
+            select(Entitlement.chat_id, Entitlement.user_id, Entitlement.valid_until)
+            .where(Entitlement.valid_until > datetime.utcnow())
+            .order_by(Entitlement.chat_id, Entitlement.user_id)
+            .execution_options(yield_per=batch_size)
+        )
+        for partition in result.partitions():
+            yield partition
+
+
+@observe_db
+def get_entitlement_changes(since: datetime, limit: int) -> List[Tuple]:
+    """Строки доступа, изменённые после since (chat_id, user_id, valid_until, updated_at)"""
+    with get_db() as db:
+        return db.query(
+            Entitlement.chat_id, Entitlement.user_id, Entitlement.valid_until, Entitlement.updated_at
+        ).filter(Entitlement.updated_at > since).order_by(Entitlement.updated_at).limit(limit).all()
+
+
 # ИНВАЙТЫ
 
-def save_invite(user_id: int, chat_id: int, invite_link: str) -> Invite:
+@observe_db
+def save_invite(user_id: int, chat_id: int, invite_link: str, expires_at: datetime = None) -> Invite:
     """Сохраняет новую инвайт-ссылку"""
     with get_db() as db:
         invite = Invite(
             user_id=user_id,
             chat_id=chat_id,
-            invite_link=invite_link
+            invite_link=invite_link,
+            expires_at=expires_at
         )
 
         db.add(invite)
         db.flush()
         db.refresh(invite)
 
-        logger.debug(f"Инвайт для {user_id} в чат {chat_id} сохранён")
+        logger.debug("Инвайт для %s в чат %s сохранён", user_id, chat_id)
         return invite
 
 
+@observe_db
 def mark_invite_used(invite_link: str) -> bool:
     """Помечает инвайт-ссылку как использованную"""
     with get_db() as db:
         invite = db.query(Invite).filter(Invite.invite_link == invite_link).first()
 
         if not invite:
-            logger.warning(f"Инвайт {invite_link} не найден")
+            logger.warning("Инвайт %s не найден", invite_link)
             return False
 
         invite.mark_as_used()
-        logger.debug(f"Инвайт {invite_link} помечен как использованный")
+        logger.debug("Инвайт %s помечен как использованный", invite_link)
         return True
 
 
+@observe_db
 def is_valid_invite(user_id: int, chat_id: int, invite_link: str) -> bool:
     """Проверяет, действительна ли инвайт-ссылка"""
     with get_db() as db:
@@ -347,4 +809,282 @@ def is_valid_invite(user_id: int, chat_id: int, invite_link: str) -> bool:
             )
         ).first()
 
-        return invite is not None
\ No newline at end of file
+        return invite is not None
+
+
+# ПУЛ ИНВАЙТОВ
+
+@observe_db
+def add_pool_invites(chat_id: int, links: List[Tuple[str, datetime]]) -> int:
+    """Кладёт в пул свободные ссылки канала (invite_link, expires_at)"""
+    if not links:
+        return 0
+    now = datetime.utcnow()
+    with get_db() as db:
+        db.execute(insert(Invite), [
+            {'chat_id': chat_id, 'invite_link': link, 'expires_at': expires_at, 'is_used': False, 'created_at': now}
+            for link, expires_at in links
+        ])
+    return len(links)
+
+
+@observe_db
+def get_pool_levels(valid_after: datetime) -> Dict[int, int]:
+    """Свободных ссылок по каналам, действующих дольше valid_after"""
+    with get_db() as db:
+        return dict(db.query(Invite.chat_id, func.count(Invite.id)).filter(
+            Invite.user_id.is_(None),
+            Invite.expires_at > valid_after
+        ).group_by(Invite.chat_id).all())
+
+
+@observe_db
+def assign_pool_invite(user_id: int, chat_id: int, valid_after: datetime) -> Optional[str]:
+    """
+    Атомарно выдаёт пользователю свободную ссылку канала, действующую дольше
+    valid_after. Параллельные выдачи не получат одну ссылку (SKIP LOCKED).
+    Возвращает ссылку или None, если пул канала пуст.
+    """
+    free = select(Invite.id).where(
+        Invite.chat_id == chat_id,
+        Invite.user_id.is_(None),
+        Invite.expires_at > valid_after
+    ).order_by(Invite.expires_at).limit(1).with_for_update(skip_locked=True)
+
+    with get_db() as db:
+        return db.execute(
+            update(Invite).where(
+                Invite.id == free.scalar_subquery(),
+                Invite.user_id.is_(None)
+            ).values(user_id=user_id, assigned_at=datetime.utcnow()).returning(
+                Invite.invite_link
+            ).execution_options(synchronize_session=False)
+        ).scalar()
+
+
+@observe_db
+def take_expiring_pool_invites(valid_after: datetime, limit: int) -> List[Tuple[int, str]]:
+    """
+    Удаляет из пула до limit свободных ссылок, которые уже не прослужат
+    до valid_after, и возвращает (chat_id, invite_link) для отзыва в Telegram
+    """
+    expiring = select(Invite.id).where(
+        Invite.user_id.is_(None),
+        Invite.expires_at <= valid_after
+    ).limit(limit).with_for_update(skip_locked=True)
+
+    with get_db() as db:
+        rows = db.execute(
+            Invite.__table__.delete().where(
+                Invite.id.in_(expiring.scalar_subquery()),
+                Invite.user_id.is_(None)
+            ).returning(Invite.chat_id, Invite.invite_link)
+        ).all()
+        return [tuple(row) for row in rows]
+
+
+# ОЧИСТКА ИНВАЙТОВ
+
+@observe_db
+def delete_dead_invites(after_id: int, expired_before: datetime, legacy_before: datetime,
+                        limit: int) -> List[Tuple]:
+    """
+    Удаляет до limit неиспользованных выданных ссылок с id > after_id, срок которых
+    истёк (без expires_at - созданных раньше legacy_before). Свободные ссылки пула
+    не трогает. Возвращает (id, chat_id, invite_link, expires_at) удалённых.
+    """
+    dead = select(Invite.id).where(
+        Invite.id > after_id,
+        Invite.is_used == False,
+        Invite.user_id.isnot(None),
+        or_(
+            Invite.expires_at < expired_before,
+            and_(Invite.expires_at.is_(None), Invite.created_at < legacy_before)
+        )
+    ).order_by(Invite.id).limit(limit).with_for_update(skip_locked=True)
+
+    with get_db() as db:
+        rows = db.execute(
+            Invite.__table__.delete().where(Invite.id.in_(dead.scalar_subquery())).returning(
+                Invite.id, Invite.chat_id, Invite.invite_link, Invite.expires_at
+            )
+        ).all()
+        return [tuple(row) for row in rows]
+
+
+@observe_db
+def archive_used_invites(after_id: int, used_before: datetime, limit: int, archive: bool) -> List[int]:
+    """
+    Переносит в invites_archive (archive=False - просто удаляет) до limit
+    использованных ссылок с id > after_id, использованных раньше used_before.
+    Возвращает id обработанных строк.
+    """
+    with get_db() as db:
+        ids = db.execute(
+            select(Invite.id).where(
+                Invite.id > after_id,
+                Invite.is_used == True,
+                Invite.used_at < used_before
+            ).order_by(Invite.id).limit(limit).with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not ids:
+            return []
+
+        if archive:
+            columns = [column.name for column in Invite.__table__.columns]
+            db.execute(insert(InviteArchive).from_select(
+                columns + ['archived_at'],
+                select(*Invite.__table__.columns, literal(datetime.utcnow())).where(Invite.id.in_(ids))
+            ))
+        db.query(Invite).filter(Invite.id.in_(ids)).delete(synchronize_session=False)
+        return ids
+
+
+@observe_db
+def get_table_sizes(table: str) -> Dict:
+    """
+    Размер таблицы и каждого её индекса в байтах:
+    {'rows', 'dead_rows', 'table', 'indexes': {имя: байты}}.
+    Удаление не уменьшает размер сразу: в PostgreSQL место удалённых строк
+    освобождается (auto)VACUUM, до него они видны как dead_rows (по статистике,
+    с задержкой). В SQLite dead_rows - None.
+    """
+    with get_db() as db:
+        rows = db.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+        dead_rows = None
+        if db.get_bind().dialect.name == 'postgresql':
+            table_bytes = db.execute(text('SELECT pg_relation_size(:t)'), {'t': table}).scalar()
+            dead_rows = db.execute(text(
+                'SELECT n_dead_tup FROM pg_stat_user_tables WHERE relid = CAST(:t AS regclass)'
+            ), {'t': table}).scalar()
+            indexes = db.execute(text(
+                'SELECT indexrelid::regclass::text, pg_relation_size(indexrelid) FROM pg_index '
+                'WHERE indrelid = CAST(:t AS regclass)'
+            ), {'t': table}).all()
+        else:
+            # SQLite: постранично из dbstat
+            sizes = dict(db.execute(text('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name')).all())
+            names = db.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"
+            ), {'t': table}).scalars().all()
+            table_bytes = sizes.get(table, 0)
+            indexes = [(name, sizes.get(name, 0)) for name in names]
+        return {'rows': rows, 'dead_rows': dead_rows, 'table': table_bytes, 'indexes': dict(indexes)}
+
+
+# ПЕРЕВОДЫ USDT
+
+@observe_db
+def save_transfers(transfers: List[Dict]) -> int:
+    """
+    Сохраняет переводы без дублей по transaction_id. Уже известный перевод
+    только отмечается подтверждённым. Возвращает число полученных переводов.
+    """
+    rows = list({transfer['transaction_id']: transfer for transfer in transfers}.values())
+    if not rows:
+        return 0
+    table = CryptoTransfer.__table__
+    with get_db() as db:
+        statement = rollups.DIALECT_INSERTS[db.get_bind().dialect.name](table).values(rows)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=['transaction_id'],
+            set_={
+                'confirmed': or_(table.c.confirmed, statement.excluded.confirmed),
+                'confirmed_at': func.coalesce(table.c.confirmed_at, statement.excluded.confirmed_at),
+            }
+        ))
+    return len(rows)
+
+
+@observe_db
+def get_transfers_synced_until() -> Optional[datetime]:
+    """Время блока самого нового подтверждённого перевода"""
+    with get_db() as db:
+        return db.query(func.max(CryptoTransfer.block_timestamp)).filter(CryptoTransfer.confirmed == True).scalar()
+
+
+@observe_db
+def find_usdt_transfer(payment_id: str, to_address: str, min_value: int) -> Optional[str]:
+    """transaction_id подтверждённого входящего перевода по платежу не меньше min_value или None"""
+    # Основная база: перевод читается сразу после записи в TronLedger.refresh, реплика может отставать
+    with get_db() as db:
+        return db.query(CryptoTransfer.transaction_id).filter(
+            CryptoTransfer.payment_id == payment_id,
+            CryptoTransfer.confirmed == True,
+            CryptoTransfer.value >= min_value,
+            func.lower(CryptoTransfer.to_address) == to_address.lower()
+        ).limit(1).scalar()
+
+
+@observe_db
+def search_transfers(payment_id: str = None, from_address: str = None, transaction_id: str = None,
+                     limit: int = 50) -> List[Dict]:
+    """Поиск переводов для администратора, новые первыми"""
+    with get_db(read_only=True) as db:
+        query = db.query(CryptoTransfer)
+        if payment_id:
+            query = query.filter(CryptoTransfer.payment_id == payment_id)
+        if from_address:
+            query = query.filter(CryptoTransfer.from_address == from_address)
+        if transaction_id:
+            query = query.filter(CryptoTransfer.transaction_id == transaction_id)
+
+        return [
+            {
+                'transaction_id': transfer.transaction_id,
+                'from_address': transfer.from_address,
+                'to_address': transfer.to_address,
+                'amount': transfer.value / 10 ** 6,
+                'payment_id': transfer.payment_id,
+                'block_timestamp': transfer.block_timestamp,
+                'confirmed': transfer.confirmed,
+                'confirmed_at': transfer.confirmed_at,
+            }
+            for transfer in query.order_by(CryptoTransfer.block_timestamp.desc()).limit(limit)
+        ]
+
+
+# СПРАВОЧНИК ТАРИФОВ
+
+# Канал LISTEN/NOTIFY о новой версии справочника (PostgreSQL)
+CATALOG_CHANNEL = 'catalog_changed'
+
+
+@observe_db
+def get_latest_catalog(after_version: int = 0) -> Optional[Tuple[int, Dict]]:
+    """(version, data) последней версии справочника, если она новее after_version"""
+    with get_db() as db:
+        row = db.query(CatalogVersion.version, CatalogVersion.data).filter(
+            CatalogVersion.version > after_version
+        ).order_by(CatalogVersion.version.desc()).first()
+        return tuple(row) if row else None
+
+
+@observe_db
+def get_catalog_version(version: int) -> Optional[Dict]:
+    with get_db(read_only=True) as db:
+        return db.query(CatalogVersion.data).filter(CatalogVersion.version == version).scalar()
+
+
+@observe_db
+def list_catalog_versions(limit: int = 20) -> List[Dict]:
+    with get_db(read_only=True) as db:
+        rows = db.query(CatalogVersion.version, CatalogVersion.comment, CatalogVersion.created_at).order_by(
+            CatalogVersion.version.desc()
+        ).limit(limit).all()
+        return [{'version': version, 'comment': comment, 'created_at': created_at} for version, comment, created_at in rows]
+
+
+@observe_db
+def publish_catalog(data: Dict, comment: str = None) -> int:
+    """Сохраняет новую версию справочника и уведомляет процессы бота; возвращает номер версии"""
+    with get_db() as db:
+        catalog = CatalogVersion(data=data, comment=comment)
+        db.add(catalog)
+        db.flush()
+        if db.get_bind().dialect.name == 'postgresql':
+            # Уведомление доставляется при коммите транзакции
+            db.execute(text('SELECT pg_notify(:channel, :version)'),
+                       {'channel': CATALOG_CHANNEL, 'version': str(catalog.version)})
+        logger.info("📚 Опубликована версия справочника %d (%s)", catalog.version, comment or 'без комментария')
+        return catalog.version
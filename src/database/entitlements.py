@@ -0,0 +1,153 @@
+"""
+Таблица entitlements: доступ (канал, пользователь) → valid_until.
+
+Поддерживается в тех же транзакциях, что и подписки: новая подписка
+продлевает valid_until по каналам тарифа, продление, истечение и отзыв
+пересчитывают доступ пользователя по его активным подпискам. Просроченные
+строки не удаляются фоном - проверка сравнивает valid_until с текущим временем.
+Потерянный доступ тоже не удаляется, а закрывается (valid_until = сейчас):
+так изменение видно по updated_at индексу доступа в памяти бота.
+
+После смены каналов тарифа в справочнике доступ его подписчиков
+пересчитывается при подмене снимка (refresh_tariffs).
+
+Полный пересчёт (после миграции или ручных правок подписок):
+
+    python -m src.database.entitlements --rebuild
+"""
+import argparse
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import func, update
+
+from src.services.catalog import channels_for_tariff, parse_tariff
+from .database import get_db
+from .models import Entitlement, Subscription, SubscriptionStatus
+from .rollups import DIALECT_INSERTS, REBUILD_BATCH_SIZE, chunked
+
+logger = logging.getLogger(__name__)
+
+
+def _greatest(db, left, right):
+    if db.get_bind().dialect.name == 'sqlite':
+        return func.max(left, right)
+    return func.greatest(left, right)
+
+
+def channels_for(tariff: str):
+    """Каналы сохранённого тарифа; для неизвестного названия - ни одного"""
+    parsed = parse_tariff(tariff)
+    return channels_for_tariff(parsed[0]) if parsed else []
+
+
+def _upsert(db, rows, keep_longer: bool):
+    table = Entitlement.__table__
+    statement = DIALECT_INSERTS[db.get_bind().dialect.name](table).values(rows)
+    valid_until = statement.excluded.valid_until
+    db.execute(statement.on_conflict_do_update(
+        index_elements=['chat_id', 'user_id'],
+        set_={
+            'valid_until': _greatest(db, table.c.valid_until, valid_until) if keep_longer else valid_until,
+            'updated_at': statement.excluded.updated_at,
+        }
+    ))
+
+
+def grant(db, user_id: int, tariff: str, valid_until: datetime):
+    """Доступ ко всем каналам тарифа до valid_until (уже действующий дольше не сокращается)"""
+    now = datetime.utcnow()
+    rows = [
+        {'chat_id': chat_id, 'user_id': user_id, 'valid_until': valid_until, 'updated_at': now}
+        for chat_id in channels_for(tariff)
+    ]
+    if rows:
+        _upsert(db, rows, keep_longer=True)
+
+
+def _collect(rows: Iterable[Tuple[int, str, datetime]]) -> Dict[Tuple[int, int], datetime]:
+    """(user_id, tariff, end_date) активных подписок → {(chat_id, user_id): valid_until}"""
+    access = {}
+    for user_id, tariff, end_date in rows:
+        for chat_id in channels_for(tariff):
+            key = (chat_id, user_id)
+            if key not in access or access[key] < end_date:
+                access[key] = end_date
+    return access
+
+
+def _rows(access: Dict[Tuple[int, int], datetime], now: datetime):
+    return [
+        {'chat_id': chat_id, 'user_id': user_id, 'valid_until': valid_until, 'updated_at': now}
+        for (chat_id, user_id), valid_until in access.items()
+    ]
+
+
+def _active_subscriptions(db, now: datetime):
+    return db.query(Subscription.user_id, Subscription.tariff, func.max(Subscription.end_date)).filter(
+        Subscription.status == SubscriptionStatus.ACTIVE,
+        Subscription.end_date > now
+    ).group_by(Subscription.user_id, Subscription.tariff)
+
+
+def refresh_users(db, user_ids: Iterable[int]):
+    """Пересчитывает доступ пользователей по их активным подпискам (после продления, истечения, отзыва)"""
+    now = datetime.utcnow()
+    for chunk in chunked(sorted(set(user_ids))):
+        # Сначала закрываем весь действующий доступ, затем открываем то, что осталось
+        db.execute(update(Entitlement).where(
+            Entitlement.user_id.in_(chunk),
+            Entitlement.valid_until > now
+        ).values(valid_until=now, updated_at=now).execution_options(synchronize_session=False))
+
+        access = _collect(_active_subscriptions(db, now).filter(Subscription.user_id.in_(chunk)))
+        if access:
+            _upsert(db, _rows(access, now), keep_longer=False)
+
+
+def refresh_tariffs(tariff_names: Iterable[str]) -> int:
+    """
+    Пересчитывает доступ владельцев активных подписок с этими названиями тарифов
+    по действующему справочнику. Возвращает число пользователей.
+    """
+    now = datetime.utcnow()
+    with get_db() as db:
+        user_ids = [user_id for user_id, in db.query(Subscription.user_id).filter(
+            Subscription.tariff.in_(list(tariff_names)),
+            Subscription.status == SubscriptionStatus.ACTIVE,
+            Subscription.end_date > now
+        ).distinct()]
+        refresh_users(db, user_ids)
+    return len(user_ids)
+
+
+def rebuild_entitlements() -> int:
+    """Полный пересчёт entitlements по активным подпискам"""
+    now = datetime.utcnow()
+    with get_db() as db:
+        access = _collect(_active_subscriptions(db, now).execution_options(yield_per=REBUILD_BATCH_SIZE))
+        db.query(Entitlement).delete()
+        for keys in chunked(list(access), REBUILD_BATCH_SIZE):
+            db.execute(Entitlement.__table__.insert(), _rows({key: access[key] for key in keys}, now))
+
+    logger.info("🔑 entitlements пересчитана: %d строк", len(access))
+    return len(access)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Доступ к каналам по активным подпискам')
+    parser.add_argument('--rebuild', action='store_true', help='Пересчитать таблицу entitlements')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        from .database import init_db
+
+        init_db()
+        print(f"✅ entitlements: {rebuild_entitlements()} строк")
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
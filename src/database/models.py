@@ -1,8 +1,8 @@
 """SQLAlchemy модели для базы данных"""
 from datetime import datetime
 from sqlalchemy import (
-    Column, Integer, BigInteger, String, Float, DateTime,
-    Boolean, ForeignKey, Enum as SQLEnum
+    Column, Integer, BigInteger, String, Float, Date, DateTime,
+    Boolean, ForeignKey, Index, JSON, Enum as SQLEnum, text
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -24,6 +24,7 @@ class PaymentMethod(enum.Enum):
     CARD = "card"
     SBP = "sbp"
     USDT = "usdt"
+    MANUAL = "manual"  # Выдано администратором (массовые операции API)
 
 
 class SubscriptionStatus(enum.Enum):
@@ -90,10 +91,16 @@ class Subscription(Base):
     end_date = Column(DateTime, nullable=False, index=True)
     
     status = Column(SQLEnum(SubscriptionStatus), default=SubscriptionStatus.ACTIVE, nullable=False, index=True)
+    reminder_sent_at = Column(DateTime, nullable=True)  # Напоминание о продлении уже отправлено
 
     # Relationships
     user = relationship("User", back_populates="subscriptions")
 
+    __table_args__ = (
+        # Диапазон "истекает в ближайшие N дней" среди активных подписок
+        Index('ix_subscriptions_status_end_date', 'status', 'end_date'),
+    )
+
     def __repr__(self):
         return f"<Subscription(user_id={self.user_id}, tariff={self.tariff}, status={self.status.value})>"
 
@@ -108,13 +115,21 @@ class Invite(Base):
     __tablename__ = 'invites'
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(BigInteger, ForeignKey('users.user_id'), nullable=False, index=True)
-    chat_id = Column(Integer, nullable=False)
+    user_id = Column(BigInteger, ForeignKey('users.user_id'), nullable=True, index=True)  # NULL - ссылка в пуле
+    chat_id = Column(BigInteger, nullable=False)  # ID каналов вида -100XXXXXXXXXX не помещаются в INTEGER
     invite_link = Column(String(512), nullable=False, unique=True, index=True)
     
     is_used = Column(Boolean, default=False, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     used_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)  # Срок ссылки в Telegram (для ссылок из пула)
+    assigned_at = Column(DateTime, nullable=True)  # Когда ссылка из пула выдана пользователю
+
+    __table_args__ = (
+        # Свободные ссылки пула по каналу
+        Index('ix_invites_pool', 'chat_id', 'expires_at',
+              postgresql_where=text('user_id IS NULL'), sqlite_where=text('user_id IS NULL')),
+    )
 
     # Relationship
     user = relationship("User", back_populates="invites")
@@ -126,3 +141,140 @@ class Invite(Base):
         """Помечает инвайт как использованный"""
         self.is_used = True
         self.used_at = datetime.utcnow()
+
+
+class InviteArchive(Base):
+    """Использованные инвайт-ссылки старше срока хранения (переносятся из invites очисткой)"""
+    __tablename__ = 'invites_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # id из invites
+    user_id = Column(BigInteger, nullable=True)
+    chat_id = Column(BigInteger, nullable=False)
+    invite_link = Column(String(512), nullable=False)
+    is_used = Column(Boolean, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+    assigned_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class Entitlement(Base):
+    """
+    Текущий доступ пользователя к каналу: до какого момента он действует.
+    Производная от активных подписок (см. src.database.entitlements),
+    проверка при вступлении - одно чтение по первичному ключу.
+    """
+    __tablename__ = 'entitlements'
+
+    chat_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    valid_until = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)  # Для опроса изменений
+
+    def __repr__(self):
+        return f"<Entitlement(chat_id={self.chat_id}, user_id={self.user_id}, valid_until={self.valid_until})>"
+
+
+class CryptoTransfer(Base):
+    """
+    Переводы TRC-20 USDT по адресу оплаты, загруженные из TronGrid
+    (см. src.services.tron_ledger). Проверка оплаты USDT - запрос по payment_id.
+    """
+    __tablename__ = 'crypto_transfers'
+
+    id = Column(Integer, primary_key=True)
+    transaction_id = Column(String(100), nullable=False, unique=True)
+    from_address = Column(String(64), nullable=False, index=True)
+    to_address = Column(String(64), nullable=False)
+    value = Column(BigInteger, nullable=False)  # В минимальных единицах токена (USDT - 6 знаков)
+    payment_id = Column(String(255), nullable=True, index=True)  # ID платежа из данных перевода
+    block_timestamp = Column(DateTime, nullable=False, index=True)
+    confirmed = Column(Boolean, default=False, nullable=False)
+    first_seen_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    confirmed_at = Column(DateTime, nullable=True)  # Когда перевод впервые виден подтверждённым
+
+    def __repr__(self):
+        return f"<CryptoTransfer(transaction_id={self.transaction_id}, payment_id={self.payment_id}, value={self.value})>"
+
+
+class CatalogVersion(Base):
+    """
+    Версия справочника тарифов и каналов (см. src.services.catalog):
+    {'tariffs': {...}, 'channels': {...}} в формате TARIFFS и CHANNELS из config.
+    Действует последняя версия, прежние остаются для истории и отката.
+    """
+    __tablename__ = 'catalog_versions'
+
+    version = Column(Integer, primary_key=True)
+    data = Column(JSON, nullable=False)
+    comment = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<CatalogVersion(version={self.version}, comment={self.comment})>"
+
+
+class SchemaVersion(Base):
+    """
+    Отпечаток схемы, до которой доведена база (см. database.init_db).
+    Совпал с отпечатком моделей - при запуске создание таблиц и проверка колонок пропускаются.
+    """
+    __tablename__ = 'schema_version'
+
+    version = Column(String(64), primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<SchemaVersion(version={self.version}, applied_at={self.applied_at})>"
+
+
+class RevenueDaily(Base):
+    """
+    Дневной агрегат платежей по тарифу и методу оплаты.
+    Поддерживается инкрементально из db_manager (см. src.database.rollups).
+    """
+    __tablename__ = 'revenue_daily'
+
+    day = Column(Date, primary_key=True)
+    tariff = Column(String(255), primary_key=True)
+    method = Column(SQLEnum(PaymentMethod), primary_key=True)
+
+    # Созданные платежи считаются в день создания, оплаченные - в день оплаты
+    payments_created = Column(Integer, default=0, nullable=False)
+    payments_completed = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0, nullable=False)
+    time_to_pay_seconds = Column(Float, default=0, nullable=False)  # Сумма по оплаченным за день
+
+    def __repr__(self):
+        return f"<RevenueDaily(day={self.day}, tariff={self.tariff}, method={self.method.value})>"
+
+
+class CohortUsers(Base):
+    """Размер месячной когорты: пользователи, зарегистрированные в этом месяце"""
+    __tablename__ = 'cohort_users'
+
+    cohort_month = Column(Date, primary_key=True)
+    users = Column(Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<CohortUsers(cohort_month={self.cohort_month}, users={self.users})>"
+
+
+class CohortActivity(Base):
+    """
+    Матрица когорт: события подписок когорты в N-й месяц после регистрации.
+    Поддерживается инкрементально (см. src.database.rollups).
+    """
+    __tablename__ = 'cohort_activity'
+
+    cohort_month = Column(Date, primary_key=True)
+    period = Column(Integer, primary_key=True)  # Месяцев от месяца регистрации
+
+    first_subscriptions = Column(Integer, default=0, nullable=False)  # Первая подписка пользователя
+    renewals = Column(Integer, default=0, nullable=False)  # Повторные подписки
+    activations = Column(Integer, default=0, nullable=False)  # Пользователь получил доступ (не имея его)
+    churned = Column(Integer, default=0, nullable=False)  # Пользователь потерял доступ
+
+    def __repr__(self):
+        return f"<CohortActivity(cohort_month={self.cohort_month}, period={self.period})>"
@@ -0,0 +1,352 @@
+"""
+Секционирование payments в PostgreSQL: PARTITION BY RANGE (payment_date) по месяцам.
+
+Секции payments_YYYY_MM, даты вне созданных месяцев попадают в payments_default.
+Запросы с фильтром по дате читают только свои секции. Дата платежа не меняется,
+поэтому смена статуса остаётся обновлением строки на месте (без переноса между
+секциями, который ломает SELECT ... FOR UPDATE в update_payment_status).
+Модель Payment не меняется: для ORM payments остаётся обычной таблицей.
+
+Закрытые платежи (FAILED, CANCELLED) месяцев старше срока переносятся пачками
+в payments_archive.payments_YYYY_MM_closed.
+
+Чем приходится платить:
+- ключ секционирования обязан входить в уникальные ключи: первичный ключ
+  (id, payment_date) и UNIQUE (payment_id, payment_date) - уникальность
+  payment_id по всей таблице база больше не проверяет (payment_id генерирует
+  приложение);
+- внешний ключ subscriptions.payment_id → payments.payment_id снимается:
+  PostgreSQL требует для него UNIQUE по payment_id без ключа секционирования;
+- ON CONFLICT (payment_id) не работает - migrate_csv_to_postgres.py отказывается
+  загружать данные в секционированную payments, миграцию запускать до перевода.
+
+Команды:
+    python -m src.database.partitions --convert           # перевести существующую таблицу онлайн
+    python -m src.database.partitions --maintain          # секции на PAYMENTS_PARTITIONS_AHEAD месяцев вперёд
+    python -m src.database.partitions --archive 2024-01   # закрытые платежи до месяца - в схему payments_archive
+"""
+import argparse
+import logging
+import re
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from src.config import PAYMENTS_ARCHIVE_AFTER_MONTHS, PAYMENTS_PARTITIONS_AHEAD
+from .database import get_engine
+from .models import Payment
+from .rollups import month_start
+
+logger = logging.getLogger(__name__)
+
+PARENT = 'payments'
+CONVERTED = 'payments_new'  # Секционированная копия на время перевода
+OLD = 'payments_unpartitioned'  # Исходная таблица после перевода (удалить вручную после проверки)
+ARCHIVE_SCHEMA = 'payments_archive'
+
+# Статусы, которые больше не меняются и уходят в архив
+CLOSED_STATUSES = ('FAILED', 'CANCELLED')
+
+CONVERT_BATCH_SIZE = 20000
+ARCHIVE_BATCH_SIZE = 5000
+SWAP_LOCK_TIMEOUT = '5s'
+
+_MONTH_NAME = re.compile(rf'^{PARENT}_(\d{{4}})_(\d{{2}})$')
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'{PARENT}_{month:%Y_%m}'
+
+
+def is_partitioned(connection, table: str = PARENT) -> bool:
+    return connection.exec_driver_sql(
+        f"SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('{table}'))"
+    ).scalar()
+
+
+def _partitions(connection, parent: str) -> List[str]:
+    return connection.exec_driver_sql(
+        f"SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        f"WHERE i.inhparent = to_regclass('{parent}') ORDER BY c.relname"
+    ).scalars().all()
+
+
+def create_month(connection, month: date, parent: str = PARENT) -> bool:
+    """Секция месяца; False - уже была"""
+    name = partition_name(month)
+    if connection.exec_driver_sql(f"SELECT to_regclass('{name}')").scalar():
+        return False
+    connection.exec_driver_sql(
+        f"CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+    )
+    return True
+
+
+def ensure_partitions(connection, first_month: date, months_ahead: int, parent: str = PARENT) -> List[str]:
+    """Секции от first_month до текущего месяца + months_ahead и секция по умолчанию"""
+    created = []
+    month, last = first_month, add_months(month_start(datetime.utcnow()), months_ahead)
+    while month <= last:
+        if create_month(connection, month, parent):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    connection.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {PARENT}_default PARTITION OF {parent} DEFAULT")
+    return created
+
+
+def archive_closed(before: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Переносит FAILED/CANCELLED-платежи месяцев раньше before в
+    payments_archive.payments_YYYY_MM_closed пачками по batch_size строк,
+    каждая пачка - своей транзакцией с блокировкой только переносимых строк.
+    Возвращает {архивная таблица: перенесено строк} для месяцев, где что-то перенесено.
+    """
+    statuses = ', '.join(f"'{status}'" for status in CLOSED_STATUSES)
+    with get_engine().begin() as connection:
+        connection.exec_driver_sql(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+        months = [
+            name for name in _partitions(connection, PARENT)
+            if (match := _MONTH_NAME.match(name)) and date(int(match[1]), int(match[2]), 1) < before
+        ]
+
+    archived = {}
+    for name in months:
+        target = f'{ARCHIVE_SCHEMA}.{name}_closed'
+        with get_engine().begin() as connection:
+            connection.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {target} (LIKE {PARENT} INCLUDING DEFAULTS)")
+
+        moved = 0
+        while True:
+            with get_engine().begin() as connection:
+                batch = connection.exec_driver_sql(f"""
+                    WITH moved AS (
+                        DELETE FROM {name} WHERE id IN (
+                            SELECT id FROM {name} WHERE status IN ({statuses})
+                            LIMIT {batch_size} FOR UPDATE SKIP LOCKED
+                        ) RETURNING *
+                    )
+                    INSERT INTO {target} SELECT * FROM moved
+                """).rowcount
+            moved += batch
+            if batch < batch_size:
+                break
+        if moved:
+            archived[target] = moved
+    return archived
+
+
+def maintain_partitions(months_ahead: int, archive_after_months: int) -> Optional[Dict]:
+    """Плановое обслуживание: секции вперёд, архив закрытых платежей. None - таблица не секционирована"""
+    if get_engine().dialect.name != 'postgresql':
+        return None
+    with get_engine().begin() as connection:
+        if not is_partitioned(connection):
+            return None
+        current = month_start(datetime.utcnow())
+        report = {'created': ensure_partitions(connection, current, months_ahead), 'archived': {}}
+    if archive_after_months:
+        report['archived'] = archive_closed(add_months(current, -archive_after_months))
+    with get_engine().connect() as connection:
+        report['default_rows'] = connection.exec_driver_sql(f"SELECT COUNT(*) FROM {PARENT}_default").scalar()
+
+    if report['created'] or report['archived']:
+        logger.info("🗂 Секции payments: созданы %s, в архиве %s", report['created'], report['archived'])
+    if report['default_rows']:
+        logger.warning("⚠️ В payments_default %d строк - для их месяцев нет секций", report['default_rows'])
+    return report
+
+
+# ПЕРЕВОД СУЩЕСТВУЮЩЕЙ ТАБЛИЦЫ
+
+def _columns(connection, table: str) -> List[str]:
+    return connection.exec_driver_sql(
+        f"SELECT column_name FROM information_schema.columns WHERE table_name = '{table}' ORDER BY ordinal_position"
+    ).scalars().all()
+
+
+def prepare_conversion(months_ahead: int):
+    """
+    Создаёт секционированную payments_new со всеми индексами модели и
+    триггер, зеркалирующий в неё изменения payments. Повторный вызов ничего не делает.
+    """
+    with get_engine().begin() as connection:
+        if connection.exec_driver_sql(f"SELECT to_regclass('{CONVERTED}')").scalar():
+            return
+        connection.exec_driver_sql(
+            f"CREATE TABLE {CONVERTED} (LIKE {PARENT} INCLUDING DEFAULTS) PARTITION BY RANGE (payment_date)"
+        )
+        connection.exec_driver_sql(f"ALTER TABLE {CONVERTED} ADD CONSTRAINT {CONVERTED}_pkey PRIMARY KEY (id, payment_date)")
+        connection.exec_driver_sql(
+            f"ALTER TABLE {CONVERTED} ADD CONSTRAINT {CONVERTED}_payment_id_key UNIQUE (payment_id, payment_date)"
+        )
+        connection.exec_driver_sql(
+            f"ALTER TABLE {CONVERTED} ADD CONSTRAINT {CONVERTED}_user_id_fkey "
+            f"FOREIGN KEY (user_id) REFERENCES users (user_id)"
+        )
+        # Индексы модели (без UNIQUE - его нельзя без ключа секционирования) под временными именами
+        for index in Payment.__table__.indexes:
+            columns = ', '.join(column.name for column in index.columns)
+            connection.exec_driver_sql(f"CREATE INDEX {index.name}_new ON {CONVERTED} ({columns})")
+
+        first = connection.exec_driver_sql(f"SELECT MIN(payment_date) FROM {PARENT}").scalar()
+        ensure_partitions(connection, month_start(first or datetime.utcnow()), months_ahead, CONVERTED)
+
+        columns = _columns(connection, PARENT)
+        assignments = ', '.join(f'{column} = EXCLUDED.{column}' for column in columns)
+        connection.exec_driver_sql(f"""
+            CREATE OR REPLACE FUNCTION {PARENT}_mirror() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP <> 'INSERT' THEN
+                    DELETE FROM {CONVERTED}
+                    WHERE id = OLD.id AND payment_date = OLD.payment_date;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    INSERT INTO {CONVERTED} SELECT NEW.*
+                    ON CONFLICT (id, payment_date) DO UPDATE SET {assignments};
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER {PARENT}_mirror AFTER INSERT OR UPDATE OR DELETE ON {PARENT} "
+            f"FOR EACH ROW EXECUTE FUNCTION {PARENT}_mirror()"
+        )
+    logger.info("🗂 %s создана, изменения payments зеркалируются", CONVERTED)
+
+
+def backfill(batch_size: int) -> int:
+    """
+    Копирует строки payments в payments_new пачками по id. FOR SHARE не даёт
+    записать устаревшую версию строки, которую параллельно меняет триггер;
+    уже зеркалированные строки пропускаются.
+    """
+    with get_engine().connect() as connection:
+        last_id = connection.exec_driver_sql(f"SELECT MAX(id) FROM {PARENT}").scalar() or 0
+
+    copied, start = 0, 0
+    while start < last_id:
+        with get_engine().begin() as connection:
+            copied += connection.exec_driver_sql(
+                f"INSERT INTO {CONVERTED} SELECT * FROM {PARENT} WHERE id > {start} AND id <= {start + batch_size} "
+                f"FOR SHARE ON CONFLICT DO NOTHING"
+            ).rowcount
+        start += batch_size
+        logger.info("🗂 Скопировано до id %d из %d", min(start, last_id), last_id)
+    return copied
+
+
+def _month_stats(connection, table: str, up_to_id: int) -> Dict:
+    return {
+        month: (count, max_id) for month, count, max_id in connection.exec_driver_sql(
+            f"SELECT date_trunc('month', payment_date), COUNT(*), MAX(id) FROM {table} "
+            f"WHERE id <= {up_to_id} GROUP BY 1"
+        )
+    }
+
+
+def _tail(connection, table: str, after_id: int):
+    return tuple(connection.exec_driver_sql(f"SELECT COUNT(*), MAX(id) FROM {table} WHERE id > {after_id}").one())
+
+
+def check_parity() -> int:
+    """
+    Сверяет payments и payments_new по месяцам (число строк и max(id)) без
+    блокировки таблиц - в одном снимке REPEATABLE READ: триггер пишет в копию
+    в той же транзакции, что и изменение оригинала. Возвращает max(id) сверенной части.
+    """
+    with get_engine().connect().execution_options(isolation_level='REPEATABLE READ') as connection:
+        with connection.begin():
+            checked = connection.exec_driver_sql(f"SELECT COALESCE(MAX(id), 0) FROM {PARENT}").scalar()
+            old, new = _month_stats(connection, PARENT, checked), _month_stats(connection, CONVERTED, checked)
+    if old != new:
+        months = sorted(str(month) for month in set(old) | set(new) if old.get(month) != new.get(month))
+        raise RuntimeError(f"{PARENT} и {CONVERTED} расходятся в месяцах {months} - перевод остановлен")
+    return checked
+
+
+def swap():
+    """
+    Короткая транзакция под блокировкой: payments_new становится payments.
+    Полная сверка идёт до блокировки, под ней - только строки, добавленные после сверки.
+    """
+    checked = check_parity()
+    with get_engine().begin() as connection:
+        connection.exec_driver_sql(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+        connection.exec_driver_sql(f"LOCK TABLE {PARENT} IN ACCESS EXCLUSIVE MODE")
+
+        old_tail, new_tail = _tail(connection, PARENT, checked), _tail(connection, CONVERTED, checked)
+        if old_tail != new_tail:
+            raise RuntimeError(
+                f"После id {checked} строк в {PARENT} {old_tail[0]}, в {CONVERTED} {new_tail[0]} - перевод остановлен"
+            )
+
+        sequence = connection.exec_driver_sql(f"SELECT pg_get_serial_sequence('{PARENT}', 'id')").scalar()
+        for constraint in connection.exec_driver_sql(
+            f"SELECT conname FROM pg_constraint WHERE contype = 'f' AND confrelid = to_regclass('{PARENT}')"
+        ).scalars().all():
+            connection.exec_driver_sql(f"ALTER TABLE subscriptions DROP CONSTRAINT {constraint}")
+
+        connection.exec_driver_sql(f"DROP TRIGGER {PARENT}_mirror ON {PARENT}")
+        connection.exec_driver_sql(f"DROP FUNCTION {PARENT}_mirror()")
+
+        old_indexes = connection.exec_driver_sql(
+            f"SELECT indexname FROM pg_indexes WHERE tablename = '{PARENT}'"
+        ).scalars().all()
+        connection.exec_driver_sql(f"ALTER TABLE {PARENT} RENAME TO {OLD}")
+        for index in old_indexes:
+            connection.exec_driver_sql(f"ALTER INDEX {index} RENAME TO {index}_old")
+
+        connection.exec_driver_sql(f"ALTER TABLE {CONVERTED} RENAME TO {PARENT}")
+        for suffix in ('pkey', 'payment_id_key'):
+            connection.exec_driver_sql(f"ALTER INDEX {CONVERTED}_{suffix} RENAME TO {PARENT}_{suffix}")
+        connection.exec_driver_sql(
+            f"ALTER TABLE {PARENT} RENAME CONSTRAINT {CONVERTED}_user_id_fkey TO {PARENT}_user_id_fkey"
+        )
+        for index in Payment.__table__.indexes:
+            connection.exec_driver_sql(f"ALTER INDEX {index.name}_new RENAME TO {index.name}")
+        if sequence:
+            connection.exec_driver_sql(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT}.id")
+    logger.info("✅ payments секционирована, прежняя таблица - %s", OLD)
+
+
+def convert_payments(batch_size: int = CONVERT_BATCH_SIZE, months_ahead: int = PAYMENTS_PARTITIONS_AHEAD):
+    """Онлайн-перевод: копия с триггером, перенос пачками, подмена под короткой блокировкой"""
+    with get_engine().connect() as connection:
+        if is_partitioned(connection):
+            logger.info("payments уже секционирована")
+            return
+    prepare_conversion(months_ahead)
+    backfill(batch_size)
+    swap()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Секционирование payments (PostgreSQL)')
+    parser.add_argument('--convert', action='store_true', help='Перевести существующую таблицу')
+    parser.add_argument('--maintain', action='store_true', help='Создать секции вперёд')
+    parser.add_argument('--archive', metavar='YYYY-MM', help='Архивировать закрытые платежи до месяца')
+    parser.add_argument('--batch-size', type=int, default=CONVERT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if get_engine().dialect.name != 'postgresql':
+        parser.error('секционирование доступно только в PostgreSQL')
+
+    if args.convert:
+        convert_payments(args.batch_size, PAYMENTS_PARTITIONS_AHEAD)
+    if args.maintain:
+        print(f"✅ {maintain_partitions(PAYMENTS_PARTITIONS_AHEAD, PAYMENTS_ARCHIVE_AFTER_MONTHS)}")
+    if args.archive:
+        archived = archive_closed(datetime.strptime(args.archive, '%Y-%m').date())
+        print(f"✅ В архиве: {archived}")
+    if not (args.convert or args.maintain or args.archive):
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
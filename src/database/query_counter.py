@@ -0,0 +1,84 @@
+"""Подсчёт SQL-запросов на логическую операцию и поиск N+1"""
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз одинаковый запрос может выполниться за операцию, прежде чем это считается N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+_active: ContextVar[Tuple['QueryStats', ...]] = ContextVar('active_query_stats', default=())
+
+
+class QueryStats:
+    """Статистика запросов одной операции"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.rows = 0
+        self.statements = Counter()
+
+    @property
+    def repeated(self) -> dict:
+        """Запросы, выполненные N_PLUS_ONE_THRESHOLD и более раз"""
+        return {
+            statement: times
+            for statement, times in self.statements.items()
+            if times >= N_PLUS_ONE_THRESHOLD
+        }
+
+    def __repr__(self):
+        return f"<QueryStats(label={self.label}, count={self.count}, rows={self.rows})>"
+
+
+@contextmanager
+def count_queries(label: str):
+    """
+    Считает запросы и строки, выполненные внутри блока.
+
+    Использование:
+        with count_queries('get_payment') as stats:
+            get_payment('PAY_1')
+        print(stats.count, stats.rows)
+
+    Вложенные блоки учитываются и во внешнем. Повторяющиеся запросы (N+1)
+    логируются при выходе из блока.
+    """
+    stats = QueryStats(label)
+    token = _active.set(_active.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+
+    for statement, times in stats.repeated.items():
+        logger.warning(
+            "Возможный N+1 в %s: запрос выполнен %d раз: %s",
+            label, times, statement.splitlines()[0][:200]
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    for stats in _active.get():
+        stats.count += 1
+        stats.statements[statement] += 1
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    rowcount = cursor.rowcount
+    if rowcount and rowcount > 0:
+        for stats in _active.get():
+            stats.rows += rowcount
+
+
+def install(engine: Engine):
+    """Подключает счётчик к событиям движка"""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
@@ -0,0 +1,317 @@
+"""
+Агрегаты для аналитики, поддерживаемые инкрементально.
+
+Счётчики обновляются в той же транзакции, что и сам платёж, одним
+INSERT ... ON CONFLICT DO UPDATE, поэтому агрегат всегда согласован с payments.
+Для уже накопленной истории - полный пересчёт:
+
+    python -m src.database.rollups --rebuild
+"""
+import argparse
+import logging
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Dict
+
+from sqlalchemy import and_, case, extract, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .database import get_db
+from .models import (
+    CohortActivity, CohortUsers, Payment, PaymentMethod, PaymentStatus, RevenueDaily,
+    Subscription, SubscriptionStatus, User
+)
+
+logger = logging.getLogger(__name__)
+
+# Размер списка в IN (...) - в пределах лимита параметров SQLite
+IN_CHUNK_SIZE = 500
+
+DIALECT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def chunked(values, size: int = IN_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def upsert_increment(db, model, keys: Dict, increments: Dict):
+    """Прибавляет increments к строке агрегата с ключом keys, создавая её при необходимости"""
+    table = model.__table__
+    insert = DIALECT_INSERTS[db.get_bind().dialect.name]
+    statement = insert(table).values(**keys, **increments)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: table.c[column] + statement.excluded[column] for column in increments}
+    )
+    db.execute(statement)
+
+
+# ВЫРУЧКА
+
+def on_payment_created(db, payment: Payment):
+    upsert_increment(
+        db, RevenueDaily,
+        {'day': payment.payment_date.date(), 'tariff': payment.tariff, 'method': payment.method},
+        {'payments_created': 1, 'payments_completed': 0, 'revenue': 0.0, 'time_to_pay_seconds': 0.0}
+    )
+
+
+def on_payment_completed(db, payment: Payment, completed_at: datetime):
+    upsert_increment(
+        db, RevenueDaily,
+        {'day': completed_at.date(), 'tariff': payment.tariff, 'method': payment.method},
+        {
+            'payments_created': 0,
+            'payments_completed': 1,
+            'revenue': payment.amount,
+            'time_to_pay_seconds': max((completed_at - payment.payment_date).total_seconds(), 0.0)
+        }
+    )
+
+
+def _as_date(value) -> date:
+    # SQLite возвращает date() строкой
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _seconds_between(db, start, end):
+    if db.get_bind().dialect.name == 'postgresql':
+        return extract('epoch', end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400
+
+
+def rebuild_revenue_daily() -> int:
+    """
+    Полный пересчёт revenue_daily по таблице payments.
+    Время оплаты - updated_at оплаченного платежа.
+    Ручные выдачи (PaymentMethod.MANUAL) не платежи и в агрегат не входят.
+    """
+    rows = {}
+
+    def row(day, tariff, method):
+        key = (_as_date(day), tariff, method)
+        if key not in rows:
+            rows[key] = {
+                'day': key[0], 'tariff': tariff, 'method': method,
+                'payments_created': 0, 'payments_completed': 0, 'revenue': 0.0, 'time_to_pay_seconds': 0.0
+            }
+        return rows[key]
+
+    with get_db() as db:
+        created_day = func.date(Payment.payment_date)
+        created = db.query(created_day, Payment.tariff, Payment.method, func.count(Payment.id)).filter(
+            Payment.method != PaymentMethod.MANUAL
+        ).group_by(
+            created_day, Payment.tariff, Payment.method
+        )
+        for day, tariff, method, count in created:
+            row(day, tariff, method)['payments_created'] = count
+
+        completed_day = func.date(Payment.updated_at)
+        completed = db.query(
+            completed_day, Payment.tariff, Payment.method,
+            func.count(Payment.id), func.sum(Payment.amount),
+            func.sum(_seconds_between(db, Payment.payment_date, Payment.updated_at))
+        ).filter(Payment.status == PaymentStatus.COMPLETED, Payment.method != PaymentMethod.MANUAL).group_by(
+            completed_day, Payment.tariff, Payment.method
+        )
+        for day, tariff, method, count, revenue, seconds in completed:
+            entry = row(day, tariff, method)
+            entry['payments_completed'] = count
+            entry['revenue'] = float(revenue or 0)
+            entry['time_to_pay_seconds'] = max(float(seconds or 0), 0.0)
+
+        db.query(RevenueDaily).delete()
+        if rows:
+            db.execute(RevenueDaily.__table__.insert(), list(rows.values()))
+
+    logger.info("📊 revenue_daily пересчитана: %d строк", len(rows))
+    return len(rows)
+
+
+# КОГОРТЫ
+
+COHORT_COUNTERS = ('first_subscriptions', 'renewals', 'activations', 'churned')
+
+# Пачка строк при потоковом чтении во время пересчёта
+REBUILD_BATCH_SIZE = 10000
+
+
+def month_start(moment) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def months_between(start: date, moment) -> int:
+    return (moment.year - start.year) * 12 + moment.month - start.month
+
+
+def _cohort_event(db, registration_date: datetime, moment: datetime, **increments):
+    """Прибавляет счётчики в ячейку (месяц регистрации, месяцев от регистрации до moment)"""
+    cohort = month_start(registration_date)
+    counters = dict.fromkeys(COHORT_COUNTERS, 0)
+    counters.update(increments)
+    upsert_increment(
+        db, CohortActivity,
+        {'cohort_month': cohort, 'period': max(months_between(cohort, moment), 0)},
+        counters
+    )
+
+
+def _registration_date(db, user_id: int) -> datetime:
+    return db.query(User.registration_date).filter(User.user_id == user_id).scalar()
+
+
+def on_user_created(db, user: User):
+    upsert_increment(db, CohortUsers, {'cohort_month': month_start(user.registration_date)}, {'users': 1})
+
+
+def on_subscription_created(db, subscription: Subscription):
+    """Первая или повторная подписка; активация, если у пользователя не было действующей"""
+    start = subscription.start_date
+    previous, active = db.query(
+        func.count(Subscription.id),
+        func.count(case((and_(Subscription.status == SubscriptionStatus.ACTIVE, Subscription.end_date > start), 1)))
+    ).filter(
+        Subscription.user_id == subscription.user_id,
+        Subscription.id != subscription.id
+    ).one()
+
+    _cohort_event(
+        db, _registration_date(db, subscription.user_id), start,
+        first_subscriptions=int(previous == 0),
+        renewals=int(previous > 0),
+        activations=int(active == 0)
+    )
+
+
+def on_subscription_ended(db, subscription: Subscription):
+    """Подписка истекла или отменена: отток, если других действующих подписок нет"""
+    now = datetime.utcnow()
+    active = db.query(func.count(Subscription.id)).filter(
+        Subscription.user_id == subscription.user_id,
+        Subscription.id != subscription.id,
+        Subscription.status == SubscriptionStatus.ACTIVE,
+        Subscription.end_date > now
+    ).scalar()
+    if active:
+        return
+
+    _cohort_event(db, _registration_date(db, subscription.user_id), min(subscription.end_date, now), churned=1)
+
+
+def on_users_created_bulk(db, registration_date: datetime, count: int):
+    upsert_increment(db, CohortUsers, {'cohort_month': month_start(registration_date)}, {'users': count})
+
+
+def cohort_events_bulk(db, events):
+    """
+    Набор событий (user_id, момент, счётчик) одной транзакцией: даты
+    регистрации читаются одним запросом, на каждую ячейку - один upsert.
+    """
+    events = list(events)
+    user_ids = {user_id for user_id, _, _ in events}
+    registrations = {}
+    for chunk in chunked(sorted(user_ids)):
+        registrations.update(db.query(User.user_id, User.registration_date).filter(User.user_id.in_(chunk)).all())
+
+    cells = defaultdict(lambda: dict.fromkeys(COHORT_COUNTERS, 0))
+    for user_id, moment, counter in events:
+        cohort = month_start(registrations[user_id])
+        cells[(cohort, max(months_between(cohort, moment), 0))][counter] += 1
+
+    for (cohort, period), counters in cells.items():
+        upsert_increment(db, CohortActivity, {'cohort_month': cohort, 'period': period}, counters)
+
+
+def rebuild_cohorts() -> int:
+    """
+    Полный пересчёт когорт по users и subscriptions.
+
+    Доступ пользователя - объединение интервалов [start_date, end_date) его
+    подписок: начало интервала - активация, прошедший конец - отток.
+    Момент досрочного истечения или отмены не хранится, для таких подписок
+    концом считается момент пересчёта.
+    """
+    now = datetime.utcnow()
+    sizes = Counter()
+    cells = defaultdict(lambda: dict.fromkeys(COHORT_COUNTERS, 0))
+
+    def event(registration_date, moment, counter):
+        cohort = month_start(registration_date)
+        cells[(cohort, max(months_between(cohort, moment), 0))][counter] += 1
+
+    with get_db() as db:
+        users = db.query(User.registration_date).execution_options(yield_per=REBUILD_BATCH_SIZE)
+        for (registration_date,) in users:
+            sizes[month_start(registration_date)] += 1
+
+        subscriptions = db.query(
+            Subscription.user_id, User.registration_date, Subscription.start_date,
+            case(
+                (and_(Subscription.status != SubscriptionStatus.ACTIVE, Subscription.end_date > now), now),
+                else_=Subscription.end_date
+            )
+        ).join(User, User.user_id == Subscription.user_id).order_by(
+            Subscription.user_id, Subscription.start_date
+        ).execution_options(yield_per=REBUILD_BATCH_SIZE)
+
+        current_user = None
+        registration = access_end = None
+        for user_id, registration_date, start, end in subscriptions:
+            if user_id != current_user:
+                if access_end is not None and access_end <= now:
+                    event(registration, access_end, 'churned')
+                current_user, registration, access_end = user_id, registration_date, None
+                event(registration, start, 'first_subscriptions')
+            else:
+                event(registration, start, 'renewals')
+
+            if access_end is None or start >= access_end:
+                if access_end is not None:
+                    event(registration, access_end, 'churned')
+                event(registration, start, 'activations')
+                access_end = end
+            else:
+                access_end = max(access_end, end)
+
+        if access_end is not None and access_end <= now:
+            event(registration, access_end, 'churned')
+
+        db.query(CohortUsers).delete()
+        db.query(CohortActivity).delete()
+        if sizes:
+            db.execute(CohortUsers.__table__.insert(), [
+                {'cohort_month': cohort, 'users': users} for cohort, users in sizes.items()
+            ])
+        if cells:
+            db.execute(CohortActivity.__table__.insert(), [
+                {'cohort_month': cohort, 'period': period, **counters}
+                for (cohort, period), counters in cells.items()
+            ])
+
+    logger.info("📊 Когорты пересчитаны: %d когорт, %d ячеек", len(sizes), len(cells))
+    return len(cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Агрегаты аналитики')
+    parser.add_argument('--rebuild', action='store_true', help='Пересчитать revenue_daily и когорты')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        from .database import init_db
+
+        init_db()
+        print(f"✅ revenue_daily: {rebuild_revenue_daily()} строк")
+        print(f"✅ cohort_activity: {rebuild_cohorts()} ячеек")
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,4 +2,5 @@
 from . import start
 from . import tariffs
 from . import subscriptions
-from . import payments
\ No newline at end of file
+from . import payments
+from . import join_requests
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+Заявки на вступление в каналы с одобрением заявок ("request to join").
+
+Обработчик только ставит заявку в очередь. Фоновый обработчик забирает её
+пачками до JOIN_BATCH_SIZE, проверяет доступ всей пачки по индексу в памяти
+(до его загрузки - одним запросом к базе) и одобряет или отклоняет заявки
+через ThrottledSender не чаще JOIN_REQUEST_RATE в секунду.
+"""
+import asyncio
+import logging
+from typing import List, Tuple
+
+from aiogram.methods import ApproveChatJoinRequest, DeclineChatJoinRequest
+from aiogram.types import ChatJoinRequest
+
+from src.bot import dp
+from src.config import JOIN_BATCH_SIZE, JOIN_BATCH_WAIT, JOIN_QUEUE_SIZE, JOIN_REQUEST_RATE
+from src.services.entitlement_index import entitlement_index
+from src.services.sender import SENT, ThrottledSender
+from src.utils.metrics import JOIN_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Заявки (chat_id, user_id), ожидающие решения
+join_queue: "asyncio.Queue[Tuple[int, int]]" = asyncio.Queue(maxsize=JOIN_QUEUE_SIZE)
+
+
+@dp.chat_join_request()
+async def handle_join_request(request: ChatJoinRequest):
+    """Ставит заявку в очередь; решение принимает join_request_worker"""
+    await join_queue.put((request.chat.id, request.from_user.id))
+
+
+async def next_batch(queue: asyncio.Queue, size: int, wait: float) -> List[Tuple[int, int]]:
+    """Ждёт первую заявку, затем добирает пачку до size, но не дольше wait секунд"""
+    batch = [await queue.get()]
+    deadline = asyncio.get_running_loop().time() + wait
+    while len(batch) < size:
+        if not queue.empty():
+            batch.append(queue.get_nowait())
+            continue
+        timeout = deadline - asyncio.get_running_loop().time()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+
+async def process_batch(sender: ThrottledSender, batch: List[Tuple[int, int]]):
+    """Проверяет доступ всей пачки и рассылает решения"""
+    pairs = list(dict.fromkeys(batch))  # Повторные заявки от одного пользователя
+    allowed = await entitlement_index.check_many(pairs)
+    semaphore = asyncio.Semaphore(sender.concurrency)
+
+    async def decide(chat_id: int, user_id: int, approve: bool):
+        method_type = ApproveChatJoinRequest if approve else DeclineChatJoinRequest
+        async with semaphore:
+            status, _ = await sender.call(method_type(chat_id=chat_id, user_id=user_id))
+        if status != SENT:
+            JOIN_REQUESTS.labels('failed').inc()
+            logger.warning("Заявка %s в канал %s не обработана: %s", user_id, chat_id, status)
+        else:
+            JOIN_REQUESTS.labels('approved' if approve else 'declined').inc()
+
+    await asyncio.gather(*(decide(chat_id, user_id, ok) for (chat_id, user_id), ok in zip(pairs, allowed)))
+    logger.info("📨 Заявки на вступление: одобрено %d, отклонено %d", sum(allowed), len(allowed) - sum(allowed))
+
+
+async def join_request_worker(sender: ThrottledSender):
+    """Фоновая задача: пачки заявок из очереди"""
+    sender = sender.limited(JOIN_REQUEST_RATE)
+    while True:
+        batch = await next_batch(join_queue, JOIN_BATCH_SIZE, JOIN_BATCH_WAIT)
+        try:
+            await process_batch(sender, batch)
+        except Exception as e:
+            logger.error("Ошибка обработки заявок на вступление: %s", e, exc_info=True)
@@ -10,18 +10,21 @@ from aiogram import types
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.enums import ParseMode
 from aiogram.exceptions import TelegramBadRequest
-import httpx
 
 from src.bot import dp, bot
 from src.config import (
-    TARIFFS, CHANNELS, ADMIN_ID, CRYPTO_EXCHANGE_RATE,
+    ADMIN_ID, CRYPTO_EXCHANGE_RATE,
     CRYPTO_PAYMENT_ADDRESS, CRYPTO_PAYMENT_NETWORK,
-    SHOP_ID, SHOP_SECRET, ACQUIRING_API_URL,
-    TRONGRID_API_KEY, TRON_NODE_URL
+    SHOP_ID, SHOP_SECRET, ACQUIRING_API_URL
 )
+from src.services.catalog import current
+from src.services.entitlement_index import entitlement_index
+from src.services.invite_pool import take_invite
+from src.services.tron_ledger import tron_ledger
+from src.utils.metrics import track_upstream
 from src.database.db_manager import (
-    save_payment, update_payment_status, get_payment,
-    save_subscription, save_invite, is_valid_invite, mark_invite_used
+    save_payment, confirm_paid_payment, get_payment,
+    save_invite, is_valid_invite, mark_invite_used
 )
 
 logger = logging.getLogger(__name__)
@@ -33,7 +36,7 @@ logger = logging.getLogger(__name__)
 async def select_payment_method(callback: types.CallbackQuery):
     """Показывает меню выбора способа оплаты"""
     _, tariff_id, duration = callback.data.split(':')
-    tariff = TARIFFS.get(tariff_id)
+    tariff = current().tariff(tariff_id)
 
     if not tariff:
         await callback.answer("❌ Тариф не найден", show_alert=True)
@@ -81,7 +84,9 @@ async def process_payment(callback: types.CallbackQuery):
     """Создает платеж в зависимости от выбранного метода"""
     try:
         _, method_type, tariff_id, duration = callback.data.split(':')
-        tariff = TARIFFS.get(tariff_id)
+        # Один снимок справочника на весь обработчик: цена и название из одной версии
+        catalog = current()
+        tariff = catalog.tariff(tariff_id)
         user = callback.from_user
 
         if not tariff:
@@ -123,10 +128,10 @@ async def process_payment(callback: types.CallbackQuery):
             save_payment(
                 user_id=user.id,
                 username=user.username,
-                tariff=f"{tariff['name']} ({'30 дней' if duration == '30_days' else 'Навсегда'})",
+                tariff=catalog.display_name(tariff_id, duration),
                 amount=price_rub,
                 payment_id=payment_id,
-                method='USDT'
+                method='usdt'
             )
 
             await callback.message.edit_text(
@@ -153,10 +158,10 @@ async def process_payment(callback: types.CallbackQuery):
         save_payment(
             user_id=user.id,
             username=user.username,
-            tariff=f"{tariff['name']} ({'30 дней' if duration == '30_days' else 'Навсегда'})",
+            tariff=catalog.display_name(tariff_id, duration),
             amount=price_rub,
             payment_id=payment_id,
-            method='Карта' if method_type == 'card' else 'СБП',
+            method=method_type,
             external_id=payment_result.get('external_id')
         )
 
@@ -180,7 +185,10 @@ async def process_payment(callback: types.CallbackQuery):
         )
 
     except Exception as e:
-        logger.error(f"Ошибка process_payment: {str(e)}", exc_info=True)
+        logger.error(
+            "Ошибка process_payment: %s", e, exc_info=True,
+            extra={'user_id': callback.from_user.id, 'handler': 'process_payment'}
+        )
         await callback.answer(
             "⚠️ Ошибка при создании платежа. Попробуйте позже",
             show_alert=True
@@ -212,7 +220,7 @@ async def confirm_payment(callback: types.CallbackQuery):
         # Проверяем платеж в зависимости от метода
         payment_ok = False
 
-        if payment_data['method'] == 'USDT':
+        if payment_data['method'] == 'usdt':
             usdt_amount = payment_data['amount'] / CRYPTO_EXCHANGE_RATE
             payment_ok = await check_usdt_payment(
                 payment_id=payment_id,
@@ -222,31 +230,23 @@ async def confirm_payment(callback: types.CallbackQuery):
             payment_ok = await check_payment_in_acquirer(payment_data['external_id'])
 
         if payment_ok:
-            # Обновляем статус платежа
-            update_payment_status(payment_id, 'completed', payment_data.get('external_id'))
-
-            # Сохраняем подписку
-            save_subscription(
-                payment_data['user_id'],
-                payment_data['username'],
-                payment_data['tariff'],
-                payment_id
-            )
-
-            # Добавляем пользователя в каналы
-            await add_user_to_channels(payment_data)
-
-            # Отправляем админу уведомление
-            await bot.send_message(
-                ADMIN_ID,
-                f"💸 <b>Новый платеж!</b>\n\n"
-                f"👤 Пользователь: @{payment_data['username'] or 'нет username'}\n"
-                f"📌 Тариф: {payment_data['tariff']}\n"
-                f"💰 Сумма: {payment_data['amount']}₽\n"
-                f"💳 Метод: {payment_data['method']}\n"
-                f"🆔 ID: {payment_id}",
-                parse_mode=ParseMode.HTML
-            )
+            # Платёж и подписка - одной транзакцией; None - платёж уже подтверждён
+            # (отменой брошенных платежей или повторным нажатием), доступ уже выдан
+            if confirm_paid_payment(payment_id, payment_data.get('external_id')):
+                # Добавляем пользователя в каналы
+                await add_user_to_channels(payment_data)
+
+                # Отправляем админу уведомление
+                await bot.send_message(
+                    ADMIN_ID,
+                    f"💸 <b>Новый платеж!</b>\n\n"
+                    f"👤 Пользователь: @{payment_data['username'] or 'нет username'}\n"
+                    f"📌 Тариф: {payment_data['tariff']}\n"
+                    f"💰 Сумма: {payment_data['amount']}₽\n"
+                    f"💳 Метод: {payment_data['method']}\n"
+                    f"🆔 ID: {payment_id}",
+                    parse_mode=ParseMode.HTML
+                )
 
             # Показываем пользователю успех
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -294,7 +294,10 @@ async def confirm_payment(callback: types.CallbackQuery):
                     raise
 
     except Exception as e:
-        logger.error(f"Ошибка в confirm_payment: {str(e)}", exc_info=True)
+        logger.error(
+            "Ошибка в confirm_payment: %s", e, exc_info=True,
+            extra={'user_id': callback.from_user.id, 'payment_id': payment_id, 'handler': 'confirm_payment'}
+        )
         await callback.answer("Произошла ошибка при проверке платежа", show_alert=True)
     finally:
         await callback.answer()
@@ -305,37 +308,32 @@ async def confirm_payment(callback: types.CallbackQuery):
 async def add_user_to_channels(payment_data: dict):
     """Добавляет пользователя в соответствующие каналы"""
     user_id = payment_data['user_id']
-    tariff_name = payment_data['tariff'].split()[0].lower()
+    catalog = current()
+    parsed = catalog.parse(payment_data['tariff'])
+    tariff_id = parsed[0] if parsed else None
 
     try:
         # Определяем, какие каналы нужны
-        if tariff_name == 'all':
+        if tariff_id == 'all':
             message_text = "✅ Ваша подписка на ВСЕ КАНАЛЫ активирована!\n\n"
             message_text += "📢 Доступные каналы:\n"
 
-            for channel_name, channel_id in CHANNELS.items():
+            for channel_name, channel_ids in catalog.channels.items():
                 if channel_name != 'all':
-                    if isinstance(channel_id, list):
-                        for c_id in channel_id:
-                            added = await add_user_to_channel(user_id, c_id)
-                            if added:
-                                message_text += f"  ✅ {TARIFFS.get(channel_name, {}).get('name', channel_name)}\n"
-                            else:
-                                invite_link = await generate_invite(user_id, c_id)
-                                message_text += f"  🔗 {TARIFFS.get(channel_name, {}).get('name', channel_name)}: {invite_link}\n"
-                    else:
-                        added = await add_user_to_channel(user_id, channel_id)
+                    name = catalog.tariffs.get(channel_name, {}).get('name', channel_name)
+                    for c_id in channel_ids:
+                        added = await add_user_to_channel(user_id, c_id)
                         if added:
-                            message_text += f"  ✅ {TARIFFS.get(channel_name, {}).get('name', channel_name)}\n"
+                            message_text += f"  ✅ {name}\n"
                         else:
-                            invite_link = await generate_invite(user_id, channel_id)
-                            message_text += f"  🔗 {TARIFFS.get(channel_name, {}).get('name', channel_name)}: {invite_link}\n"
+                            invite_link = await generate_invite(user_id, c_id)
+                            message_text += f"  🔗 {name}: {invite_link}\n"
         else:
-            channel_id = CHANNELS.get(tariff_name)
-            if channel_id:
-                if isinstance(channel_id, list):
+            channel_ids = catalog.channels_for(tariff_id)
+            if channel_ids:
+                if len(channel_ids) > 1:
                     message_text = f"✅ Ваша подписка активирована!\n\nТариф: {payment_data['tariff']}\n\nДоступные каналы:\n"
-                    for c_id in channel_id:
+                    for c_id in channel_ids:
                         added = await add_user_to_channel(user_id, c_id)
                         if added:
                             message_text += f"  ✅ Канал добавлен\n"
@@ -343,6 +341,7 @@ async def add_user_to_channels(payment_data: dict):
                             invite_link = await generate_invite(user_id, c_id)
                             message_text += f"  🔗 {invite_link}\n"
                 else:
+                    channel_id = channel_ids[0]
                     added = await add_user_to_channel(user_id, channel_id)
                     if added:
                         duration_text = "на 30 дней" if '30 дней' in payment_data['tariff'] else "навсегда"
@@ -362,7 +361,7 @@ async def add_user_to_channels(payment_data: dict):
         await bot.send_message(user_id, message_text)
 
     except Exception as e:
-        logger.error(f"Ошибка при добавлении пользователя {user_id} в каналы: {e}")
+        logger.error("Ошибка при добавлении пользователя %s в каналы: %s", user_id, e)
 
 
 async def add_user_to_channel(user_id: int, chat_id: int) -> bool:
@@ -372,27 +371,33 @@ async def add_user_to_channel(user_id: int, chat_id: int) -> bool:
             chat_id=chat_id,
             user_id=user_id
         )
-        logger.info(f"Пользователь {user_id} добавлен в канал {chat_id}")
+        logger.info("Пользователь %s добавлен в канал %s", user_id, chat_id)
         return True
     except Exception as e:
-        logger.error(f"Не удалось добавить {user_id} в канал {chat_id}: {e}")
+        logger.error("Не удалось добавить %s в канал %s: %s", user_id, chat_id, e)
         return False
 
 
 async def generate_invite(user_id: int, chat_id: int) -> str:
-    """Создает одноразовую инвайт-ссылку"""
+    """Выдаёт одноразовую инвайт-ссылку из пула, при пустом пуле создаёт новую"""
     try:
+        invite_link = await take_invite(user_id, chat_id)
+        if invite_link:
+            logger.info("Инвайт из пула выдан %s в чат %s", user_id, chat_id)
+            return invite_link
+
+        expire_date = int((datetime.now() + timedelta(days=1)).timestamp())
         invite = await bot.create_chat_invite_link(
             chat_id=chat_id,
             member_limit=1,
-            expire_date=int((datetime.now() + timedelta(days=1)).timestamp())
+            expire_date=expire_date
         )
 
-        save_invite(user_id, chat_id, invite.invite_link)
-        logger.info(f"Инвайт создан для {user_id} в чат {chat_id}")
+        save_invite(user_id, chat_id, invite.invite_link, datetime.utcfromtimestamp(expire_date))
+        logger.info("Инвайт создан для %s в чат %s", user_id, chat_id)
         return invite.invite_link
     except Exception as e:
-        logger.error(f"Ошибка создания инвайта: {e}")
+        logger.error("Ошибка создания инвайта: %s", e)
         return "Ошибка создания ссылки"
 
 
@@ -400,6 +405,9 @@ async def generate_invite(user_id: int, chat_id: int) -> str:
 
 async def create_payment_in_acquirer(amount_rub: float, payment_id: str, method: str, user_id: int):
     """Создает платеж в эквайринге"""
+    # httpx (~0.2 с импорта) нужен только эквайрингу - не загружаем его при старте бота
+    import httpx
+
     try:
         # Генерация подписи
         sign_str = f"{SHOP_ID}:{SHOP_SECRET}:{amount_rub}:{payment_id}"
@@ -425,20 +433,21 @@ async def create_payment_in_acquirer(amount_rub: float, payment_id: str, method:
         api_url = f"{ACQUIRING_API_URL}/api/merchant/order/create/by-api"
 
         async with httpx.AsyncClient(timeout=30.0) as client:
-            logger.info(f"Создание платежа: {payment_id}")
+            logger.info("Создание платежа: %s", payment_id)
 
-            response = await client.post(
-                api_url,
-                json=request_data,
-                headers=headers
-            )
+            with track_upstream('acquirer', 'create_payment'):
+                response = await client.post(
+                    api_url,
+                    json=request_data,
+                    headers=headers
+                )
 
             response.raise_for_status()
             data = response.json()
 
             if not data.get('success', False):
                 error_msg = data.get('message', 'Неизвестная ошибка API')
-                logger.error(f"Ошибка API: {error_msg}")
+                logger.error("Ошибка API: %s", error_msg)
                 return {'success': False, 'message': error_msg}
 
             payment_url = data.get('url') or data.get('payment_url')
@@ -453,101 +462,69 @@ async def create_payment_in_acquirer(amount_rub: float, payment_id: str, method:
             }
 
     except Exception as e:
-        logger.error(f"Ошибка создания платежа: {e}")
+        logger.error("Ошибка создания платежа: %s", e)
         return {'success': False, 'message': str(e)}
 
 
 async def check_payment_in_acquirer(external_id: str) -> bool:
-    """Проверяет статус платежа в эквайринге"""
+    """Проверяет статус платежа в эквайринге; ошибка проверки - не оплачен"""
     try:
         if not external_id:
             return False
-
-        sign_str = f"{SHOP_ID}:{SHOP_SECRET}:{external_id}"
-        sign = hashlib.md5(sign_str.encode()).hexdigest().lower()
-
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-            "x-sign": sign,
-            "X-Request-ID": str(uuid.uuid4())
-        }
-
-        url = f"https://yourdomain.com/api/check/{external_id}"  # Замените на реальный URL
-
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-
-            # Проверяем успешный статус
-            if data.get('status') == 1 or data.get('paid') is True or data.get('state') == 'completed':
-                logger.info(f"Платеж {external_id} подтвержден")
-                return True
-
-            return False
+        return await acquirer_payment_paid(external_id)
 
     except Exception as e:
-        logger.error(f"Ошибка проверки платежа {external_id}: {e}")
+        logger.error("Ошибка проверки платежа %s: %s", external_id, e)
         return False
 
 
-# ПРОВЕРКА USDT
-
-async def check_usdt_payment(payment_id: str, amount_usdt: float) -> bool:
-    """Проверяет поступление USDT на кошелек"""
-    try:
-        headers = {
-            'TRON-PRO-API-KEY': TRONGRID_API_KEY,
-            'Content-Type': 'application/json'
-        }
-
-        params = {
-            'contract_address': 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t',  # USDT контракт
-            'only_confirmed': True,
-            'limit': 20,
-            'order_by': 'block_timestamp,desc',
-            'min_timestamp': int((datetime.now() - timedelta(hours=24)).timestamp() * 1000)
-        }
+async def acquirer_payment_paid(external_id: str) -> bool:
+    """
+    Статус платежа в эквайринге: True - оплачен, False - не оплачен.
+    Таймаут, 5xx и сетевые ошибки пробрасываются: для отмены брошенных
+    платежей "не удалось проверить" и "не оплачен" - разные ответы.
+    """
+    import httpx
 
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f'{TRON_NODE_URL}/v1/accounts/{CRYPTO_PAYMENT_ADDRESS}/transactions/trc20',
-                headers=headers,
-                params=params
-            )
+    sign_str = f"{SHOP_ID}:{SHOP_SECRET}:{external_id}"
+    sign = hashlib.md5(sign_str.encode()).hexdigest().lower()
 
-            if response.status_code != 200:
-                logger.error(f"TronGrid API error: {response.status_code}")
-                return False
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+        "x-sign": sign,
+        "X-Request-ID": str(uuid.uuid4())
+    }
 
-            transactions = response.json().get('data', [])
+    url = f"https://yourdomain.com/api/check/{external_id}"  # Замените на реальный URL
 
-            for tx in transactions:
-                try:
-                    is_incoming = tx['to'] == CRYPTO_PAYMENT_ADDRESS.lower()
-                    is_usdt = tx['token_info']['symbol'] == 'USDT'
-                    is_confirmed = tx.get('confirmed', True)
+    async with httpx.AsyncClient(timeout=15.0) as client:
+        with track_upstream('acquirer', 'check_payment'):
+            response = await client.get(url, headers=headers)
+        response.raise_for_status()
+        data = response.json()
 
-                    # Проверяем сумму (допуск 1%)
-                    received_amount = float(tx['value']) / 10 ** 6
-                    amount_match = received_amount >= amount_usdt * 0.99
+        # Проверяем успешный статус
+        if data.get('status') == 1 or data.get('paid') is True or data.get('state') == 'completed':
+            logger.info("Платеж %s подтвержден", external_id)
+            return True
 
-                    # Ищем payment_id в memo или transaction_id
-                    memo = tx.get('transaction_id', '') + tx.get('data', '')
-                    has_payment_id = payment_id in memo
+        return False
 
-                    if all([is_incoming, is_usdt, is_confirmed, amount_match, has_payment_id]):
-                        logger.info(f"Найден подходящий платеж: {tx['transaction_id']}")
-                        return True
 
-                except Exception as e:
-                    continue
+# ПРОВЕРКА USDT
 
-            return False
+async def check_usdt_payment(payment_id: str, amount_usdt: float) -> bool:
+    """Проверяет поступление USDT по локальному журналу переводов (src.services.tron_ledger)"""
+    try:
+        transaction_id = await tron_ledger.find(payment_id, amount_usdt)
+        if transaction_id:
+            logger.info("Найден подходящий платеж: %s", transaction_id)
+            return True
+        return False
 
     except Exception as e:
-        logger.error(f"Ошибка проверки USDT: {e}")
+        logger.error("Ошибка проверки USDT: %s", e)
         return False
 
 
@@ -563,12 +540,9 @@ async def handle_new_member(event: ChatMemberUpdated):
     user_id = event.new_chat_member.user.id
     chat_id = event.chat.id
 
-    # Проверяем, есть ли у пользователя активная подписка
-    from src.database.db_manager import get_active_subscription
-    subscription = get_active_subscription(user_id)
-
-    if not subscription:
-        # Нет подписки - баним
+    # Проверяем доступ именно к этому каналу (по индексу в памяти, без запроса к базе)
+    if not await entitlement_index.check(user_id, chat_id):
+        # Нет доступа - баним
         try:
             await bot.ban_chat_member(
                 chat_id=chat_id,
@@ -577,11 +551,11 @@ async def handle_new_member(event: ChatMemberUpdated):
             )
             await bot.send_message(
                 user_id,
-                "⚠️ Доступ запрещен. У вас нет активной подписки."
+                "⚠️ Доступ запрещен. Ваша подписка не включает этот канал."
             )
         except Exception as e:
-            logger.error(f"Ошибка при бане пользователя {user_id}: {e}")
+            logger.error("Ошибка при бане пользователя %s: %s", user_id, e)
         return
 
     # Проверяем, действительна ли инвайт-ссылка
-    logger.info(f"Пользователь {user_id} вступил в канал {chat_id}")
\ No newline at end of file
+    logger.info("Пользователь %s вступил в канал %s", user_id, chat_id)
\ No newline at end of file
@@ -5,7 +5,7 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton
 
 from src.database.db_manager import save_user
-from src.config import TARIFFS
+from src.services.catalog import current
 from src.bot import dp
 
 
@@ -18,7 +18,7 @@ async def start_command(message: types.Message):
     builder = InlineKeyboardBuilder()
 
     # Добавляем кнопки для всех тарифов
-    for tariff_id, tariff in TARIFFS.items():
+    for tariff_id, tariff in current().tariffs.items():
         builder.add(InlineKeyboardButton(
             text=tariff['name'],
             callback_data=f"tariff:{tariff_id}"
@@ -3,7 +3,7 @@ from aiogram import types
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.enums import ParseMode
 
-from src.config import TARIFFS
+from src.services.catalog import current
 from src.bot import dp
 
 
@@ -11,7 +11,7 @@ from src.bot import dp
 async def show_tariff(callback: types.CallbackQuery):
     """Показывает детали выбранного тарифа"""
     tariff_id = callback.data.split(':')[1]
-    tariff = TARIFFS.get(tariff_id)
+    tariff = current().tariff(tariff_id)
 
     if not tariff:
         await callback.answer("❌ Тариф не найден", show_alert=True)
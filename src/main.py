@@ -3,9 +3,19 @@ import asyncio
 import logging
 
 from src.bot import bot, dp
+from src.config import METRICS_PORT, TRON_SYNC_INTERVAL
 from src.database.database import init_db
-from src.utils.logger import setup_logger
-from src.services.scheduler import check_subscriptions
+from src.utils.logger import setup_logger, shutdown_logger
+from src.services.catalog import catalog_watcher, reload_catalog
+from src.services.entitlement_index import entitlement_index
+from src.services.scheduler import check_subscriptions, payments_maintenance, renewal_reminders
+from src.handlers.join_requests import join_request_worker
+from src.services.invite_pool import invite_pool_worker
+from src.services.invite_sweeper import invite_sweeper
+from src.services.payment_sweeper import pending_sweeper
+from src.services.sender import shared_sender
+from src.services.tron_ledger import tron_ledger
+from src.utils.metrics import start_metrics_server
 from src import handlers   # Импортируем все обработчики
 
 
@@ -18,19 +28,56 @@ async def main():
     init_db()
     logging.info("База данных инициализирована")
 
+    # Справочник тарифов из базы до приёма апдейтов, дальше - по уведомлениям
+    await reload_catalog()
+    asyncio.create_task(catalog_watcher())
+
+    # Метрики Prometheus на отдельном порту
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+        logging.info("📈 Метрики доступны на порту %s", METRICS_PORT)
+
+    # Индекс доступа к каналам: загрузка и опрос изменений (до загрузки проверки идут в базу)
+    asyncio.create_task(entitlement_index.run())
+
+    # Журнал переводов USDT из TronGrid: проверки оплаты идут по нему
+    asyncio.create_task(tron_ledger.run(TRON_SYNC_INTERVAL))
+
+    # Один отправитель на процесс: лимит Telegram и flood wait общие для всех фоновых задач
+    sender = shared_sender(bot)
+
+    # Пул заранее созданных инвайт-ссылок по каналам
+    asyncio.create_task(invite_pool_worker(sender))
+
+    # Очистка устаревших инвайтов раз в INVITE_SWEEP_INTERVAL
+    asyncio.create_task(invite_sweeper(sender))
+
+    # Отмена брошенных платежей раз в PENDING_SWEEP_INTERVAL
+    asyncio.create_task(pending_sweeper())
+
+    # Пакетная обработка заявок на вступление в каналы
+    asyncio.create_task(join_request_worker(sender))
+
     # Запуск фоновой задачи проверки подписок
     asyncio.create_task(check_subscriptions())
 
+    # Напоминания о продлении за REMINDER_DAYS_BEFORE дней до окончания
+    asyncio.create_task(renewal_reminders(sender))
+
+    # Секции payments на месяцы вперёд (только для секционированной таблицы в PostgreSQL)
+    asyncio.create_task(payments_maintenance())
+
     logging.info("🚀 Бот запущен и готов к работе")
 
     try:
         # Запускаем поллинг
         await dp.start_polling(bot)
     except Exception as e:
-        logging.error(f"Критическая ошибка: {e}", exc_info=True)
+        logging.error("Критическая ошибка: %s", e, exc_info=True)
     finally:
         await bot.session.close()
         logging.info("Бот остановлен")
+        shutdown_logger()
 
 
 if __name__ == '__main__':
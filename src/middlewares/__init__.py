@@ -0,0 +1,27 @@
+"""Регистрация middleware бота"""
+import os
+import secrets
+
+from aiogram import Bot, Dispatcher
+
+from src.config import RECORD_UPDATES_FILE, RECORD_UPDATES_SALT
+from .metrics import HandlerMetricsMiddleware, TelegramApiMetricsMiddleware
+from .recorder import UpdateRecorderMiddleware
+from .tracing import UpdateTracingMiddleware
+
+
+def setup_middlewares(dp: Dispatcher, bot: Bot):
+    """Подключает middleware к диспетчеру и сессии бота"""
+    if RECORD_UPDATES_FILE:
+        os.makedirs(os.path.dirname(RECORD_UPDATES_FILE) or '.', exist_ok=True)
+        # Без заданной соли псевдонимы случайны для каждого запуска
+        salt = RECORD_UPDATES_SALT or secrets.token_hex(16)
+        dp.update.outer_middleware(UpdateRecorderMiddleware(RECORD_UPDATES_FILE, salt))
+
+    dp.update.outer_middleware(UpdateTracingMiddleware())
+
+    handler_metrics = HandlerMetricsMiddleware()
+    for observer in (dp.message, dp.callback_query, dp.chat_member, dp.chat_join_request):
+        observer.middleware(handler_metrics)
+
+    bot.session.middleware(TelegramApiMetricsMiddleware())
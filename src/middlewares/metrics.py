@@ -0,0 +1,45 @@
+"""Middleware для сбора метрик обработчиков и запросов к Telegram API"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+
+from src.utils import tracing
+from src.utils.metrics import HANDLER_LATENCY, TELEGRAM_API_LATENCY
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: замеряет время выполнения конкретного обработчика"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        tracing.set_handler(name)
+
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_LATENCY.labels(handler=name).observe(time.perf_counter() - start)
+
+
+class TelegramApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: замеряет время каждого метода Bot API"""
+
+    async def __call__(self, make_request, bot, method):
+        api_method = method.__api_method__
+        start = time.perf_counter()
+        try:
+            with tracing.track('telegram', api_method):
+                return await make_request(bot, method)
+        finally:
+            TELEGRAM_API_LATENCY.labels(method=api_method).observe(
+                time.perf_counter() - start
+            )
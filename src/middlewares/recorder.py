@@ -0,0 +1,127 @@
+"""Запись входящих апдейтов (обезличенных) в сжатый JSONL для последующего воспроизведения"""
+import atexit
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+logger = logging.getLogger(__name__)
+
+# Поля с персональными данными, которые не сохраняются
+DROPPED_KEYS = ('last_name', 'username', 'bio', 'contact', 'location', 'photo')
+
+# Поля с ID пользователя вне объекта User (например, chat_join_request.user_chat_id)
+USER_ID_KEYS = ('user_chat_id', 'user_id')
+
+PAYMENT_ID_RE = re.compile(r'PAY_(\d+)_')
+
+
+class UpdateAnonymizer:
+    """
+    Обезличивает апдейт.
+
+    ID пользователей и личных чатов заменяются стабильным HMAC-псевдонимом
+    (один и тот же пользователь в разных апдейтах получает один и тот же ID),
+    имена и юзернеймы удаляются, из текстов остаются только команды без
+    аргументов (в /start <payload> приходят метки диплинков).
+    """
+
+    def __init__(self, salt: str):
+        self.salt = salt.encode()
+
+    def user_id(self, value: int) -> int:
+        # Каналы и группы (отрицательные ID) оставляем - они нужны для воспроизведения
+        if value <= 0:
+            return value
+        digest = hmac.new(self.salt, str(value).encode(), hashlib.sha256).hexdigest()
+        return int(digest[:12], 16)
+
+    def anonymize(self, data: Any) -> Any:
+        if isinstance(data, list):
+            return [self.anonymize(item) for item in data]
+        if not isinstance(data, dict):
+            return data
+
+        result = {}
+        for key, value in data.items():
+            if key in DROPPED_KEYS:
+                continue
+            if key == 'first_name':
+                result[key] = 'User'
+            elif key == 'id' and isinstance(value, int) and 'is_bot' in data:
+                result[key] = self.user_id(value)
+            elif key == 'id' and isinstance(value, int) and data.get('type') == 'private':
+                result[key] = self.user_id(value)
+            elif key in USER_ID_KEYS and isinstance(value, int):
+                result[key] = self.user_id(value)
+            elif key == 'text':
+                result[key] = value.split(maxsplit=1)[0] if value.startswith('/') else ''
+            elif key == 'entities' and isinstance(data.get('text'), str):
+                # Сущности из отрезанной части текста (ссылки, упоминания) не сохраняются
+                length = len(data['text'].split(maxsplit=1)[0]) if data['text'].startswith('/') else 0
+                result[key] = [entity for entity in value if entity.get('offset', 0) + entity.get('length', 0) <= length]
+            elif key == 'data' and isinstance(value, str):
+                result[key] = PAYMENT_ID_RE.sub(lambda m: f"PAY_{self.user_id(int(m.group(1)))}_", value)
+            elif key == 'invite_link':
+                result[key] = {'invite_link': 'https://t.me/+anonymized'} if isinstance(value, dict) else ''
+            else:
+                result[key] = self.anonymize(value)
+        return result
+
+
+class UpdateRecorderMiddleware(BaseMiddleware):
+    """
+    Outer-middleware: пишет каждый апдейт с отметкой времени в gzip JSONL.
+
+    Запись идёт в отдельном потоке через ограниченную очередь; при переполнении
+    апдейты пропускаются, обработка не замедляется.
+    """
+
+    def __init__(self, path: str, salt: str, max_queue: int = 10000):
+        self.path = path
+        self.anonymizer = UpdateAnonymizer(salt)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._write_loop, name='update-recorder', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Update):
+            try:
+                self.queue.put_nowait((time.time(), event.model_dump(mode='json', exclude_none=True, by_alias=True)))
+            except queue.Full:
+                self.dropped += 1
+        return await handler(event, data)
+
+    def _write_loop(self):
+        with gzip.open(self.path, 'at', encoding='utf-8') as f:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                ts, update = item
+                record = {'ts': ts, 'update': self.anonymizer.anonymize(update)}
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def close(self):
+        """Дописывает очередь и закрывает файл"""
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+            if self.dropped:
+                logger.warning("Пропущено апдейтов при записи: %d", self.dropped)
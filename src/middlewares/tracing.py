@@ -0,0 +1,22 @@
+"""Outer-middleware трассировки: один спан на каждый апдейт"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from src.utils import tracing
+
+
+class UpdateTracingMiddleware(BaseMiddleware):
+    """Открывает спан на время обработки апдейта (см. src.utils.tracing)"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        event_type = event.event_type if isinstance(event, Update) else type(event).__name__
+
+        with tracing.start_span(f"update:{event_type}"):
+            return await handler(event, data)
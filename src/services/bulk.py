@@ -0,0 +1,162 @@
+"""
+Массовые операции с подписками (выдача, продление, отзыв) из REST API.
+
+Пачка применяется в базе одной транзакцией (db_manager.bulk_apply_subscriptions),
+после чего доступ к каналам синхронизируется через ThrottledSender: выданным -
+одноразовые инвайты в личку, отозванным - исключение из каналов тарифа.
+Задачи живут в памяти процесса API и теряются при его перезапуске.
+"""
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from src.database.db_manager import bulk_apply_subscriptions, save_invite
+from src.services.catalog import channels_for_tariff, current
+
+# aiogram (~2 с импорта) нужен только синхронизации каналов: процесс API
+# загружает его при первой массовой операции, а не при старте
+if TYPE_CHECKING:
+    from src.services.sender import ThrottledSender
+
+logger = logging.getLogger(__name__)
+
+# Сколько завершённых задач помнить для GET /subscriptions/bulk/{job_id}
+MAX_FINISHED_JOBS = 100
+
+JOBS: "OrderedDict[str, BulkJob]" = OrderedDict()
+
+
+class BulkJob:
+    """Задача массовой операции и её прогресс"""
+
+    def __init__(self, operations: List[Dict]):
+        self.id = uuid.uuid4().hex
+        self.operations = operations
+        self.status = 'queued'  # queued → applying → syncing_channels → done / failed
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+        self.error = None
+        self.result = {}
+        self.channel_ops_total = 0
+        self.channel_ops_done = 0
+        self.channel_ops_failed = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'operations': len(self.operations),
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'error': self.error,
+            'result': self.result,
+            'channels': {
+                'total': self.channel_ops_total,
+                'done': self.channel_ops_done,
+                'failed': self.channel_ops_failed,
+            }
+        }
+
+
+def create_job(operations: List[Dict]) -> BulkJob:
+    job = BulkJob(operations)
+    JOBS[job.id] = job
+
+    finished = [job_id for job_id, item in JOBS.items() if item.finished_at]
+    for job_id in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+        del JOBS[job_id]
+    return job
+
+
+def get_job(job_id: str) -> Optional[BulkJob]:
+    return JOBS.get(job_id)
+
+
+def get_sender() -> 'ThrottledSender':
+    """Отправитель процесса API (бот создаётся при первой массовой операции)"""
+    from src.bot import bot
+    from src.services.sender import shared_sender
+
+    return shared_sender(bot)
+
+
+async def grant_access(sender: 'ThrottledSender', user_id: int, tariff_id: str) -> bool:
+    """Одноразовые инвайты (из пула, при пустом пуле - новые) во все каналы тарифа одним сообщением"""
+    from aiogram.methods import CreateChatInviteLink, SendMessage
+    from src.services.invite_pool import take_invite
+    from src.services.sender import SENT
+
+    links = []
+    expire_date = int((datetime.now() + timedelta(days=1)).timestamp())
+    for chat_id in channels_for_tariff(tariff_id):
+        invite_link = await take_invite(user_id, chat_id)
+        if not invite_link:
+            status, invite = await sender.call(CreateChatInviteLink(chat_id=chat_id, member_limit=1, expire_date=expire_date))
+            if status != SENT:
+                return False
+            invite_link = invite.invite_link
+            await asyncio.to_thread(save_invite, user_id, chat_id, invite_link, datetime.utcfromtimestamp(expire_date))
+        links.append(invite_link)
+
+    text = f"✅ Вам выдан доступ: {current().tariffs.get(tariff_id, {}).get('name', tariff_id)}\n\n"
+    text += "Ссылки для вступления:\n" + "\n".join(f"  🔗 {link}" for link in links)
+    status, _ = await sender.call(SendMessage(chat_id=user_id, text=text))
+    return status == SENT
+
+
+async def revoke_access(sender: 'ThrottledSender', user_id: int, tariff_id: str, remaining: List[str]) -> bool:
+    """Исключает из каналов тарифа, кроме тех, что остаются по другим подпискам"""
+    from aiogram.methods import BanChatMember, UnbanChatMember
+    from src.services.sender import SENT
+
+    keep = {chat_id for other in remaining for chat_id in channels_for_tariff(other)}
+    ok = True
+    for chat_id in channels_for_tariff(tariff_id):
+        if chat_id in keep:
+            continue
+        # Бан с разбаном - исключение без запрета вернуться по новой подписке
+        status, _ = await sender.call(BanChatMember(chat_id=chat_id, user_id=user_id))
+        if status == SENT:
+            status, _ = await sender.call(UnbanChatMember(chat_id=chat_id, user_id=user_id, only_if_banned=True))
+        ok = ok and status == SENT
+    return ok
+
+
+async def run_job(job: BulkJob):
+    """Применяет пачку в базе, затем синхронизирует каналы"""
+    job.status = 'applying'
+    try:
+        result = await asyncio.to_thread(bulk_apply_subscriptions, job.operations, job.id)
+    except Exception as e:
+        logger.error("Ошибка массовой операции %s: %s", job.id, e, exc_info=True)
+        job.status, job.error, job.finished_at = 'failed', str(e), datetime.utcnow()
+        return
+
+    job.result = {key: result[key] for key in ('granted', 'extended', 'revoked')}
+    job.status = 'syncing_channels'
+    job.channel_ops_total = len(result['grants']) + len(result['revokes'])
+
+    sender = get_sender()
+    semaphore = asyncio.Semaphore(sender.concurrency)
+
+    async def track(operation):
+        async with semaphore:
+            try:
+                ok = await operation
+            except Exception as e:
+                logger.error("Ошибка синхронизации каналов в %s: %s", job.id, e, exc_info=True)
+                ok = False
+        job.channel_ops_done += 1
+        job.channel_ops_failed += not ok
+
+    await asyncio.gather(
+        *(track(grant_access(sender, user_id, tariff_id)) for user_id, tariff_id in result['grants']),
+        *(track(revoke_access(sender, *revoke)) for revoke in result['revokes'])
+    )
+
+    job.status, job.finished_at = 'done', datetime.utcnow()
+    logger.info("📦 Массовая операция %s завершена: %s, каналы %d/%d с ошибками",
+                job.id, job.result, job.channel_ops_failed, job.channel_ops_total)
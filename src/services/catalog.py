@@ -0,0 +1,268 @@
+"""
+Справочник тарифов и каналов.
+
+Действующая версия хранится в catalog_versions (пока версий нет - TARIFFS и
+CHANNELS из config) и собирается в неизменяемый снимок Catalog: все поиски -
+по готовым словарям, без запросов к базе. Новая версия подменяет снимок
+целиком одной операцией присваивания; обработчик берёт current() один раз и
+до конца видит одну версию.
+
+Процесс бота перечитывает справочник по уведомлению PostgreSQL (NOTIFY при
+публикации) и не реже раза в CATALOG_POLL_INTERVAL секунд.
+
+Названия тарифов сохраняются в платежах и подписках, поэтому при
+переименовании прежнее название нужно оставить в 'aliases' тарифа.
+Если у новой версии другие каналы тарифа, процесс сразу после подмены
+пересчитывает доступ владельцев активных подписок на этот тариф
+(entitlements.refresh_tariffs; повтор в другом процессе ничего не меняет).
+
+Команды:
+    python -m src.services.catalog --export > catalog.json
+    python -m src.services.catalog --publish catalog.json --comment "Новые цены"
+    python -m src.services.catalog --history
+    python -m src.services.catalog --rollback 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from src.config import CATALOG_POLL_INTERVAL, CHANNELS, TARIFFS
+
+logger = logging.getLogger(__name__)
+
+# Ожидание уведомления короткими отрезками: поток не держит остановку процесса
+LISTEN_SLICE = 1.0
+
+DURATION_LABELS = {
+    '30_days': '30 дней',
+    'forever': 'Навсегда',
+}
+
+# Длина срока в днях (None - навсегда): другие сроки в названиях тарифов не выразить
+DURATION_DAYS = {
+    '30_days': 30,
+    'forever': None,
+}
+
+
+class Catalog:
+    """Неизменяемый снимок одной версии справочника"""
+
+    def __init__(self, version: int, data: Dict):
+        tariffs, channels = data.get('tariffs') or {}, data.get('channels') or {}
+        if not tariffs:
+            raise ValueError('в справочнике нет тарифов')
+
+        compiled = {}
+        for tariff_id, tariff in tariffs.items():
+            if not tariff.get('name'):
+                raise ValueError(f'у тарифа {tariff_id} нет названия')
+            prices = {duration: tariff.get(duration) for duration in DURATION_LABELS}
+            if not any(prices.values()):
+                raise ValueError(f'у тарифа {tariff_id} нет цены')
+            if any(price is not None and not isinstance(price, (int, float)) for price in prices.values()):
+                raise ValueError(f'цена тарифа {tariff_id} должна быть числом')
+            compiled[tariff_id] = MappingProxyType({
+                **tariff, **prices,
+                'description': tariff.get('description', ''),
+                'aliases': tuple(tariff.get('aliases', ())),
+            })
+
+        compiled_channels = {}
+        for tariff_id, chat_ids in channels.items():
+            if tariff_id not in compiled:
+                raise ValueError(f'каналы указаны для неизвестного тарифа {tariff_id}')
+            chat_ids = tuple(chat_ids) if isinstance(chat_ids, (list, tuple)) else (chat_ids,)
+            if not all(isinstance(chat_id, int) for chat_id in chat_ids):
+                raise ValueError(f'ID каналов тарифа {tariff_id} должны быть целыми числами')
+            compiled_channels[tariff_id] = chat_ids
+
+        by_display_name = {}
+        for tariff_id, tariff in compiled.items():
+            for name in (tariff['name'], *tariff['aliases']):
+                for duration, label in DURATION_LABELS.items():
+                    display_name = f"{name} ({label})"
+                    if by_display_name.setdefault(display_name, (tariff_id, duration)) != (tariff_id, duration):
+                        raise ValueError(f'название "{display_name}" у двух тарифов')
+
+        self.version = version
+        self.tariffs: Mapping[str, Mapping] = MappingProxyType(compiled)
+        self.channels: Mapping[str, Tuple[int, ...]] = MappingProxyType(compiled_channels)
+        self.by_display_name = MappingProxyType(by_display_name)
+        self.all_channels = tuple(sorted({chat_id for chat_ids in compiled_channels.values() for chat_id in chat_ids}))
+
+    def tariff(self, tariff_id: str) -> Optional[Mapping]:
+        return self.tariffs.get(tariff_id)
+
+    def display_name(self, tariff_id: str, duration: str) -> str:
+        return f"{self.tariffs[tariff_id]['name']} ({DURATION_LABELS[duration]})"
+
+    def parse(self, display_name: str) -> Optional[Tuple[str, str]]:
+        return self.by_display_name.get(display_name)
+
+    def names(self, tariff_id: str) -> List[str]:
+        tariff = self.tariffs[tariff_id]
+        return [f"{name} ({label})" for name in (tariff['name'], *tariff['aliases']) for label in DURATION_LABELS.values()]
+
+    def channels_for(self, tariff_id: str) -> Tuple[int, ...]:
+        return self.channels.get(tariff_id, ())
+
+    def to_data(self) -> Dict:
+        """Документ для публикации (формат TARIFFS/CHANNELS)"""
+        return {
+            'tariffs': {
+                tariff_id: {**tariff, 'aliases': list(tariff['aliases'])}
+                for tariff_id, tariff in self.tariffs.items()
+            },
+            'channels': {
+                tariff_id: chat_ids[0] if len(chat_ids) == 1 else list(chat_ids)
+                for tariff_id, chat_ids in self.channels.items()
+            },
+        }
+
+
+# Версия 0 - справочник из config, пока в базе нет опубликованных версий
+_catalog = Catalog(0, {'tariffs': TARIFFS, 'channels': CHANNELS})
+
+
+def current() -> Catalog:
+    """Действующий снимок справочника"""
+    return _catalog
+
+
+def install(catalog: Catalog):
+    """Подменяет действующий снимок целиком"""
+    global _catalog
+    _catalog = catalog
+
+
+def changed_channel_tariffs(previous: Catalog, catalog: Catalog) -> List[str]:
+    """Сохранённые названия тарифов (из обеих версий), у которых изменились каналы"""
+    names = set()
+    for tariff_id in set(previous.tariffs) | set(catalog.tariffs):
+        if previous.channels_for(tariff_id) == catalog.channels_for(tariff_id):
+            continue
+        for snapshot in (previous, catalog):
+            if tariff_id in snapshot.tariffs:
+                names.update(snapshot.names(tariff_id))
+    return sorted(names)
+
+
+def tariff_display_name(tariff_id: str, duration: str) -> str:
+    """Название тарифа с подписью срока, например 'Базовый 1 (30 дней)'"""
+    return _catalog.display_name(tariff_id, duration)
+
+
+def parse_tariff(display_name: str) -> Optional[Tuple[str, str]]:
+    """(tariff_id, duration) по сохранённому названию тарифа или None для неизвестного"""
+    return _catalog.parse(display_name)
+
+
+def tariff_names(tariff_id: str) -> List[str]:
+    """Все сохранённые названия тарифа (по срокам и прежним названиям)"""
+    return _catalog.names(tariff_id)
+
+
+def channels_for_tariff(tariff_id: str) -> List[int]:
+    """ID каналов, доступ к которым даёт тариф"""
+    return list(_catalog.channels_for(tariff_id))
+
+
+def all_channels() -> List[int]:
+    """ID всех каналов без повторов"""
+    return list(_catalog.all_channels)
+
+
+# ПЕРЕЗАГРУЗКА
+
+async def reload_catalog() -> bool:
+    """Подхватывает опубликованную версию новее действующей; True - снимок заменён"""
+    from src.database.db_manager import get_latest_catalog
+
+    latest = await asyncio.to_thread(get_latest_catalog, _catalog.version)
+    if not latest:
+        return False
+    version, data = latest
+    try:
+        catalog = Catalog(version, data)
+    except ValueError as e:
+        logger.error("Версия справочника %d не загружена: %s", version, e)
+        return False
+    previous = _catalog
+    install(catalog)
+    logger.info("📚 Справочник: версия %d, тарифов %d", version, len(catalog.tariffs))
+
+    # Доступ к каналам должен соответствовать новой версии до первой проверки вступления
+    changed = changed_channel_tariffs(previous, catalog)
+    if changed:
+        from src.database.entitlements import refresh_tariffs
+
+        users = await asyncio.to_thread(refresh_tariffs, changed)
+        logger.info("🔑 Каналы тарифов изменились: доступ пересчитан для %d пользователей", users)
+    return True
+
+
+async def catalog_watcher(poll_interval: float = CATALOG_POLL_INTERVAL):
+    """Фоновая задача: перезагрузка по NOTIFY или раз в poll_interval секунд"""
+    from src.database.database import NotifyListener
+    from src.database.db_manager import CATALOG_CHANNEL
+
+    listener = NotifyListener(CATALOG_CHANNEL)
+    try:
+        while True:
+            try:
+                await reload_catalog()
+            except Exception as e:
+                logger.error("Ошибка перезагрузки справочника: %s", e, exc_info=True)
+
+            deadline = time.monotonic() + poll_interval
+            while time.monotonic() < deadline:
+                if await asyncio.to_thread(listener.wait, min(LISTEN_SLICE, poll_interval)):
+                    break
+    finally:
+        listener.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Справочник тарифов и каналов')
+    parser.add_argument('--export', action='store_true', help='Вывести действующую версию в JSON')
+    parser.add_argument('--publish', metavar='FILE', help='Опубликовать версию из JSON-файла')
+    parser.add_argument('--comment', help='Комментарий к публикуемой версии')
+    parser.add_argument('--history', action='store_true', help='Последние версии')
+    parser.add_argument('--rollback', type=int, metavar='VERSION', help='Опубликовать заново прежнюю версию')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    from src.database.db_manager import (
+        get_catalog_version, get_latest_catalog, list_catalog_versions, publish_catalog
+    )
+
+    if args.export:
+        latest = get_latest_catalog()
+        catalog = Catalog(*latest) if latest else current()
+        json.dump(catalog.to_data(), sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    elif args.publish:
+        with open(args.publish, encoding='utf-8') as file:
+            data = json.load(file)
+        Catalog(0, data)  # Проверка до публикации
+        print(f"✅ Опубликована версия {publish_catalog(data, args.comment)}")
+    elif args.rollback:
+        data = get_catalog_version(args.rollback)
+        if data is None:
+            parser.error(f'версии {args.rollback} нет')
+        print(f"✅ Версия {args.rollback} опубликована как {publish_catalog(data, f'Откат к версии {args.rollback}')}")
+    elif args.history:
+        for row in list_catalog_versions():
+            print(f"{row['version']:>5}  {row['created_at']:%Y-%m-%d %H:%M}  {row['comment'] or ''}")
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
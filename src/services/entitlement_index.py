@@ -0,0 +1,173 @@
+"""
+Индекс доступа к каналам в памяти процесса бота.
+
+Когда ссылка на канал попадает в открытый доступ, handle_new_member получает
+тысячи вступлений в минуту. Индекс отвечает на них без запроса к базе:
+
+- снимок: по каждому каналу отсортированный array('q') с user_id и параллельный
+  array('I') с valid_until в секундах Unix - 12 байт на пару канал-пользователь;
+- дельта: словарь изменений поверх снимка, пополняется опросом entitlements.updated_at
+  (водяной знак с перекрытием WATERMARK_OVERLAP на поздние коммиты);
+- при переполнении дельты и раз в ENTITLEMENT_RELOAD_INTERVAL снимок перечитывается
+  целиком и подменяется одним присваиванием.
+
+Положительный ответ может отстать от отзыва доступа на интервал опроса.
+Отрицательный перепроверяется внеочередным опросом (не чаще NEGATIVE_RECHECK_AGE
+на всех), чтобы только что оплативший пользователь не был забанен.
+"""
+import asyncio
+import logging
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.config import ENTITLEMENT_MAX_DELTA, ENTITLEMENT_POLL_INTERVAL, ENTITLEMENT_RELOAD_INTERVAL
+from src.database.db_manager import filter_entitled, get_entitlement_changes, iter_entitlements
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+MAX_TIMESTAMP = 2 ** 32 - 1  # Беззнаковые 32 бита - до 2106 года ("Навсегда" = 2099)
+
+# updated_at ставится до коммита: поздно закоммиченная строка не должна пройти мимо опроса
+WATERMARK_OVERLAP = timedelta(seconds=30)
+
+# Отрицательный ответ по индексу старше стольких секунд перепроверяется опросом изменений
+NEGATIVE_RECHECK_AGE = 0.5
+
+Snapshot = Dict[int, Tuple[array, array]]
+
+
+def to_timestamp(moment: datetime) -> int:
+    return min(max((moment - EPOCH) // timedelta(seconds=1), 0), MAX_TIMESTAMP)
+
+
+def build_snapshot(rows: Iterable[Tuple[int, int, datetime]]) -> Snapshot:
+    """Снимок из строк (chat_id, user_id, valid_until), упорядоченных по chat_id, user_id"""
+    snapshot = {}
+    for chat_id, user_id, valid_until in rows:
+        entry = snapshot.get(chat_id)
+        if entry is None:
+            entry = snapshot[chat_id] = (array('q'), array('I'))
+        entry[0].append(user_id)
+        entry[1].append(to_timestamp(valid_until))
+    return snapshot
+
+
+def snapshot_bytes(snapshot: Snapshot) -> int:
+    return sum(users.itemsize * len(users) + valid.itemsize * len(valid) for users, valid in snapshot.values())
+
+
+class EntitlementIndex:
+    """Кто и до какого момента имеет доступ к каждому каналу"""
+
+    def __init__(self, poll_interval: float, reload_interval: float, max_delta: int):
+        self.poll_interval = poll_interval
+        self.reload_interval = reload_interval
+        self.max_delta = max_delta
+
+        self.snapshot: Optional[Snapshot] = None  # None - индекс ещё не загружен
+        self.delta: Dict[Tuple[int, int], int] = {}
+        self.watermark: Optional[datetime] = None
+        self.loaded_at = 0.0  # time.monotonic() начала последней загрузки
+        self.refreshed_at = 0.0  # time.monotonic() начала последнего опроса
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None
+
+    def valid_until(self, user_id: int, chat_id: int) -> int:
+        """valid_until в секундах Unix (0 - доступа не было)"""
+        changed = self.delta.get((chat_id, user_id))
+        if changed is not None:
+            return changed
+
+        entry = self.snapshot.get(chat_id)
+        if entry is None:
+            return 0
+        users, valid = entry
+        i = bisect_left(users, user_id)
+        return valid[i] if i < len(users) and users[i] == user_id else 0
+
+    def lookup(self, user_id: int, chat_id: int) -> bool:
+        return self.valid_until(user_id, chat_id) > time.time()
+
+    async def check(self, user_id: int, chat_id: int) -> bool:
+        """Проверка вступления: по индексу, до его загрузки - запросом к базе"""
+        return (await self.check_many([(chat_id, user_id)]))[0]
+
+    async def check_many(self, pairs: List[Tuple[int, int]]) -> List[bool]:
+        """Проверка пачки (chat_id, user_id); до загрузки индекса - одним запросом к базе"""
+        if not self.ready:
+            entitled = await asyncio.to_thread(filter_entitled, pairs)
+            return [pair in entitled for pair in pairs]
+
+        allowed = [self.lookup(user_id, chat_id) for chat_id, user_id in pairs]
+        if not all(allowed) and time.monotonic() - self.refreshed_at > NEGATIVE_RECHECK_AGE:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("Ошибка опроса индекса доступа: %s", e, exc_info=True)
+            allowed = [self.lookup(user_id, chat_id) for chat_id, user_id in pairs]
+        return allowed
+
+    # ОБНОВЛЕНИЕ
+
+    async def reload(self):
+        async with self._lock:
+            await self._reload()
+
+    async def refresh(self):
+        """Опрос изменений; одновременные вызовы дожидаются одного опроса"""
+        requested = time.monotonic()
+        async with self._lock:
+            if self.refreshed_at >= requested:
+                return
+            await self._poll()
+
+    async def _reload(self):
+        started, watermark = time.monotonic(), datetime.utcnow()
+        snapshot = await asyncio.to_thread(
+            lambda: build_snapshot(row for batch in iter_entitlements() for row in batch)
+        )
+        self.snapshot, self.delta, self.watermark = snapshot, {}, watermark
+        self.loaded_at = self.refreshed_at = started
+
+        logger.info(
+            "🧠 Индекс доступа загружен: %d каналов, %d записей, %.1f МБ за %.2f с",
+            len(snapshot), sum(len(users) for users, _ in snapshot.values()),
+            snapshot_bytes(snapshot) / 2 ** 20, time.monotonic() - started
+        )
+
+    async def _poll(self):
+        started = time.monotonic()
+        rows = await asyncio.to_thread(get_entitlement_changes, self.watermark - WATERMARK_OVERLAP, self.max_delta)
+        for chat_id, user_id, valid_until, updated_at in rows:
+            self.delta[(chat_id, user_id)] = to_timestamp(valid_until)
+        if rows:
+            self.watermark = max(self.watermark, rows[-1].updated_at)
+        self.refreshed_at = started
+
+        # Массовые изменения (rebuild, bulk) дешевле применить перечитыванием снимка
+        if len(rows) >= self.max_delta or len(self.delta) >= self.max_delta:
+            await self._reload()
+
+    async def run(self):
+        """Фоновая задача: загрузка при старте, затем опрос изменений"""
+        if not self.poll_interval:
+            return
+        while True:
+            try:
+                if not self.ready or time.monotonic() - self.loaded_at > self.reload_interval:
+                    await self.reload()
+                else:
+                    await self.refresh()
+            except Exception as e:
+                logger.error("Ошибка обновления индекса доступа: %s", e, exc_info=True)
+            await asyncio.sleep(self.poll_interval)
+
+
+entitlement_index = EntitlementIndex(ENTITLEMENT_POLL_INTERVAL, ENTITLEMENT_RELOAD_INTERVAL, ENTITLEMENT_MAX_DELTA)
@@ -0,0 +1,94 @@
+"""
+Пул заранее созданных одноразовых инвайт-ссылок по каналам.
+
+При подтверждении оплаты ссылка выдаётся из пула одним UPDATE ... SKIP LOCKED,
+без ожидания Telegram. Фоновая задача пополняет каналы, где свободных ссылок
+меньше INVITE_POOL_LOW_WATER, до INVITE_POOL_SIZE, а ссылки, которые после
+выдачи не прослужили бы INVITE_MIN_VALIDITY, отзывает и удаляет - их место
+займут новые при следующем пополнении.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from aiogram.methods import CreateChatInviteLink, RevokeChatInviteLink
+
+from src.config import (
+    INVITE_LINK_TTL, INVITE_MIN_VALIDITY, INVITE_POOL_CHECK_INTERVAL,
+    INVITE_POOL_LOW_WATER, INVITE_POOL_RATE, INVITE_POOL_SIZE
+)
+from src.database.db_manager import (
+    add_pool_invites, assign_pool_invite, get_pool_levels, take_expiring_pool_invites
+)
+from src.services.catalog import all_channels
+from src.services.sender import SENT, ThrottledSender
+
+logger = logging.getLogger(__name__)
+
+# Сколько устаревших ссылок отзывать за один проход
+RECYCLE_BATCH_SIZE = 500
+
+
+async def take_invite(user_id: int, chat_id: int) -> Optional[str]:
+    """Ссылка из пула канала или None, если пул пуст"""
+    valid_after = datetime.utcnow() + timedelta(seconds=INVITE_MIN_VALIDITY)
+    return await asyncio.to_thread(assign_pool_invite, user_id, chat_id, valid_after)
+
+
+async def create_links(sender: ThrottledSender, chat_id: int, count: int, ttl: int) -> List[Tuple[str, datetime]]:
+    """Создаёт count одноразовых ссылок канала; возвращает (invite_link, expires_at) созданных"""
+    expire_date = int(time.time()) + ttl
+    results = await asyncio.gather(*(
+        sender.call(CreateChatInviteLink(chat_id=chat_id, member_limit=1, expire_date=expire_date))
+        for _ in range(count)
+    ))
+    expires_at = datetime.utcfromtimestamp(expire_date)
+    return [(invite.invite_link, expires_at) for status, invite in results if status == SENT]
+
+
+async def refill_pool(sender: ThrottledSender, chat_ids: List[int], size: int, low_water: int,
+                      ttl: int, min_validity: int) -> int:
+    """Пополняет каналы, где свободных ссылок меньше low_water, до size; возвращает число новых"""
+    valid_after = datetime.utcnow() + timedelta(seconds=min_validity)
+    levels = await asyncio.to_thread(get_pool_levels, valid_after)
+
+    created = 0
+    for chat_id in chat_ids:
+        free = levels.get(chat_id, 0)
+        if free >= low_water:
+            continue
+        links = await create_links(sender, chat_id, size - free, ttl)
+        created += await asyncio.to_thread(add_pool_invites, chat_id, links)
+        logger.info("🔗 Пул инвайтов канала %s: было %d, добавлено %d", chat_id, free, len(links))
+    return created
+
+
+async def recycle_pool(sender: ThrottledSender, min_validity: int, batch_size: int) -> int:
+    """Отзывает в Telegram и удаляет свободные ссылки, которые уже нельзя выдать"""
+    valid_after = datetime.utcnow() + timedelta(seconds=min_validity)
+    links = await asyncio.to_thread(take_expiring_pool_invites, valid_after, batch_size)
+    # Строки уже удалены: выдать ссылку больше некому, неудачный отзыв оставит её просто истечь
+    await asyncio.gather(*(
+        sender.call(RevokeChatInviteLink(chat_id=chat_id, invite_link=invite_link))
+        for chat_id, invite_link in links
+    ))
+    if links:
+        logger.info("♻️ Из пула инвайтов отозвано %d устаревших ссылок", len(links))
+    return len(links)
+
+
+async def invite_pool_worker(sender: ThrottledSender):
+    """Фоновая задача: отзыв устаревших ссылок и пополнение пула"""
+    sender = sender.limited(INVITE_POOL_RATE)
+    while True:
+        try:
+            await recycle_pool(sender, INVITE_MIN_VALIDITY, RECYCLE_BATCH_SIZE)
+            await refill_pool(
+                sender, all_channels(), INVITE_POOL_SIZE, INVITE_POOL_LOW_WATER,
+                INVITE_LINK_TTL, INVITE_MIN_VALIDITY
+            )
+        except Exception as e:
+            logger.error("Ошибка обслуживания пула инвайтов: %s", e, exc_info=True)
+        await asyncio.sleep(INVITE_POOL_CHECK_INTERVAL)
@@ -0,0 +1,134 @@
+"""
+Очистка таблицы invites.
+
+Неиспользованные выданные ссылки после истечения срока удаляются: в Telegram они
+уже не работают. Если срок неизвестен (строки до появления expires_at), ссылка
+дополнительно отзывается через Bot API - не быстрее INVITE_POOL_RATE и не больше
+INVITE_SWEEP_REVOKE_LIMIT за очистку. Использованные ссылки старше
+INVITE_RETENTION_DAYS переносятся в invites_archive (или удаляются).
+
+Строки обрабатываются пачками по id в отдельных коротких транзакциях, без
+блокировки таблицы. До и после очистки в лог пишутся размеры таблицы и индексов.
+
+Запуск вручную:
+    python -m src.services.invite_sweeper
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from aiogram.methods import RevokeChatInviteLink
+
+from src.config import (
+    INVITE_ARCHIVE, INVITE_LEGACY_TTL, INVITE_POOL_RATE, INVITE_RETENTION_DAYS,
+    INVITE_SWEEP_BATCH_SIZE, INVITE_SWEEP_INTERVAL, INVITE_SWEEP_REVOKE_LIMIT
+)
+from src.database.db_manager import archive_used_invites, delete_dead_invites, get_table_sizes
+from src.services.sender import SENT, ThrottledSender, shared_sender
+
+logger = logging.getLogger(__name__)
+
+# Пауза между пачками, чтобы очистка не вытесняла рабочую нагрузку
+BATCH_PAUSE = 0.05
+
+
+def format_sizes(sizes: Dict) -> str:
+    indexes = ', '.join(f"{name} {size / 2 ** 20:.1f}" for name, size in sorted(sizes['indexes'].items()))
+    dead = f" (мёртвых {sizes['dead_rows']})" if sizes.get('dead_rows') is not None else ''
+    return f"{sizes['rows']} строк{dead}, таблица {sizes['table'] / 2 ** 20:.1f} МБ, индексы (МБ): {indexes}"
+
+
+async def sweep_invites(sender: Optional[ThrottledSender], legacy_ttl: int, retention_days: int,
+                        archive: bool, batch_size: int, revoke_limit: int) -> Dict:
+    """
+    Одна очистка. Без sender ссылки с неизвестным сроком только удаляются.
+    Возвращает счётчики и размеры до/после.
+    """
+    now = datetime.utcnow()
+    report = {'deleted': 0, 'revoked': 0, 'archived': 0, 'before': await asyncio.to_thread(get_table_sizes, 'invites')}
+    logger.info("🧹 Очистка инвайтов, до: %s", format_sizes(report['before']))
+
+    last_id = 0
+    while True:
+        rows = await asyncio.to_thread(
+            delete_dead_invites, last_id, now, now - timedelta(seconds=legacy_ttl), batch_size
+        )
+        if not rows:
+            break
+        last_id = max(row[0] for row in rows)
+        report['deleted'] += len(rows)
+
+        unknown = [(chat_id, link) for _, chat_id, link, expires_at in rows if expires_at is None]
+        unknown = unknown[:max(revoke_limit - report['revoked'], 0)] if sender else []
+        results = await asyncio.gather(*(
+            sender.call(RevokeChatInviteLink(chat_id=chat_id, invite_link=link)) for chat_id, link in unknown
+        ))
+        report['revoked'] += sum(status == SENT for status, _ in results)
+        await asyncio.sleep(BATCH_PAUSE)
+
+    if retention_days:
+        used_before, last_id = now - timedelta(days=retention_days), 0
+        while True:
+            ids = await asyncio.to_thread(archive_used_invites, last_id, used_before, batch_size, archive)
+            if not ids:
+                break
+            last_id = max(ids)
+            report['archived'] += len(ids)
+            await asyncio.sleep(BATCH_PAUSE)
+
+    report['after'] = await asyncio.to_thread(get_table_sizes, 'invites')
+    logger.info(
+        "🧹 Очистка инвайтов: удалено %d (отозвано %d), %s %d использованных; после: %s; "
+        "место удалённых строк освобождается после (auto)VACUUM",
+        report['deleted'], report['revoked'], 'в архив' if archive else 'удалено',
+        report['archived'], format_sizes(report['after'])
+    )
+    return report
+
+
+async def sweep_with_config(sender: Optional[ThrottledSender]) -> Dict:
+    return await sweep_invites(
+        sender, INVITE_LEGACY_TTL, INVITE_RETENTION_DAYS, bool(INVITE_ARCHIVE),
+        INVITE_SWEEP_BATCH_SIZE, INVITE_SWEEP_REVOKE_LIMIT
+    )
+
+
+async def invite_sweeper(sender: ThrottledSender):
+    """Фоновая задача: очистка раз в INVITE_SWEEP_INTERVAL секунд"""
+    if not INVITE_SWEEP_INTERVAL:
+        return
+    sender = sender.limited(INVITE_POOL_RATE)
+    while True:
+        try:
+            await sweep_with_config(sender)
+        except Exception as e:
+            logger.error("Ошибка очистки инвайтов: %s", e, exc_info=True)
+        await asyncio.sleep(INVITE_SWEEP_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Очистка таблицы invites')
+    parser.add_argument('--no-revoke', action='store_true', help='Не отзывать ссылки через Bot API')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    async def run():
+        if args.no_revoke:
+            return await sweep_with_config(None)
+        from src.bot import bot
+
+        try:
+            return await sweep_with_config(shared_sender(bot).limited(INVITE_POOL_RATE))
+        finally:
+            await bot.session.close()
+
+    report = asyncio.run(run())
+    print(f"✅ Удалено {report['deleted']} (отозвано {report['revoked']}), "
+          f"использованных обработано {report['archived']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Отмена брошенных платежей.
+
+Каждый незавершённый выбор оплаты оставляет в payments строку PENDING. Раз в
+PENDING_SWEEP_INTERVAL секунд платежи, ожидающие дольше срока своего метода
+(PENDING_TTL_CARD/SBP/USDT), переводятся в CANCELLED пачками по
+PENDING_SWEEP_BATCH_SIZE - одним UPDATE на пачку.
+
+Карта и СБП перед отменой последний раз проверяются в эквайринге (не больше
+PENDING_CHECK_CONCURRENCY запросов одновременно). Оплаченные подтверждаются
+так же, как по кнопке «Проверить оплату»: платёж, подписка, ссылки в каналы.
+Если эквайринг не ответил (таймаут, 5xx, сеть), платёж не отменяется и
+проверяется в следующий проход. У USDT резервировать нечего - сумма и адрес
+общие, кэша проверок нет, - поэтому платёж просто отменяется.
+Отмена не окончательная: «Проверить оплату» по-прежнему подтверждает платёж.
+
+Запуск вручную:
+    python -m src.services.payment_sweeper
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from src.config import (
+    PENDING_CHECK_CONCURRENCY, PENDING_SWEEP_BATCH_SIZE, PENDING_SWEEP_INTERVAL,
+    PENDING_TTL_CARD, PENDING_TTL_SBP, PENDING_TTL_USDT
+)
+from src.database.db_manager import (
+    cancel_pending_payments, confirm_paid_payment, get_stale_pending
+)
+
+logger = logging.getLogger(__name__)
+
+# Методы, которые перед отменой проверяются в эквайринге
+ACQUIRER_METHODS = ('card', 'sbp')
+
+# Пауза между пачками, чтобы отмена не вытесняла рабочую нагрузку
+BATCH_PAUSE = 0.05
+
+
+def pending_ttls() -> Dict[str, int]:
+    return {'card': PENDING_TTL_CARD, 'sbp': PENDING_TTL_SBP, 'usdt': PENDING_TTL_USDT}
+
+
+async def find_paid(external_ids: List[str], check: Callable[[str], Awaitable[bool]],
+                    concurrency: int) -> Tuple[Set[str], Set[str]]:
+    """
+    Последняя проверка в эквайринге. Возвращает (оплаченные, непроверенные):
+    external_id, для которых check выбросил исключение, в непроверенных.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def checked(external_id: str) -> Optional[bool]:
+        async with semaphore:
+            try:
+                return await check(external_id)
+            except Exception as e:
+                logger.warning("Платёж %s не проверен в эквайринге: %s", external_id, e)
+                return None
+
+    results = await asyncio.gather(*(checked(external_id) for external_id in external_ids))
+    paid = {external_id for external_id, result in zip(external_ids, results) if result}
+    unknown = {external_id for external_id, result in zip(external_ids, results) if result is None}
+    return paid, unknown
+
+
+async def confirm_paid(payment_id: str, external_id: str) -> bool:
+    """Подтверждает оплаченный платёж, как confirm_payment; False - его уже подтвердили"""
+    from src.handlers.payments import add_user_to_channels
+
+    payment = await asyncio.to_thread(confirm_paid_payment, payment_id, external_id)
+    if not payment:
+        return False
+    await add_user_to_channels(payment)
+    logger.info("💸 Платёж %s оплачен, но не подтверждён пользователем - подтверждён при отмене брошенных", payment_id)
+    return True
+
+
+async def sweep_pending(ttls: Dict[str, int], batch_size: int, concurrency: int,
+                        check: Optional[Callable[[str], Awaitable[bool]]] = None) -> Dict[str, int]:
+    """
+    Один проход по всем методам. check - проверка в эквайринге
+    (по умолчанию acquirer_payment_paid; исключение - статус неизвестен).
+    Возвращает счётчики.
+    """
+    if check is None:
+        from src.handlers.payments import acquirer_payment_paid as check
+
+    now = datetime.utcnow()
+    report = {'cancelled': 0, 'paid': 0, 'unknown': 0}
+    for method, ttl in ttls.items():
+        if not ttl:
+            continue
+        created_before, last_id = now - timedelta(seconds=ttl), 0
+        while True:
+            rows = await asyncio.to_thread(get_stale_pending, method, created_before, last_id, batch_size)
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            paid, unknown = set(), set()
+            if method in ACQUIRER_METHODS:
+                paid, unknown = await find_paid(
+                    [external_id for _, _, external_id in rows if external_id], check, concurrency
+                )
+                for _, payment_id, external_id in rows:
+                    if external_id not in paid:
+                        continue
+                    try:
+                        report['paid'] += await confirm_paid(payment_id, external_id)
+                    except Exception as e:
+                        logger.error("Ошибка подтверждения платежа %s: %s", payment_id, e, exc_info=True)
+
+            # Оплаченные и непроверенные не отменяются
+            ids = [row_id for row_id, _, external_id in rows if external_id not in paid | unknown]
+            report['cancelled'] += await asyncio.to_thread(cancel_pending_payments, method, ids)
+            report['unknown'] += len(unknown)
+            await asyncio.sleep(BATCH_PAUSE)
+
+    if any(report.values()):
+        logger.info("🧾 Брошенные платежи: отменено %d, подтверждено оплаченных %d, не проверено %d",
+                    report['cancelled'], report['paid'], report['unknown'])
+    return report
+
+
+async def pending_sweeper():
+    """Фоновая задача: отмена брошенных платежей раз в PENDING_SWEEP_INTERVAL секунд"""
+    if not PENDING_SWEEP_INTERVAL:
+        return
+    while True:
+        try:
+            await sweep_pending(pending_ttls(), PENDING_SWEEP_BATCH_SIZE, PENDING_CHECK_CONCURRENCY)
+        except Exception as e:
+            logger.error("Ошибка отмены брошенных платежей: %s", e, exc_info=True)
+        await asyncio.sleep(PENDING_SWEEP_INTERVAL)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    report = asyncio.run(sweep_pending(pending_ttls(), PENDING_SWEEP_BATCH_SIZE, PENDING_CHECK_CONCURRENCY))
+    print(f"✅ Отменено {report['cancelled']}, подтверждено оплаченных {report['paid']}, не проверено {report['unknown']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,139 @@
 """Фоновые задачи"""
 import asyncio
 import logging
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timedelta
+
+from aiogram.enums import ParseMode
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from src.config import (
+    PAYMENTS_ARCHIVE_AFTER_MONTHS, PAYMENTS_MAINTENANCE_INTERVAL, PAYMENTS_PARTITIONS_AHEAD,
+    REMINDER_BATCH_SIZE, REMINDER_CHECK_INTERVAL, REMINDER_DAYS_BEFORE,
+    SUBSCRIPTION_EXPIRY_BATCH_SIZE, SUBSCRIPTION_EXPIRY_INTERVAL
+)
+from src.database.db_manager import claim_due_reminders, expire_ended_subscriptions, release_reminders
+from src.database.partitions import maintain_partitions
+from src.services.catalog import current
+from src.services.sender import THROTTLED, ThrottledSender
 
 logger = logging.getLogger(__name__)
 
 
+# Пауза между пачками истечения, чтобы проход не вытеснял рабочую нагрузку
+EXPIRY_BATCH_PAUSE = 0.05
+
+
+async def expire_subscriptions(batch_size: int = SUBSCRIPTION_EXPIRY_BATCH_SIZE) -> Counter:
+    """
+    Один проход: закончившиеся ACTIVE-подписки переводятся в EXPIRED пачками
+    (отток в когортах и пересчёт доступа - в той же транзакции).
+    """
+    report = Counter()
+    while True:
+        batch = await asyncio.to_thread(expire_ended_subscriptions, datetime.utcnow(), batch_size)
+        if not batch['expired']:
+            break
+        report.update(batch)
+        await asyncio.sleep(EXPIRY_BATCH_PAUSE)
+    return report
+
+
 async def check_subscriptions():
+    """Фоновая задача: истечение подписок раз в SUBSCRIPTION_EXPIRY_INTERVAL секунд"""
+    if not SUBSCRIPTION_EXPIRY_INTERVAL:
+        return
+    while True:
+        try:
+            report = await expire_subscriptions()
+            if report['expired']:
+                logger.info("✅ Истекло подписок: %d, отток: %d", report['expired'], report['churned'])
+        except Exception as e:
+            logger.error("Ошибка в check_subscriptions: %s", e, exc_info=True)
+
+        await asyncio.sleep(SUBSCRIPTION_EXPIRY_INTERVAL)
+
+
+# НАПОМИНАНИЯ О ПРОДЛЕНИИ
+
+def renewal_keyboard(tariff: str) -> InlineKeyboardMarkup:
+    """Продление тем же тарифом в одно нажатие (ведёт на выбор способа оплаты)"""
+    keyboard = []
+    catalog = current()
+    parsed = catalog.parse(tariff)
+    if parsed and catalog.tariffs[parsed[0]][parsed[1]]:
+        tariff_id, duration = parsed
+        keyboard.append([InlineKeyboardButton(
+            text=f"🔄 Продлить за {catalog.tariffs[tariff_id][duration]}₽",
+            callback_data=f"pay:{tariff_id}:{duration}"
+        )])
+    keyboard.append([InlineKeyboardButton(text="📋 Все тарифы", callback_data="back_to_start")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def reminder_text(subscription: dict) -> str:
+    return (
+        "⏰ <b>Подписка скоро закончится</b>\n\n"
+        f"📌 Тариф: {subscription['tariff']}\n"
+        f"📅 Дата окончания: {subscription['end_date']:%Y-%m-%d %H:%M} (UTC)\n\n"
+        "Продлите подписку, чтобы не потерять доступ к каналам."
+    )
+
+
+async def send_renewal_reminders(sender: ThrottledSender, days_before: float = REMINDER_DAYS_BEFORE,
+                                 batch_size: int = REMINDER_BATCH_SIZE) -> Counter:
     """
-    Фоновая задача для проверки истекших подписок.
-    Запускается каждый час.
+    Один проход: напоминает всем, чья подписка истекает в ближайшие days_before дней.
+
+    Подписки забираются пачками через claim_due_reminders, поэтому одно
+    напоминание не уходит дважды ни при повторном проходе, ни при нескольких
+    процессах. Если Telegram так и не принял сообщение из-за flood wait,
+    отметка снимается и подписка попадёт в следующий проход. Падение процесса
+    между выборкой и отправкой теряет напоминания пачки - лучше, чем дубль.
     """
+    results = Counter()
+    until = datetime.utcnow() + timedelta(days=days_before)
+
+    while True:
+        due = await asyncio.to_thread(claim_due_reminders, until, batch_size)
+        if not due:
+            break
+
+        sent = await sender.send_batch(
+            (sub['user_id'], reminder_text(sub),
+             {'parse_mode': ParseMode.HTML, 'reply_markup': renewal_keyboard(sub['tariff'])})
+            for sub in due
+        )
+        results.update(sent)
+
+        throttled = [sub['id'] for sub, result in zip(due, sent) if result == THROTTLED]
+        if throttled:
+            await asyncio.to_thread(release_reminders, throttled)
+            # Остальное - в следующий проход, когда flood wait закончится
+            break
+
+    return results
+
+
+async def renewal_reminders(sender: ThrottledSender):
+    """Фоновая задача: напоминания о продлении каждые REMINDER_CHECK_INTERVAL секунд"""
     while True:
         try:
-            logger.info("🔄 Проверка истекших подписок...")
+            results = await send_renewal_reminders(sender)
+            if results:
+                logger.info("⏰ Напоминания о продлении: %s", dict(results))
+        except Exception as e:
+            logger.error("Ошибка в renewal_reminders: %s", e, exc_info=True)
 
-            # Здесь будет логика проверки подписок
-            # Пока просто заглушка
+        await asyncio.sleep(REMINDER_CHECK_INTERVAL)
 
-            logger.info("✅ Проверка подписок завершена")
 
+async def payments_maintenance():
+    """Фоновая задача: секции payments впрок и архив старых закрытых платежей"""
+    while True:
+        try:
+            await asyncio.to_thread(maintain_partitions, PAYMENTS_PARTITIONS_AHEAD, PAYMENTS_ARCHIVE_AFTER_MONTHS)
         except Exception as e:
-            logger.error(f"Ошибка в check_subscriptions: {e}", exc_info=True)
+            logger.error("Ошибка обслуживания секций payments: %s", e, exc_info=True)
 
-        # Ждем 1 час до следующей проверки
-        await asyncio.sleep(3600)
\ No newline at end of file
+        await asyncio.sleep(PAYMENTS_MAINTENANCE_INTERVAL)
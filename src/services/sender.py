@@ -0,0 +1,105 @@
+"""Отправка массовых сообщений и вызовов Bot API в пределах лимитов Telegram"""
+import asyncio
+import logging
+import time
+from typing import Any, Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.methods import SendMessage, TelegramMethod
+
+from src.config import SEND_RATE_PER_SECOND
+from src.utils.metrics import BROADCAST_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+# Результаты отправки
+SENT = 'sent'
+THROTTLED = 'throttled'  # Telegram так и не принял сообщение из-за flood wait - можно повторить позже
+FAILED = 'failed'  # Бот заблокирован, чат удалён и т.п. - повторять бессмысленно
+
+
+class ThrottledSender:
+    """
+    Выполняет вызовы Bot API не чаще rate в секунду.
+
+    На TelegramRetryAfter сдвигает расписание всех вызовов на retry_after
+    секунд (flood wait действует на бота целиком) и повторяет вызов.
+    В процессе один общий отправитель (shared_sender); фоновые задачи со
+    своим лимитом получают limited() - их вызовы проходят и через общий.
+    """
+
+    def __init__(self, bot: Bot, rate: float = SEND_RATE_PER_SECOND, max_retries: int = 3,
+                 concurrency: int = 20, parent: Optional['ThrottledSender'] = None):
+        self.bot = bot
+        self.interval = 1.0 / rate
+        self.max_retries = max_retries
+        self.concurrency = concurrency
+        self.parent = parent
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    def limited(self, rate: float, concurrency: Optional[int] = None) -> 'ThrottledSender':
+        """Отправитель одного вызывающего: свой лимит rate поверх общего, flood wait - общий"""
+        return ThrottledSender(self.bot, rate, self.max_retries, concurrency or self.concurrency, parent=self)
+
+    async def _wait_slot(self):
+        async with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        if self.parent:
+            await self.parent._wait_slot()
+
+    async def _pause(self, seconds: float):
+        if self.parent:
+            return await self.parent._pause(seconds)
+        async with self.lock:
+            self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
+    async def call(self, method: TelegramMethod) -> Tuple[str, Any]:
+        """Выполняет метод Bot API; возвращает (SENT, ответ), (THROTTLED, None) или (FAILED, None)"""
+        status, response = THROTTLED, None
+        for _ in range(self.max_retries + 1):
+            await self._wait_slot()
+            try:
+                status, response = SENT, await self.bot(method)
+                break
+            except TelegramRetryAfter as e:
+                logger.warning("⏳ Flood wait %s с на %s", e.retry_after, method.__api_method__)
+                await self._pause(e.retry_after)
+            except TelegramAPIError as e:
+                logger.info("Вызов %s не выполнен: %s", method.__api_method__, e)
+                status = FAILED
+                break
+
+        BROADCAST_MESSAGES.labels(status).inc()
+        return status, response
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> str:
+        """Отправляет одно сообщение; возвращает SENT, THROTTLED или FAILED"""
+        status, _ = await self.call(SendMessage(chat_id=chat_id, text=text, **kwargs))
+        return status
+
+    async def send_batch(self, messages: Iterable[Tuple[int, str, dict]]) -> List[str]:
+        """Отправляет (chat_id, text, kwargs) параллельно в пределах лимита; результаты в том же порядке"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(chat_id, text, kwargs):
+            async with semaphore:
+                return await self.send_message(chat_id, text, **kwargs)
+
+        return await asyncio.gather(*(send(*message) for message in messages))
+
+
+_shared: Optional[ThrottledSender] = None
+
+
+def shared_sender(bot: Bot) -> ThrottledSender:
+    """Отправитель процесса: общий лимит SEND_RATE_PER_SECOND и общий flood wait для всех задач"""
+    global _shared
+    if _shared is None:
+        _shared = ThrottledSender(bot)
+    return _shared
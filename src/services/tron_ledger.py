@@ -0,0 +1,168 @@
+"""
+Локальный журнал переводов TRC-20 USDT (таблица crypto_transfers).
+
+Фоновая задача раз в TRON_SYNC_INTERVAL секунд забирает из TronGrid переводы
+по адресу оплаты - все страницы по fingerprint, от самого нового
+подтверждённого перевода минус TRON_SYNC_OVERLAP (при пустой таблице - за
+TRON_SYNC_LOOKBACK). Сначала загружаются неподтверждённые переводы, затем
+подтверждённые: повтор по transaction_id не создаёт дубля, а только
+отмечает перевод подтверждённым (confirmed_at).
+
+Проверка оплаты - индексный запрос по payment_id. Если перевод не найден,
+журнал догружается сразу, но не чаще раза в TRON_SYNC_MIN_INTERVAL.
+"""
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Optional
+
+from src.config import (
+    CRYPTO_PAYMENT_ADDRESS, TRON_NODE_URL, TRON_PAGE_SIZE, TRON_SYNC_LOOKBACK,
+    TRON_SYNC_MIN_INTERVAL, TRON_SYNC_OVERLAP, TRONGRID_API_KEY
+)
+from src.database.db_manager import find_usdt_transfer, get_transfers_synced_until, save_transfers
+from src.utils.metrics import track_upstream
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+USDT_CONTRACT = 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'
+USDT_DECIMALS = 6
+PAYMENT_ID_RE = re.compile(r'PAY_\d+_\d+')
+
+# Допуск по сумме перевода (комиссии обменников)
+AMOUNT_TOLERANCE = 0.99
+
+# Предохранитель от бесконечной пагинации
+MAX_PAGES = 1000
+
+
+def to_milliseconds(moment: datetime) -> int:
+    return int((moment - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+def parse_transfer(tx: Dict, confirmed: bool, now: datetime) -> Optional[Dict]:
+    """Строка crypto_transfers из ответа TronGrid; None для других токенов"""
+    if (tx.get('token_info') or {}).get('symbol') != 'USDT':
+        return None
+    match = PAYMENT_ID_RE.search(tx.get('data') or '')
+    confirmed = tx.get('confirmed', confirmed)
+    return {
+        'transaction_id': tx['transaction_id'],
+        'from_address': tx['from'],
+        'to_address': tx['to'],
+        'value': int(tx['value']),
+        'payment_id': match.group(0) if match else None,
+        'block_timestamp': datetime.utcfromtimestamp(tx['block_timestamp'] / 1000),
+        'confirmed': confirmed,
+        'first_seen_at': now,
+        'confirmed_at': now if confirmed else None,
+    }
+
+
+class TronLedger:
+    """Загрузка переводов по адресу и проверка оплат по журналу"""
+
+    def __init__(self, address: str, node_url: str, api_key: Optional[str], page_size: int,
+                 lookback: int, overlap: int, min_interval: float):
+        self.address = address
+        self.node_url = node_url
+        self.api_key = api_key
+        self.page_size = page_size
+        self.lookback = lookback
+        self.overlap = overlap
+        self.min_interval = min_interval
+
+        self.synced_at = 0.0  # time.monotonic() последней успешной загрузки
+        self._lock = asyncio.Lock()
+
+    async def _fetch(self, client: 'httpx.AsyncClient', since: datetime, confirmed: bool) -> int:
+        """Все страницы переводов с since; каждая страница сохраняется сразу"""
+        params = {
+            'contract_address': USDT_CONTRACT,
+            'limit': self.page_size,
+            'order_by': 'block_timestamp,asc',
+            'min_timestamp': to_milliseconds(since),
+            'only_confirmed' if confirmed else 'only_unconfirmed': True,
+        }
+        headers = {'TRON-PRO-API-KEY': self.api_key} if self.api_key else {}
+        url = f'{self.node_url}/v1/accounts/{self.address}/transactions/trc20'
+
+        saved = 0
+        for _ in range(MAX_PAGES):
+            with track_upstream('trongrid', 'trc20_transactions'):
+                response = await client.get(url, headers=headers, params=params)
+            response.raise_for_status()
+            payload = response.json()
+
+            now = datetime.utcnow()
+            rows = [row for row in (parse_transfer(tx, confirmed, now) for tx in payload.get('data', [])) if row]
+            saved += await asyncio.to_thread(save_transfers, rows)
+
+            fingerprint = (payload.get('meta') or {}).get('fingerprint')
+            if not fingerprint:
+                break
+            params['fingerprint'] = fingerprint
+        return saved
+
+    async def sync(self) -> int:
+        """Догружает новые переводы; возвращает число полученных (с повторами)"""
+        async with self._lock:
+            return await self._sync()
+
+    async def _sync(self) -> int:
+        # httpx загружается при первой синхронизации, а не при старте процесса
+        import httpx
+
+        started = time.monotonic()
+        now = datetime.utcnow()
+        synced_until = await asyncio.to_thread(get_transfers_synced_until)
+        since = (synced_until or now - timedelta(seconds=self.lookback)) - timedelta(seconds=self.overlap)
+
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            # Неподтверждённые - до подтверждённых: успевший подтвердиться перевод отметится вторым проходом
+            received = await self._fetch(client, now - timedelta(seconds=self.overlap), confirmed=False)
+            received += await self._fetch(client, since, confirmed=True)
+
+        self.synced_at = started
+        return received
+
+    async def refresh(self):
+        """Загрузка по запросу: не чаще min_interval, параллельные вызовы ждут одну загрузку"""
+        requested = time.monotonic()
+        async with self._lock:
+            if self.synced_at >= requested or requested - self.synced_at < self.min_interval:
+                return
+            await self._sync()
+
+    async def find(self, payment_id: str, amount_usdt: float) -> Optional[str]:
+        """transaction_id подтверждённой оплаты по журналу, при промахе - после догрузки"""
+        min_value = int(amount_usdt * AMOUNT_TOLERANCE * 10 ** USDT_DECIMALS)
+        transaction_id = await asyncio.to_thread(find_usdt_transfer, payment_id, self.address, min_value)
+        if transaction_id:
+            return transaction_id
+        await self.refresh()
+        return await asyncio.to_thread(find_usdt_transfer, payment_id, self.address, min_value)
+
+    async def run(self, interval: int):
+        """Фоновая задача: загрузка раз в interval секунд"""
+        if not interval or not self.address:
+            return
+        while True:
+            try:
+                received = await self.sync()
+                if received:
+                    logger.debug("🪙 Загружено переводов USDT: %d", received)
+            except Exception as e:
+                logger.error("Ошибка загрузки переводов USDT: %s", e, exc_info=True)
+            await asyncio.sleep(interval)
+
+
+tron_ledger = TronLedger(
+    CRYPTO_PAYMENT_ADDRESS, TRON_NODE_URL, TRONGRID_API_KEY, TRON_PAGE_SIZE,
+    TRON_SYNC_LOOKBACK, TRON_SYNC_OVERLAP, TRON_SYNC_MIN_INTERVAL
+)
@@ -1,11 +1,75 @@
 """Настройка логирования"""
+import json
 import logging
+import logging.handlers
 import os
-from src.config import LOG_FILE
+import queue
+from datetime import datetime, timezone
+from typing import Optional
 
+from src.config import LOG_FILE, LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE, TRACE_FILE
 
-def setup_logger():
-    """Настраивает логирование в файл и консоль"""
+# Поля контекста, которые передаются через extra={...} и попадают в JSON
+CONTEXT_FIELDS = ('user_id', 'payment_id', 'handler', 'duration_ms')
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_trace_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись лога в одну JSON-строку с постоянным набором полей"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            data[field] = getattr(record, field, None)
+
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler с ограниченной очередью.
+
+    Если очередь переполнена, запись отбрасывается (а не блокирует event loop),
+    количество потерянных записей хранится в dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Форматирование сообщения откладываем до потока QueueListener:
+        # в очередь уходит запись с исходными msg/args
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logger() -> logging.handlers.QueueListener:
+    """
+    Настраивает логирование в файл и консоль.
+
+    Обработчики файла и консоли работают в отдельном потоке QueueListener,
+    корневой логгер пишет только в ограниченную очередь.
+    """
+    global _listener
+
+    if _listener is not None:
+        return _listener
 
     # Создаем папку для логов, если её нет
     log_dir = os.path.dirname(LOG_FILE)
@@ -13,29 +77,90 @@ def setup_logger():
         os.makedirs(log_dir, exist_ok=True)
 
     # Настройка форматирования
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
+    if LOG_FORMAT == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        )
 
     # Хендлер для файла
     file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
     file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.INFO)
 
     # Хендлер для консоли
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    console_handler.setLevel(logging.INFO)
+
+    # Очередь между event loop и потоком записи
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler,
+        respect_handler_level=True
+    )
+    _listener.start()
 
     # Настройка корневого логгера
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    root_logger.setLevel(LOG_LEVEL)
+    root_logger.addHandler(queue_handler)
 
     # Убираем лишние логи от библиотек
     logging.getLogger("aiogram").setLevel(logging.WARNING)
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
-    logging.info("✅ Логирование настроено")
\ No newline at end of file
+    _setup_trace_log()
+
+    logging.info("✅ Логирование настроено (формат: %s, очередь: %d)", LOG_FORMAT, LOG_QUEUE_SIZE)
+    return _listener
+
+
+def _setup_trace_log():
+    """Файл трейсов (см. src.utils.tracing): по одной JSON-строке на трейс, через свою очередь"""
+    global _trace_listener
+
+    trace_dir = os.path.dirname(TRACE_FILE)
+    if trace_dir:
+        os.makedirs(trace_dir, exist_ok=True)
+
+    trace_handler = logging.FileHandler(TRACE_FILE, encoding='utf-8')
+    trace_handler.setFormatter(logging.Formatter("%(message)s"))
+
+    trace_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _trace_listener = logging.handlers.QueueListener(trace_queue, trace_handler)
+    _trace_listener.start()
+
+    trace_logger = logging.getLogger('traces')
+    trace_logger.propagate = False
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.addHandler(DroppingQueueHandler(trace_queue))
+
+
+def shutdown_logger():
+    """Останавливает поток записи логов, дописав оставшиеся записи"""
+    global _listener, _trace_listener
+
+    if _listener is None:
+        return
+
+    _listener.stop()
+    _listener = None
+
+    if _trace_listener is not None:
+        _trace_listener.stop()
+        _trace_listener = None
+        trace_logger = logging.getLogger('traces')
+        for handler in list(trace_logger.handlers):
+            trace_logger.removeHandler(handler)
+
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, DroppingQueueHandler):
+            root_logger.removeHandler(handler)
+            if handler.dropped:
+                logging.getLogger(__name__).warning(
+                    "Потеряно записей лога из-за переполнения очереди: %d", handler.dropped
+                )
@@ -0,0 +1,184 @@
+"""Метрики в формате Prometheus"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from prometheus_client import (
+    Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST,
+    generate_latest, start_http_server
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from src.database.query_counter import count_queries
+from src.utils import tracing
+
+# Бакеты в секундах: от быстрых запросов к БД до медленных внешних API
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+HANDLER_LATENCY = Histogram(
+    'bot_handler_duration_seconds',
+    'Время выполнения обработчика aiogram',
+    ['handler'],
+    buckets=LATENCY_BUCKETS
+)
+
+DB_LATENCY = Histogram(
+    'db_operation_duration_seconds',
+    'Время выполнения функции db_manager',
+    ['operation'],
+    buckets=LATENCY_BUCKETS
+)
+
+DB_QUERIES = Histogram(
+    'db_operation_queries',
+    'Количество SQL-запросов за один вызов функции db_manager',
+    ['operation'],
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100)
+)
+
+DB_POOL_WAIT = Histogram(
+    'db_pool_wait_seconds',
+    'Время получения соединения из пула SQLAlchemy',
+    buckets=LATENCY_BUCKETS
+)
+
+UPSTREAM_LATENCY = Histogram(
+    'upstream_request_duration_seconds',
+    'Время запроса к внешнему HTTP API',
+    ['upstream', 'operation'],
+    buckets=LATENCY_BUCKETS
+)
+
+TELEGRAM_API_LATENCY = Histogram(
+    'telegram_api_duration_seconds',
+    'Время запроса к Telegram Bot API',
+    ['method'],
+    buckets=LATENCY_BUCKETS
+)
+
+DB_READ_SESSIONS = Counter(
+    'db_read_sessions_total',
+    'Сессии только для чтения по фактической базе (replica или primary при отставании реплики)',
+    ['target']
+)
+
+BROADCAST_MESSAGES = Counter(
+    'bot_broadcast_messages_total',
+    'Сообщения фоновых рассылок по результату (sent, throttled, failed)',
+    ['result']
+)
+
+JOIN_REQUESTS = Counter(
+    'bot_join_requests_total',
+    'Заявки на вступление в каналы по решению (approved, declined, failed)',
+    ['result']
+)
+
+PAYMENTS_CREATED = Counter(
+    'payments_created_total',
+    'Количество созданных платежей',
+    ['method']
+)
+
+PAYMENTS_CONFIRMED = Counter(
+    'payments_confirmed_total',
+    'Количество подтверждённых платежей',
+    ['method']
+)
+
+PAYMENTS_EXPIRED = Counter(
+    'payments_expired_total',
+    'Брошенные платежи, отменённые по истечении срока ожидания',
+    ['method']
+)
+
+
+class PoolCollector:
+    """Снимает состояние пула соединений SQLAlchemy в момент запроса /metrics"""
+
+    def describe(self):
+        return self._families()
+
+    def collect(self):
+        from src.database.database import get_engine
+
+        checked_out, overflow, size = self._families()
+        pool = get_engine().pool
+
+        # У NullPool/StaticPool (например, SQLite в тестах) этих методов нет
+        if hasattr(pool, 'checkedout'):
+            checked_out.add_metric([], pool.checkedout())
+            overflow.add_metric([], max(pool.overflow(), 0))
+            size.add_metric([], pool.size())
+
+        yield checked_out
+        yield overflow
+        yield size
+
+    @staticmethod
+    def _families():
+        checked_out = GaugeMetricFamily(
+            'db_pool_checked_out', 'Соединений выдано из пула'
+        )
+        overflow = GaugeMetricFamily(
+            'db_pool_overflow', 'Соединений сверх pool_size'
+        )
+        size = GaugeMetricFamily(
+            'db_pool_size', 'Размер пула соединений'
+        )
+        return [checked_out, overflow, size]
+
+
+REGISTRY.register(PoolCollector())
+
+
+def observe_db(func):
+    """Декоратор: замеряет время и количество SQL-запросов функции db_manager"""
+    name = func.__name__
+    histogram = DB_LATENCY.labels(operation=name)
+    queries = DB_QUERIES.labels(operation=name)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        with count_queries(name) as stats:
+            try:
+                with tracing.track('db', name):
+                    return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+                queries.observe(stats.count)
+
+    return wrapper
+
+
+@contextmanager
+def track_upstream(upstream: str, operation: str):
+    """
+    Замеряет время запроса к внешнему API.
+
+    Использование:
+        with track_upstream('trongrid', 'trc20_transactions'):
+            response = await client.get(...)
+    """
+    start = time.perf_counter()
+    try:
+        with tracing.track('http', f'{upstream}.{operation}'):
+            yield
+    finally:
+        UPSTREAM_LATENCY.labels(upstream=upstream, operation=operation).observe(
+            time.perf_counter() - start
+        )
+
+
+def render_metrics():
+    """Возвращает (тело ответа, content-type) для эндпоинта /metrics"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int):
+    """Поднимает HTTP-сервер с /metrics на отдельном порту (для процесса бота)"""
+    start_http_server(port)
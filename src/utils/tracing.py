@@ -0,0 +1,127 @@
+"""Трассировка апдейтов и HTTP-запросов: разбивка времени на БД, внешние API и Telegram"""
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from src.config import TRACE_SLOW_MS, TRACE_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+# Сюда пишутся готовые трейсы (JSON-строка на трейс), файл настраивается в setup_logger()
+trace_log = logging.getLogger('traces')
+trace_log.propagate = False
+
+# Виды вложенных вызовов, на которые разбивается время спана
+KINDS = ('db', 'http', 'telegram')
+
+# Ограничение на количество вызовов в одном трейсе
+MAX_CALLS = 200
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+class Span:
+    """Один апдейт бота или один HTTP-запрос к API"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.handler = None
+        self.start = time.perf_counter()
+        self.totals = dict.fromkeys(KINDS, 0.0)
+        self.calls = []
+        self.dropped_calls = 0
+        # Глубина вложенности по видам: get_db() внутри функции db_manager не считается дважды
+        self._depth = dict.fromkeys(KINDS, 0)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def to_dict(self, duration_ms: float) -> dict:
+        return {
+            'name': self.name,
+            'handler': self.handler,
+            'duration_ms': round(duration_ms, 2),
+            'breakdown_ms': {kind: round(value * 1000, 2) for kind, value in self.totals.items()},
+            'other_ms': round(max(duration_ms - sum(self.totals.values()) * 1000, 0), 2),
+            'calls': self.calls,
+            'dropped_calls': self.dropped_calls
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def set_handler(name: str):
+    """Запоминает имя обработчика в текущем спане"""
+    span = _current_span.get()
+    if span is not None:
+        span.handler = name
+
+
+@contextmanager
+def track(kind: str, name: str):
+    """
+    Учитывает вложенный вызов (БД, внешний API, Telegram) в текущем спане.
+
+    Вне спана ничего не делает.
+    """
+    span = _current_span.get()
+    if span is None:
+        yield
+        return
+
+    span._depth[kind] += 1
+    offset = time.perf_counter() - span.start
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        span._depth[kind] -= 1
+        if span._depth[kind] == 0:
+            duration = time.perf_counter() - start
+            span.totals[kind] += duration
+            if len(span.calls) < MAX_CALLS:
+                span.calls.append({
+                    'kind': kind,
+                    'name': name,
+                    'offset_ms': round(offset * 1000, 2),
+                    'duration_ms': round(duration * 1000, 2)
+                })
+            else:
+                span.dropped_calls += 1
+
+
+@contextmanager
+def start_span(name: str):
+    """Открывает спан; медленные спаны логируются, часть спанов пишется в файл трейсов"""
+    span = Span(name)
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+        _finish(span)
+
+
+def _finish(span: Span):
+    duration_ms = span.elapsed_ms()
+    is_slow = duration_ms >= TRACE_SLOW_MS
+
+    if not is_slow and random.random() >= TRACE_SAMPLE_RATE:
+        return
+
+    data = span.to_dict(duration_ms)
+    if is_slow:
+        logger.warning(
+            "Медленный %s (%s): %.0f мс, БД %.0f мс, HTTP %.0f мс, Telegram %.0f мс",
+            span.name, span.handler, duration_ms,
+            data['breakdown_ms']['db'], data['breakdown_ms']['http'], data['breakdown_ms']['telegram'],
+            extra={'handler': span.handler, 'duration_ms': round(duration_ms, 2)}
+        )
+
+    trace_log.info(json.dumps(data, ensure_ascii=False))
@@ -0,0 +1,36 @@
+"""
+Общие фикстуры бенчмарков.
+
+Объём синтетических данных задаётся BENCH_SCALE (доля от 1M пользователей,
+3M платежей, 500k подписок, 1M инвайтов). По умолчанию берётся небольшой
+объём, чтобы набор проходил как обычные тесты.
+"""
+import asyncio
+import os
+
+import pytest
+
+from src.database.database import engine
+from tests.benchmarks.seed import seed
+
+BENCH_SCALE = float(os.getenv('BENCH_SCALE', 0.002))
+
+
+@pytest.fixture(scope='session')
+def bench_db(db_schema):
+    """Схема в локальной базе бенчмарков"""
+    yield
+
+
+@pytest.fixture(scope='session')
+def seeded_db(bench_db):
+    """База с синтетическими данными; возвращает объёмы таблиц"""
+    return seed(engine, BENCH_SCALE)
+
+
+@pytest.fixture
+def event_loop_runner():
+    """Запускает корутину в отдельном event loop (для benchmark(...))"""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
@@ -0,0 +1,163 @@
+"""
+Наполнение базы синтетическими данными для бенчмарков.
+
+Полный объём: 1M пользователей, 3M платежей, 500k подписок, 1M инвайтов.
+Запуск против локального PostgreSQL:
+    DATABASE_URL=postgresql://... python -m tests.benchmarks.seed --scale 1
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from src.database.models import (
+    User, Payment, Subscription, Invite,
+    PaymentStatus, PaymentMethod, SubscriptionStatus
+)
+
+# Полные объёмы при scale=1
+FULL_VOLUMES = {
+    'users': 1_000_000,
+    'payments': 3_000_000,
+    'subscriptions': 500_000,
+    'invites': 1_000_000,
+}
+
+# Синтетические пользователи начинаются с этого ID, чтобы не пересекаться с другими тестами
+USER_ID_BASE = 10_000_000
+
+BATCH_SIZE = 10_000
+
+TARIFF_NAMES = [
+    'Базовый 1 (30 дней)', 'Базовый 2 (30 дней)', 'Стандарт 1 (30 дней)',
+    'VIP 1 (30 дней)', 'Премиум 1 (Навсегда)', '✅ ВСЕ КАНАЛЫ (Навсегда)'
+]
+
+# Распределение статусов: большинство платежей завершены, часть брошена
+STATUS_WEIGHTS = [
+    (PaymentStatus.COMPLETED, 60),
+    (PaymentStatus.PENDING, 30),
+    (PaymentStatus.FAILED, 5),
+    (PaymentStatus.CANCELLED, 5),
+]
+
+HISTORY_DAYS = 730
+
+
+def volumes(scale: float) -> dict:
+    """Объёмы таблиц для заданного масштаба (минимум 10 строк)"""
+    return {table: max(int(count * scale), 10) for table, count in FULL_VOLUMES.items()}
+
+
+def payment_id_for(index: int, users: int) -> str:
+    return f"PAY_{USER_ID_BASE + index % users}_{index}"
+
+
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(engine, scale: float, seed_value: int = 42, verbose: bool = False) -> dict:
+    """
+    Наполняет базу, если синтетические данные ещё не загружены.
+
+    Returns:
+        dict: объёмы таблиц
+    """
+    counts = volumes(scale)
+    rnd = random.Random(seed_value)
+    now = datetime.utcnow()
+    statuses = [s for s, _ in STATUS_WEIGHTS]
+    weights = [w for _, w in STATUS_WEIGHTS]
+    methods = list(PaymentMethod)
+
+    with engine.connect() as conn:
+        existing = conn.execute(
+            select(func.count(User.id)).where(User.user_id >= USER_ID_BASE)
+        ).scalar()
+    if existing >= counts['users']:
+        return counts
+
+    def users():
+        for i in range(counts['users']):
+            registered = now - timedelta(days=rnd.random() * HISTORY_DAYS)
+            yield {
+                'user_id': USER_ID_BASE + i,
+                'username': f'bench_user_{i}',
+                'registration_date': registered,
+                'last_activity': registered + timedelta(days=rnd.random() * 30),
+            }
+
+    def payments():
+        for i in range(counts['payments']):
+            paid_at = now - timedelta(days=rnd.random() * HISTORY_DAYS)
+            yield {
+                'user_id': USER_ID_BASE + i % counts['users'],
+                'payment_id': payment_id_for(i, counts['users']),
+                'external_id': f'EXT_{i}',
+                'tariff': rnd.choice(TARIFF_NAMES),
+                'amount': float(rnd.choice([1900, 1990, 6999, 25235, 999999])),
+                'status': rnd.choices(statuses, weights)[0],
+                'method': rnd.choice(methods),
+                'payment_date': paid_at,
+                'updated_at': paid_at + timedelta(minutes=rnd.random() * 60),
+            }
+
+    def subscriptions():
+        for i in range(counts['subscriptions']):
+            start = now - timedelta(days=rnd.random() * 60)
+            yield {
+                'user_id': USER_ID_BASE + i % counts['users'],
+                'payment_id': payment_id_for(i, counts['users']),
+                'tariff': rnd.choice(TARIFF_NAMES),
+                'start_date': start,
+                'end_date': start + timedelta(days=30),
+                'status': SubscriptionStatus.ACTIVE if rnd.random() < 0.7 else SubscriptionStatus.EXPIRED,
+            }
+
+    def invites():
+        for i in range(counts['invites']):
+            yield {
+                'user_id': USER_ID_BASE + i % counts['users'],
+                'chat_id': -(i % 12 + 1),
+                'invite_link': f'https://t.me/+bench{i:09d}',
+                'is_used': rnd.random() < 0.5,
+                'created_at': now - timedelta(days=rnd.random() * HISTORY_DAYS),
+            }
+
+    for model, rows in ((User, users()), (Payment, payments()),
+                        (Subscription, subscriptions()), (Invite, invites())):
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            for batch in _batches(rows):
+                conn.execute(insert(model), batch)
+        if verbose:
+            table = model.__tablename__
+            print(f"{table}: {counts[table]} строк за {time.perf_counter() - started:.1f} с")
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Наполнение базы данными для бенчмарков')
+    parser.add_argument('--scale', type=float, default=1.0, help='Доля от полного объёма (1 = 1M пользователей)')
+    args = parser.parse_args()
+
+    from src.database.database import engine, init_db
+
+    init_db()
+    counts = seed(engine, args.scale, verbose=True)
+    print(f"✅ Готово: {counts}")
+
+
+if __name__ == '__main__':
+    main()
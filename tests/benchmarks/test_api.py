@@ -0,0 +1,78 @@
+"""Бенчмарки эндпоинтов /api/* на наполненной базе"""
+import random
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.main import app
+from src.database.rollups import rebuild_cohorts, rebuild_revenue_daily
+from tests.benchmarks.seed import USER_ID_BASE, payment_id_for
+
+
+@pytest.fixture(scope='module')
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture(scope='module')
+def revenue_rollup(seeded_db):
+    """seed пишет платежи напрямую, агрегат строим по ним один раз"""
+    rebuild_revenue_daily()
+
+
+@pytest.fixture(scope='module')
+def cohort_rollup(seeded_db):
+    rebuild_cohorts()
+
+
+def test_api_stats(benchmark, seeded_db, client):
+    response = benchmark(client.get, '/api/stats')
+    assert response.status_code == 200
+
+
+def test_api_users_list(benchmark, seeded_db, client):
+    response = benchmark(client.get, '/api/users', params={'limit': 100, 'offset': 1000})
+    assert response.status_code == 200
+
+
+def test_api_user_detail(benchmark, seeded_db, client):
+    rnd = random.Random(5)
+    response = benchmark(lambda: client.get(f"/api/users/{USER_ID_BASE + rnd.randrange(seeded_db['users'])}"))
+    assert response.status_code == 200
+
+
+def test_api_payments_list(benchmark, seeded_db, client):
+    response = benchmark(client.get, '/api/payments', params={'status': 'completed', 'limit': 100})
+    assert response.status_code == 200
+
+
+def test_api_payment_detail(benchmark, seeded_db, client):
+    rnd = random.Random(6)
+    response = benchmark(lambda: client.get(
+        f"/api/payments/{payment_id_for(rnd.randrange(seeded_db['payments']), seeded_db['users'])}"
+    ))
+    assert response.status_code == 200
+
+
+def test_api_payments_export(benchmark, seeded_db, client):
+    # Все платежи потоком; в отличие от /api/payments без OFFSET и count
+    response = benchmark.pedantic(client.get, ('/api/payments/export',), {'params': {'format': 'csv'}},
+                                  rounds=3, iterations=1)
+    assert response.status_code == 200
+    assert response.text.count('\n') > seeded_db['payments']
+
+
+def test_api_analytics_revenue(benchmark, revenue_rollup, client):
+    # Вся история по месяцам с разбивкой по тарифам
+    params = {'period': 'month', 'group_by': 'tariff', 'date_from': (date.today() - timedelta(days=3 * 365)).isoformat()}
+    response = benchmark(client.get, '/api/analytics/revenue', params=params)
+    assert response.status_code == 200
+    assert response.json()['buckets']
+
+
+def test_api_analytics_cohorts(benchmark, cohort_rollup, client):
+    params = {'date_from': (date.today() - timedelta(days=3 * 365)).isoformat()}
+    response = benchmark(client.get, '/api/analytics/cohorts', params=params)
+    assert response.status_code == 200
+    assert response.json()['cohorts']
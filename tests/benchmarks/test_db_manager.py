@@ -0,0 +1,87 @@
+"""Бенчмарки горячих функций db_manager на наполненной базе"""
+import itertools
+import random
+
+from src.database import db_manager, rollups
+from src.database.entitlements import rebuild_entitlements
+from tests.benchmarks.seed import USER_ID_BASE, payment_id_for
+
+_new_ids = itertools.count(50_000_000)
+
+
+def test_save_user_existing(benchmark, seeded_db):
+    rnd = random.Random(1)
+    users = seeded_db['users']
+    benchmark(lambda: db_manager.save_user(USER_ID_BASE + rnd.randrange(users), 'renamed'))
+
+
+def test_save_user_new(benchmark, seeded_db):
+    benchmark(lambda: db_manager.save_user(next(_new_ids), 'new_user'))
+
+
+def test_save_subscription(benchmark, seeded_db):
+    # Подписка с обновлением ячейки когорты в той же транзакции
+    def run():
+        user_id = next(_new_ids)
+        db_manager.save_payment(
+            user_id=user_id, username='subscriber', tariff='Базовый 1 (30 дней)',
+            amount=1900, payment_id=f'PAY_BENCH_{user_id}', method='card'
+        )
+        db_manager.save_subscription(user_id, 'subscriber', 'Базовый 1 (30 дней)', f'PAY_BENCH_{user_id}')
+
+    benchmark(run)
+
+
+def test_rebuild_cohorts(benchmark, seeded_db):
+    assert benchmark.pedantic(rollups.rebuild_cohorts, rounds=1, iterations=1)
+
+
+def test_save_payment(benchmark, seeded_db):
+    def run():
+        user_id = next(_new_ids)
+        db_manager.save_payment(
+            user_id=user_id, username='payer', tariff='Базовый 1 (30 дней)',
+            amount=1900, payment_id=f'PAY_BENCH_{user_id}', method='usdt'
+        )
+
+    benchmark(run)
+
+
+def test_get_payment(benchmark, seeded_db):
+    rnd = random.Random(2)
+    benchmark(lambda: db_manager.get_payment(
+        payment_id_for(rnd.randrange(seeded_db['payments']), seeded_db['users'])
+    ))
+
+
+def test_get_active_subscription(benchmark, seeded_db):
+    rnd = random.Random(3)
+    benchmark(lambda: db_manager.get_active_subscription(
+        USER_ID_BASE + rnd.randrange(seeded_db['users'])
+    ))
+
+
+def test_has_entitlement(benchmark, seeded_db):
+    # seed пишет подписки напрямую - доступ строим по ним
+    rebuild_entitlements()
+    rnd = random.Random(7)
+    benchmark(lambda: db_manager.has_entitlement(
+        USER_ID_BASE + rnd.randrange(seeded_db['users']), -(rnd.randrange(12) + 1)
+    ))
+
+
+def test_get_all_active_subscriptions(benchmark, seeded_db):
+    result = benchmark.pedantic(db_manager.get_all_active_subscriptions, rounds=3, iterations=1)
+    assert result
+
+
+def test_is_valid_invite(benchmark, seeded_db):
+    rnd = random.Random(4)
+
+    def run():
+        i = rnd.randrange(seeded_db['invites'])
+        return db_manager.is_valid_invite(
+            USER_ID_BASE + i % seeded_db['users'], -(i % 12 + 1), f'https://t.me/+bench{i:09d}'
+        )
+
+    benchmark(run)
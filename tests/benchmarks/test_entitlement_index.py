@@ -0,0 +1,55 @@
+"""Бенчмарки индекса доступа в памяти: объём на миллион пользователей и скорость проверки"""
+import asyncio
+import random
+import tracemalloc
+from datetime import datetime, timedelta
+
+from src.database.entitlements import rebuild_entitlements
+from src.services.entitlement_index import EntitlementIndex, build_snapshot, snapshot_bytes
+from tests.benchmarks.conftest import BENCH_SCALE
+from tests.benchmarks.seed import USER_ID_BASE
+
+MILLION = 1_000_000
+CHANNELS = 12
+# Пар канал-пользователь в индексе: при BENCH_SCALE=0.02 и выше - полный миллион
+ENTRIES = int(MILLION * min(BENCH_SCALE * 50, 1))
+
+
+def build_index():
+    """ENTRIES пар канал-пользователь, разложенных по 12 каналам"""
+    valid_until = datetime.utcnow() + timedelta(days=30)
+    rows = (
+        (-(chat + 1), USER_ID_BASE + i, valid_until)
+        for chat in range(CHANNELS) for i in range(chat, ENTRIES, CHANNELS)
+    )
+    index = EntitlementIndex(poll_interval=1, reload_interval=3600, max_delta=50_000)
+    index.snapshot = build_snapshot(rows)
+    return index
+
+
+def test_index_memory_per_million(benchmark):
+    tracemalloc.start()
+    index = benchmark.pedantic(build_index, rounds=1, iterations=1)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    benchmark.extra_info['bytes_per_entry'] = allocated / ENTRIES
+    benchmark.extra_info['mb_per_million'] = allocated / ENTRIES * MILLION / 2 ** 20
+    # 8 байт user_id + 4 байта valid_until, плюс запас массивов на рост
+    assert snapshot_bytes(index.snapshot) == 12 * ENTRIES
+    assert allocated < 16 * ENTRIES
+
+
+def test_index_lookup(benchmark):
+    index = build_index()
+    rnd = random.Random(11)
+    # Половина проверок - посторонние пользователи, как при утечке ссылки
+    benchmark(lambda: index.lookup(USER_ID_BASE + rnd.randrange(2 * ENTRIES), -(rnd.randrange(CHANNELS) + 1)))
+
+
+def test_index_reload(benchmark, seeded_db):
+    # Для сравнения с test_has_entitlement: полная загрузка из базы
+    rebuild_entitlements()
+    index = EntitlementIndex(poll_interval=1, reload_interval=3600, max_delta=50_000)
+    benchmark.pedantic(lambda: asyncio.run(index.reload()), rounds=3, iterations=1)
+    assert index.ready
@@ -0,0 +1,52 @@
+"""Задержка обработчика с логированием на уровне INFO и с выключенным логированием"""
+import itertools
+import logging
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.utils import logger as logger_module
+from src.handlers.payments import process_payment
+
+_user_ids = itertools.count(1_000_000)
+
+
+def _make_callback():
+    """Колбэк выбора оплаты USDT (без обращений к внешним API)"""
+    user_id = next(_user_ids)
+    return SimpleNamespace(
+        data='method:usdt:basic_1:30_days',
+        from_user=SimpleNamespace(id=user_id, username=f'user{user_id}'),
+        message=SimpleNamespace(edit_text=AsyncMock()),
+        answer=AsyncMock()
+    )
+
+
+@pytest.fixture
+def queue_logging(tmp_path, monkeypatch):
+    """Включает логирование через очередь в файл во временной папке"""
+    monkeypatch.setattr(logger_module, 'LOG_FILE', str(tmp_path / 'bench.log'))
+    monkeypatch.setattr(logger_module, 'TRACE_FILE', str(tmp_path / 'traces.jsonl'))
+    listener = logger_module.setup_logger()
+    # Консольный вывод в бенчмарке не нужен
+    listener.handlers = tuple(
+        h for h in listener.handlers if isinstance(h, logging.FileHandler)
+    )
+    yield
+    logger_module.shutdown_logger()
+
+
+@pytest.fixture
+def logging_off():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def test_process_payment_logging_info(benchmark, bench_db, event_loop_runner, queue_logging):
+    benchmark(lambda: event_loop_runner(process_payment(_make_callback())))
+
+
+def test_process_payment_logging_off(benchmark, bench_db, event_loop_runner, logging_off):
+    benchmark(lambda: event_loop_runner(process_payment(_make_callback())))
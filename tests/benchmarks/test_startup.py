@@ -0,0 +1,56 @@
+"""Холодный старт: время импорта точек входа по python -X importtime и запуск init_db"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src.database.database import init_db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Модули, которые точка входа не должна загружать при импорте
+DEFERRED = {
+    'src.main': ('httpx', 'psycopg2'),
+    'src.api.main': ('httpx', 'psycopg2', 'aiogram'),
+}
+
+# Импорт заканчивается проверкой, что движок БД ещё не создан
+PROBE = "import {module}; from src.database import database; assert 'engine' not in vars(database)"
+
+
+def import_times(module: str) -> dict:
+    """{модуль: накопленное время импорта в мкс} для нового интерпретатора"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module)],
+        cwd=ROOT, env=os.environ, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize('module', list(DEFERRED))
+def test_import_time(benchmark, module):
+    times = benchmark.pedantic(import_times, args=(module,), rounds=3, iterations=1)
+
+    benchmark.extra_info['import_ms'] = times[module] / 1000
+    # Самые тяжёлые модули первого уровня - для сравнения между прогонами
+    benchmark.extra_info['top'] = dict(sorted(
+        ((name, us / 1000) for name, us in times.items() if '.' not in name),
+        key=lambda item: -item[1]
+    )[:10])
+    assert not set(DEFERRED[module]) & set(times)
+
+
+def test_init_db_when_schema_is_current(benchmark, db_schema, query_budget):
+    # Схема уже доведена фикстурой: один запрос версии вместо create_all и инспекции
+    with query_budget(1):
+        init_db()
+    benchmark(init_db)
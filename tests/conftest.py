@@ -0,0 +1,46 @@
+"""Общие фикстуры тестов: локальная SQLite-база вместо PostgreSQL и бюджет SQL-запросов"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Переменные окружения должны быть заданы до импорта src.*
+_TEST_DIR = tempfile.mkdtemp(prefix='tests_')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}")
+os.environ.setdefault('BOT_TOKEN', '123456789:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA')
+
+import pytest
+
+from src.database.database import init_db
+from src.database.query_counter import count_queries
+
+
+@pytest.fixture(scope='session')
+def db_schema():
+    """Создаёт схему в тестовой базе"""
+    init_db()
+    yield
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Проверяет, что блок укладывается в заданное количество SQL-запросов
+    и не выполняет одинаковые запросы в цикле (N+1).
+
+    Использование:
+        def test_get_payment(query_budget):
+            with query_budget(1):
+                get_payment('PAY_1')
+    """
+    @contextmanager
+    def budget(max_queries: int, label: str = 'test'):
+        with count_queries(label) as stats:
+            yield stats
+
+        assert stats.count <= max_queries, (
+            f"{label}: {stats.count} SQL-запросов при бюджете {max_queries}: "
+            f"{list(stats.statements)}"
+        )
+        assert not stats.repeated, f"{label}: повторяющиеся запросы (N+1): {stats.repeated}"
+
+    return budget
@@ -0,0 +1,124 @@
+"""Агрегаты revenue_daily и когорт: инкрементальное обновление, пересчёт и API аналитики"""
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.main import app
+from src.database import db_manager, rollups
+from src.database.database import get_db
+from src.database.models import (
+    CohortActivity, CohortUsers, Payment, PaymentMethod, PaymentStatus, RevenueDaily,
+    Subscription, SubscriptionStatus, User
+)
+
+TARIFF = 'Аналитика (30 дней)'
+
+
+def rollup_rows():
+    with get_db() as db:
+        return {
+            row.method.value: (row.payments_created, row.payments_completed, row.revenue)
+            for row in db.query(RevenueDaily).filter(RevenueDaily.tariff == TARIFF)
+        }
+
+
+@pytest.fixture(scope='module')
+def payments(db_schema):
+    for i, method in enumerate(['card', 'card', 'usdt']):
+        db_manager.save_payment(
+            user_id=960_000 + i, username=f'an{i}', tariff=TARIFF,
+            amount=1000 * (i + 1), payment_id=f'PAY_AN_{i}', method=method
+        )
+    db_manager.update_payment_status('PAY_AN_0', 'completed')
+    db_manager.update_payment_status('PAY_AN_2', 'completed')
+    # Повторное подтверждение не считается второй раз
+    db_manager.update_payment_status('PAY_AN_2', 'completed')
+
+
+def test_rollup_is_maintained_incrementally(payments):
+    assert rollup_rows() == {'card': (2, 1, 1000.0), 'usdt': (1, 1, 3000.0)}
+
+
+def test_rebuild_matches_incremental_rollup(payments):
+    before = rollup_rows()
+    rollups.rebuild_revenue_daily()
+    assert rollup_rows() == before
+
+
+def test_analytics_endpoints(payments):
+    client = TestClient(app)
+    today = date.today().isoformat()
+
+    revenue = client.get('/api/analytics/revenue', params={'period': 'month', 'group_by': 'tariff'}).json()
+    bucket = next(b for b in revenue['buckets'] if b['tariff'] == TARIFF)
+    assert bucket == {'period_start': date.today().replace(day=1).isoformat(), 'tariff': TARIFF,
+                      'revenue': 4000.0, 'payments': 2}
+
+    conversion = client.get('/api/analytics/conversion', params={'group_by': 'method', 'date_from': today}).json()
+    card = next(b for b in conversion['buckets'] if b['method'] == 'card')
+    assert card['created'] >= 2 and 0 < card['conversion_rate'] <= 1
+
+    time_to_pay = client.get('/api/analytics/time-to-pay', params={'period': 'week'}).json()
+    assert time_to_pay['buckets'][0]['avg_seconds'] >= 0
+
+    assert client.get('/api/analytics/revenue', params={'period': 'year'}).status_code == 422
+
+
+def current_cohort():
+    with get_db() as db:
+        month = rollups.month_start(datetime.utcnow())
+        users = db.query(CohortUsers.users).filter(CohortUsers.cohort_month == month).scalar() or 0
+        cell = db.query(CohortActivity).filter(
+            CohortActivity.cohort_month == month, CohortActivity.period == 0
+        ).first()
+        return users, {name: getattr(cell, name) if cell else 0 for name in rollups.COHORT_COUNTERS}
+
+
+def test_cohorts_are_maintained_incrementally(db_schema):
+    users_before, before = current_cohort()
+
+    db_manager.save_user(961_000, 'cohort_idle')
+    for i in range(2):
+        db_manager.save_payment(961_001, 'cohort', TARIFF, 1000, f'PAY_CH_{i}', method='card')
+        db_manager.save_subscription(961_001, 'cohort', TARIFF, f'PAY_CH_{i}')
+
+    # Первая истекла, но доступ держит вторая - оттока нет
+    db_manager.update_subscription_status('PAY_CH_0', 'expired')
+    db_manager.update_subscription_status('PAY_CH_1', 'cancelled')
+
+    users_after, after = current_cohort()
+    assert users_after - users_before == 2
+    assert {name: after[name] - before[name] for name in after} == {
+        'first_subscriptions': 1, 'renewals': 1, 'activations': 1, 'churned': 1
+    }
+
+
+def test_cohort_rebuild_merges_access_intervals(db_schema):
+    registered = datetime(2001, 1, 15)
+    with get_db() as db:
+        db.add(User(user_id=962_000, username='cohort_2001', registration_date=registered, last_activity=registered))
+        db.flush()
+        # Подписки внахлёст, затем перерыв и возврат через полгода
+        for i, (start, days) in enumerate([(datetime(2001, 1, 20), 30), (datetime(2001, 2, 10), 30),
+                                           (datetime(2001, 8, 1), 30)]):
+            db.add(Payment(user_id=962_000, payment_id=f'PAY_CH2001_{i}', tariff=TARIFF, amount=1,
+                           status=PaymentStatus.COMPLETED, method=PaymentMethod.CARD))
+            db.flush()
+            db.add(Subscription(user_id=962_000, payment_id=f'PAY_CH2001_{i}', tariff=TARIFF, start_date=start,
+                                end_date=start + timedelta(days=days), status=SubscriptionStatus.EXPIRED))
+
+    rollups.rebuild_cohorts()
+
+    matrix = TestClient(app).get('/api/analytics/cohorts', params={'date_from': '2001-01-01', 'date_to': '2001-01-31'})
+    cohort = matrix.json()['cohorts'][0]
+    assert cohort['users'] == 1
+    periods = {p['period']: p for p in cohort['periods'] if any(p[name] for name in rollups.COHORT_COUNTERS)}
+    assert {period: (p['first_subscriptions'], p['renewals'], p['activations'], p['churned'])
+            for period, p in periods.items()} == {0: (1, 0, 1, 0), 1: (0, 1, 0, 0), 2: (0, 0, 0, 1), 7: (0, 1, 1, 1)}
+    assert cohort['periods'][1]['active'] == 1 and cohort['periods'][2]['retention'] == 0
+
+    response = TestClient(app).get('/api/analytics/cohorts', params={'date_from': '2001-01-01',
+                                                                     'date_to': '2001-01-31', 'format': 'csv'})
+    assert response.headers['content-type'].startswith('text/csv')
+    assert response.text.splitlines()[0].startswith('cohort_month,users,period')
@@ -0,0 +1,125 @@
+"""Массовые операции с подписками /api/subscriptions/bulk"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from aiogram.methods import BanChatMember, CreateChatInviteLink, SendMessage, UnbanChatMember
+from fastapi.testclient import TestClient
+
+from src.api.main import app
+from src.database import db_manager
+from src.database.database import get_db
+from src.database.models import Payment, PaymentMethod, Subscription, SubscriptionStatus
+from src.services import bulk
+from src.services.sender import ThrottledSender
+
+USER_BASE = 980_000
+
+
+class FakeBot:
+    """Отвечает на вызовы Bot API и записывает их"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, method):
+        self.calls.append(method)
+        if isinstance(method, CreateChatInviteLink):
+            return SimpleNamespace(invite_link=f'https://t.me/+bulk{len(self.calls)}')
+        return True
+
+    def of(self, method_type):
+        return [call for call in self.calls if isinstance(call, method_type)]
+
+
+def subscribe(user_id, tariff):
+    payment_id = f'PAY_BULK_{user_id}_{len(tariff)}'
+    db_manager.save_payment(
+        user_id=user_id, username=f'bulk{user_id}', tariff=tariff,
+        amount=1900, payment_id=payment_id, method='card'
+    )
+    db_manager.save_subscription(user_id, f'bulk{user_id}', tariff, payment_id)
+
+
+def subscriptions_of(user_id):
+    with get_db() as db:
+        return db.query(Subscription.tariff, Subscription.status, Subscription.end_date, Payment.method).join(
+            Payment, Payment.payment_id == Subscription.payment_id
+        ).filter(Subscription.user_id == user_id).order_by(Subscription.id).all()
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    bot = FakeBot()
+    monkeypatch.setattr(bulk, 'get_sender', lambda: ThrottledSender(bot, rate=10_000))
+    return bot
+
+
+def test_bulk_job_applies_operations_and_syncs_channels(db_schema, bot):
+    extended, kept, kicked, new_user = (USER_BASE + i for i in range(4))
+    subscribe(extended, 'Базовый 1 (30 дней)')
+    subscribe(kept, 'Базовый 2 (30 дней)')
+    subscribe(kept, 'Стандарт 1 (30 дней)')  # Каналы -3 и -2
+    subscribe(kicked, 'Базовый 3 (30 дней)')
+    end_before = subscriptions_of(extended)[0].end_date
+
+    client = TestClient(app)
+    response = client.post('/api/subscriptions/bulk', json={'operations': [
+        {'user_id': new_user, 'tariff_id': 'basic_2', 'action': 'grant', 'days': 30},
+        {'user_id': extended, 'tariff_id': 'basic_1', 'action': 'extend', 'days': 10},
+        {'user_id': kept, 'tariff_id': 'basic_2', 'action': 'revoke'},
+        {'user_id': kicked, 'tariff_id': 'basic_3', 'action': 'revoke'},
+    ]})
+    assert response.status_code == 202
+
+    job = client.get(f"/api/subscriptions/bulk/{response.json()['job_id']}").json()
+    assert job['status'] == 'done'
+    assert job['result'] == {'granted': 1, 'extended': 1, 'revoked': 2}
+    assert job['channels'] == {'total': 3, 'done': 3, 'failed': 0}
+
+    granted = subscriptions_of(new_user)
+    assert [(s.tariff, s.status, s.method) for s in granted] == [
+        ('Базовый 2 (30 дней)', SubscriptionStatus.ACTIVE, PaymentMethod.MANUAL)
+    ]
+    assert granted[0].end_date - datetime.utcnow() > timedelta(days=29)
+    assert subscriptions_of(extended)[0].end_date - end_before == timedelta(days=10)
+    assert [s.status for s in subscriptions_of(kicked)] == [SubscriptionStatus.CANCELLED]
+    assert db_manager.has_entitlement(new_user, -2)
+    assert db_manager.has_entitlement(kept, -2) and not db_manager.has_entitlement(kicked, -3)
+
+    # Инвайт новому пользователю; исключение только там, где не осталось других подписок
+    [created] = bot.of(CreateChatInviteLink)
+    assert created.chat_id == -2
+    assert [m.chat_id for m in bot.of(SendMessage)] == [new_user]
+    assert 'https://t.me/+bulk' in bot.of(SendMessage)[0].text
+    assert [(m.chat_id, m.user_id) for m in bot.of(BanChatMember)] == [(-3, kicked)]
+    assert [(m.chat_id, m.user_id) for m in bot.of(UnbanChatMember)] == [(-3, kicked)]
+
+
+def test_bulk_apply_is_set_based(db_schema, query_budget):
+    operations = [
+        {'user_id': USER_BASE + 100 + i, 'tariff_id': 'vip_1', 'action': 'grant', 'days': 30}
+        for i in range(300)
+    ]
+    with query_budget(12):
+        result = db_manager.bulk_apply_subscriptions(operations, 'budget')
+    assert result['granted'] == 300
+
+
+def test_bulk_request_validation(db_schema):
+    client = TestClient(app)
+    bad = [
+        {'user_id': 1, 'tariff_id': 'nope', 'action': 'grant'},
+        {'user_id': 1, 'tariff_id': 'basic_1', 'action': 'extend'},
+        {'user_id': 1, 'tariff_id': 'basic_1', 'action': 'delete'},
+        # Подписку на 7 дней нельзя назвать сроком тарифа ("30 дней" / "Навсегда")
+        {'user_id': 1, 'tariff_id': 'basic_1', 'action': 'grant', 'days': 7},
+    ]
+    for operation in bad:
+        assert client.post('/api/subscriptions/bulk', json={'operations': [operation]}).status_code == 422
+    assert client.get('/api/subscriptions/bulk/missing').status_code == 404
+
+    with pytest.raises(ValueError, match='нет такого срока'):
+        db_manager.bulk_apply_subscriptions(
+            [{'user_id': 1, 'tariff_id': 'basic_1', 'action': 'grant', 'days': 90}], 'bad'
+        )
@@ -0,0 +1,87 @@
+"""Справочник тарифов из базы"""
+import asyncio
+import threading
+
+import pytest
+
+from src.database.database import NotifyListener, engine
+from src.database import db_manager
+from src.database.db_manager import CATALOG_CHANNEL, publish_catalog
+from src.services import catalog
+
+DATA = {
+    'tariffs': {
+        'basic_1': {'name': 'Старт', 'aliases': ['Базовый 1'], '30_days': 990, 'forever': None},
+        'all': {'name': '✅ ВСЕ КАНАЛЫ', 'forever': 999999},
+    },
+    'channels': {'basic_1': -1, 'all': [-1, -2]},
+}
+
+
+@pytest.fixture
+def restore_catalog():
+    original = catalog.current()
+    yield
+    catalog.install(original)
+
+
+@pytest.mark.parametrize('data, error', [
+    ({'tariffs': {}}, 'нет тарифов'),
+    ({'tariffs': {'a': {'name': 'A'}}}, 'нет цены'),
+    ({'tariffs': {'a': {'name': 'A', 'forever': 1}}, 'channels': {'b': -1}}, 'неизвестного тарифа'),
+    ({'tariffs': {'a': {'name': 'A', 'forever': 1}, 'b': {'name': 'A', 'forever': 2}}}, 'у двух тарифов'),
+])
+def test_invalid_catalog_is_rejected(data, error):
+    with pytest.raises(ValueError, match=error):
+        catalog.Catalog(1, data)
+
+
+def test_published_version_replaces_snapshot(db_schema, restore_catalog):
+    before = catalog.current()
+    version = publish_catalog(DATA, 'тест')
+
+    assert asyncio.run(catalog.reload_catalog())
+    after = catalog.current()
+    assert after.version == version and after is not before
+    # Прежний снимок не изменился - обработчик, взявший его, дорабатывает на старой версии
+    assert before.tariffs['basic_1']['name'] == 'Базовый 1'
+
+    assert after.tariffs['basic_1']['30_days'] == 990
+    assert catalog.tariff_display_name('basic_1', '30_days') == 'Старт (30 дней)'
+    # Старое название из сохранённых платежей по-прежнему распознаётся
+    assert catalog.parse_tariff('Базовый 1 (Навсегда)') == ('basic_1', 'forever')
+    assert catalog.channels_for_tariff('all') == [-1, -2] and catalog.all_channels() == [-2, -1]
+    with pytest.raises(TypeError):
+        after.tariffs['basic_1']['30_days'] = 1
+
+    assert not asyncio.run(catalog.reload_catalog())  # Новых версий нет
+
+
+def test_changed_channels_refresh_access(db_schema, restore_catalog):
+    user_id = 997_000
+    db_manager.save_payment(user_id, 'moved', 'Базовый 1 (30 дней)', 1900, 'PAY_CAT_0', method='card')
+    db_manager.save_subscription(user_id, 'moved', 'Базовый 1 (30 дней)', 'PAY_CAT_0')
+    assert db_manager.has_entitlement(user_id, -1)
+
+    # Канал тарифа заменён: доступ переезжает без ручного --rebuild
+    config_data = catalog.current().to_data()
+    publish_catalog({**DATA, 'channels': {'basic_1': -20, 'all': [-1, -2]}}, 'новый канал')
+    assert asyncio.run(catalog.reload_catalog())
+    assert db_manager.has_entitlement(user_id, -20)
+    assert not db_manager.has_entitlement(user_id, -1)
+
+    publish_catalog(config_data, 'возврат')
+    assert asyncio.run(catalog.reload_catalog())
+    assert db_manager.has_entitlement(user_id, -1)
+    assert not db_manager.has_entitlement(user_id, -20)
+
+
+@pytest.mark.skipif(engine.dialect.name != 'postgresql', reason='LISTEN/NOTIFY есть только в PostgreSQL')
+def test_publish_notifies_listeners(db_schema):
+    listener = NotifyListener(CATALOG_CHANNEL)
+    try:
+        assert not listener.wait(0.01)  # Подключение и LISTEN
+        threading.Timer(0.05, publish_catalog, (DATA, 'уведомление')).start()
+        assert listener.wait(5)
+    finally:
+        listener.close()
@@ -0,0 +1,73 @@
+"""Индекс доступа к каналам в памяти бота"""
+import asyncio
+
+from src.database import db_manager
+from src.services.entitlement_index import EntitlementIndex
+
+USER_BASE = 995_000
+
+
+def subscribe(user_id, tariff, number):
+    payment_id = f'PAY_IDX_{user_id}_{number}'
+    db_manager.save_payment(
+        user_id=user_id, username=f'idx{user_id}', tariff=tariff,
+        amount=1900, payment_id=payment_id, method='card'
+    )
+    db_manager.save_subscription(user_id, f'idx{user_id}', tariff, payment_id)
+    return payment_id
+
+
+def new_index():
+    return EntitlementIndex(poll_interval=1, reload_interval=3600, max_delta=1000)
+
+
+def test_index_follows_grants_and_revokes(db_schema):
+    user_id = USER_BASE
+    payment_id = subscribe(user_id, 'Стандарт 1 (30 дней)', 1)  # Каналы -3 и -2
+    index = new_index()
+
+    async def scenario():
+        await index.reload()
+        assert index.lookup(user_id, -2) and index.lookup(user_id, -3)
+        assert not index.lookup(user_id, -1)
+
+        # Отзыв не удаляет строку, а закрывает её - опрос видит изменение
+        db_manager.update_subscription_status(payment_id, 'cancelled')
+        await index.refresh()
+        assert not index.lookup(user_id, -2)
+
+        # Свежая оплата: отрицательный ответ перепроверяется внеочередным опросом
+        subscribe(user_id, 'Базовый 1 (30 дней)', 2)
+        index.refreshed_at = 0
+        assert await index.check(user_id, -1)
+
+    asyncio.run(scenario())
+
+
+def test_warm_index_answers_without_database(db_schema, query_budget):
+    subscribe(USER_BASE + 1, 'VIP 1 (30 дней)', 1)
+    index = new_index()
+
+    async def scenario():
+        await index.reload()
+        with query_budget(0):
+            assert await index.check(USER_BASE + 1, -7)
+            assert not await index.check(USER_BASE + 1, -8)  # Опрос был только что - база не нужна
+
+    asyncio.run(scenario())
+
+
+def test_cold_index_falls_back_to_database(db_schema):
+    subscribe(USER_BASE + 2, 'Базовый 2 (30 дней)', 1)
+    index = new_index()
+    assert not index.ready
+    assert asyncio.run(index.check(USER_BASE + 2, -2))
+
+
+def test_delta_overflow_reloads_snapshot(db_schema):
+    index = EntitlementIndex(poll_interval=1, reload_interval=3600, max_delta=1)
+    asyncio.run(index.reload())
+    subscribe(USER_BASE + 3, 'Стандарт 1 (30 дней)', 1)
+    asyncio.run(index.refresh())
+    assert index.delta == {}
+    assert index.lookup(USER_BASE + 3, -3)
@@ -0,0 +1,96 @@
+"""Доступ к каналам: таблица entitlements и проверка при вступлении"""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from src.database import db_manager
+from src.database.database import get_db
+from src.database.entitlements import rebuild_entitlements
+from src.database.models import Entitlement
+from src.handlers import payments as payment_handlers
+
+USER_BASE = 990_000
+
+
+def subscribe(user_id, tariff, number):
+    payment_id = f'PAY_ENT_{user_id}_{number}'
+    db_manager.save_payment(
+        user_id=user_id, username=f'ent{user_id}', tariff=tariff,
+        amount=1900, payment_id=payment_id, method='card'
+    )
+    db_manager.save_subscription(user_id, f'ent{user_id}', tariff, payment_id)
+    return payment_id
+
+
+def entitlements_of(user_id):
+    with get_db() as db:
+        return dict(db.query(Entitlement.chat_id, Entitlement.valid_until).filter(
+            Entitlement.user_id == user_id
+        ).all())
+
+
+def test_access_is_per_channel_and_follows_subscription(db_schema):
+    user_id = USER_BASE
+    first = subscribe(user_id, 'Базовый 1 (30 дней)', 1)
+    assert db_manager.has_entitlement(user_id, -1)
+    assert not db_manager.has_entitlement(user_id, -7)  # VIP 1
+
+    # Продление сдвигает valid_until той же строки
+    valid_until = entitlements_of(user_id)[-1]
+    second = subscribe(user_id, 'Базовый 1 (30 дней)', 2)
+    assert list(entitlements_of(user_id)) == [-1]
+    assert entitlements_of(user_id)[-1] > valid_until
+
+    # Доступ пропадает, только когда не осталось ни одной подписки
+    db_manager.update_subscription_status(first, 'expired')
+    assert db_manager.has_entitlement(user_id, -1)
+    db_manager.update_subscription_status(second, 'cancelled')
+    assert not db_manager.has_entitlement(user_id, -1)
+
+
+def test_entitlement_check_is_one_primary_key_read(db_schema, query_budget):
+    subscribe(USER_BASE + 1, 'Стандарт 1 (30 дней)', 1)
+    with query_budget(1):
+        assert db_manager.has_entitlement(USER_BASE + 1, -2)
+
+
+def test_rebuild_matches_incremental_state(db_schema):
+    subscribe(USER_BASE + 2, '✅ ВСЕ КАНАЛЫ (Навсегда)', 1)
+
+    def ours():
+        # Бенчмарки наполняют подписки в обход db_manager - сравниваем только свои
+        with get_db() as db:
+            return set(db.query(Entitlement.chat_id, Entitlement.user_id, Entitlement.valid_until).filter(
+                Entitlement.user_id.between(USER_BASE, USER_BASE + 999),
+                Entitlement.valid_until > datetime.utcnow()
+            ).all())
+
+    before = ours()
+    rebuild_entitlements()
+    assert ours() == before
+    assert len(entitlements_of(USER_BASE + 2)) == 11
+
+
+@pytest.mark.parametrize('chat_id, banned', [(-7, False), (-1, True)])
+def test_new_member_is_checked_against_exact_channel(db_schema, monkeypatch, chat_id, banned):
+    user_id = USER_BASE + 3
+    if not entitlements_of(user_id):
+        subscribe(user_id, 'VIP 1 (30 дней)', 1)
+
+    calls = []
+
+    async def record(name, **kwargs):
+        calls.append(name)
+
+    monkeypatch.setattr(payment_handlers, 'bot', SimpleNamespace(
+        ban_chat_member=lambda **kwargs: record('ban', **kwargs),
+        send_message=lambda *args, **kwargs: record('send', **kwargs),
+    ))
+    event = SimpleNamespace(
+        new_chat_member=SimpleNamespace(user=SimpleNamespace(id=user_id)),
+        chat=SimpleNamespace(id=chat_id)
+    )
+    asyncio.run(payment_handlers.handle_new_member(event))
+    assert ('ban' in calls) is banned
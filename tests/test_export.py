@@ -0,0 +1,101 @@
+"""Выгрузка в CSV/Parquet: повторная загрузка миграцией и инкрементальный режим"""
+import csv
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import export_postgres_to_csv as export
+import migrate_csv_to_postgres as migration
+from src.database import db_manager
+from src.database.database import get_db
+from src.database.models import Invite, Payment, Subscription, User
+
+
+@pytest.fixture(scope='module')
+def seeded(db_schema):
+    for i in range(3):
+        db_manager.save_payment(
+            user_id=950_000 + i, username=f'exp{i}', tariff='Базовый 1 (30 дней)',
+            amount=1900, payment_id=f'PAY_EXP_{i}', method='card'
+        )
+        db_manager.save_subscription(950_000 + i, f'exp{i}', 'Базовый 1 (30 дней)', f'PAY_EXP_{i}')
+
+
+def table_counts():
+    with get_db() as db:
+        return {model.__tablename__: db.query(model).count() for model in (User, Payment, Subscription)}
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'parquet'])
+def test_export_reimports_without_duplicates(seeded, tmp_path, file_format):
+    if file_format == 'parquet':
+        pytest.importorskip('pyarrow')
+
+    before = table_counts()
+    results = export.export_all(
+        str(tmp_path / 'backup'), file_format, watermark_path=str(tmp_path / 'wm.json'), batch_size=2
+    )
+    assert {name: results[name] for name in before} == before
+
+    migration.migrate_all(
+        checkpoint_path=str(tmp_path / 'checkpoint.json'),
+        tables=migration.tables_from_dir(str(tmp_path / 'backup'))
+    )
+    assert table_counts() == before
+    assert db_manager.get_payment('PAY_EXP_0')['method'] == 'card'
+
+
+def test_incremental_export_takes_only_changed_rows(seeded, tmp_path):
+    watermarks = str(tmp_path / 'wm.json')
+    export.export_all(str(tmp_path / 'full'), watermark_path=watermarks)
+
+    time.sleep(0.01)
+    db_manager.update_payment_status('PAY_EXP_1', 'completed')
+
+    results = export.export_all(str(tmp_path / 'delta'), incremental=True, watermark_path=watermarks)
+
+    payments = read_csv(tmp_path / 'delta' / 'payments.csv')
+    assert 'PAY_EXP_1' in [row['payment_id'] for row in payments]
+    assert 'PAY_EXP_0' not in [row['payment_id'] for row in payments]
+    # У подписок нет отметки изменения - они выгружаются целиком
+    assert results['subscriptions'] == table_counts()['subscriptions']
+
+
+def invite_rows(chat_id):
+    with get_db() as db:
+        return {
+            invite.invite_link: (invite.user_id, invite.expires_at, invite.assigned_at is not None)
+            for invite in db.query(Invite).filter(Invite.chat_id == chat_id)
+        }
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'parquet'])
+def test_pool_invites_survive_reimport(seeded, tmp_path, file_format):
+    if file_format == 'parquet':
+        pytest.importorskip('pyarrow')
+
+    chat_id = -1009500 - len(file_format)
+    expires_at = datetime.utcnow().replace(microsecond=0) + timedelta(days=7)
+    # Выдаётся ссылка с ближайшим сроком
+    db_manager.add_pool_invites(chat_id, [(f'https://t.me/+free_{file_format}', expires_at),
+                                          (f'https://t.me/+taken_{file_format}', expires_at - timedelta(hours=1))])
+    assert db_manager.assign_pool_invite(950_000, chat_id, datetime.utcnow())
+    before = invite_rows(chat_id)
+    assert before[f'https://t.me/+free_{file_format}'] == (None, expires_at, False)
+    assert before[f'https://t.me/+taken_{file_format}'][0::2] == (950_000, True)
+
+    export.export_all(str(tmp_path / 'backup'), file_format, watermark_path=str(tmp_path / 'wm.json'))
+    with get_db() as db:
+        db.query(Invite).filter(Invite.chat_id == chat_id).delete()
+
+    migration.migrate_all(
+        checkpoint_path=str(tmp_path / 'checkpoint.json'),
+        tables=migration.tables_from_dir(str(tmp_path / 'backup'))
+    )
+    assert invite_rows(chat_id) == before
@@ -0,0 +1,103 @@
+"""Пул заранее созданных инвайт-ссылок"""
+import asyncio
+import itertools
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from aiogram.methods import CreateChatInviteLink, RevokeChatInviteLink
+
+from src.database import db_manager
+from src.database.database import get_db
+from src.database.models import Invite
+from src.handlers import payments as payment_handlers
+from src.services import invite_pool
+from src.services.sender import ThrottledSender
+
+USER_BASE = 997_000
+# Каналы, которых нет в CHANNELS, - чтобы не пересекаться с другими тестами
+POOL_CHAT, STALE_CHAT, EMPTY_CHAT = -900_001, -900_002, -900_003
+
+_links = itertools.count()
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, method):
+        self.calls.append(method)
+        if isinstance(method, CreateChatInviteLink):
+            return SimpleNamespace(invite_link=f'https://t.me/+pool{next(_links)}')
+        return True
+
+    def of(self, method_type):
+        return [call for call in self.calls if isinstance(call, method_type)]
+
+
+def sender(bot):
+    return ThrottledSender(bot, rate=10_000)
+
+
+def free_links(chat_id):
+    with get_db() as db:
+        return db.query(Invite.invite_link).filter(Invite.chat_id == chat_id, Invite.user_id.is_(None)).count()
+
+
+def test_refill_tops_up_only_channels_below_low_water(db_schema):
+    bot = FakeBot()
+    created = asyncio.run(invite_pool.refill_pool(
+        sender(bot), [POOL_CHAT], size=5, low_water=2, ttl=172800, min_validity=86400
+    ))
+    assert created == 5 and free_links(POOL_CHAT) == 5
+
+    # Выше нижней границы пул не трогаем
+    assert asyncio.run(invite_pool.refill_pool(
+        sender(bot), [POOL_CHAT], size=5, low_water=2, ttl=172800, min_validity=86400
+    )) == 0
+    assert len(bot.of(CreateChatInviteLink)) == 5
+    assert all(call.member_limit == 1 for call in bot.of(CreateChatInviteLink))
+
+
+def test_links_are_assigned_once_and_checked_as_invites(db_schema):
+    asyncio.run(invite_pool.refill_pool(
+        sender(FakeBot()), [POOL_CHAT], size=5, low_water=5, ttl=172800, min_validity=86400
+    ))
+    users = [USER_BASE + i for i in range(3)]
+    for user_id in users:
+        db_manager.save_user(user_id, f'pool{user_id}')
+
+    async def assign_all():
+        return await asyncio.gather(*(invite_pool.take_invite(user_id, POOL_CHAT) for user_id in users))
+
+    links = asyncio.run(assign_all())
+    assert all(links) and len(set(links)) == 3
+    assert db_manager.is_valid_invite(users[0], POOL_CHAT, links[0])
+    assert not db_manager.is_valid_invite(users[1], POOL_CHAT, links[0])
+
+
+def test_empty_pool_falls_back_to_new_link(db_schema, monkeypatch):
+    bot = FakeBot()
+    db_manager.save_user(USER_BASE + 10, 'fallback')
+
+    async def create_chat_invite_link(**kwargs):
+        return await bot(CreateChatInviteLink(**kwargs))
+
+    monkeypatch.setattr(payment_handlers, 'bot', SimpleNamespace(create_chat_invite_link=create_chat_invite_link))
+    link = asyncio.run(payment_handlers.generate_invite(USER_BASE + 10, EMPTY_CHAT))
+    assert link.startswith('https://t.me/+pool')
+    assert db_manager.is_valid_invite(USER_BASE + 10, EMPTY_CHAT, link)
+
+
+def test_stale_links_are_revoked_and_removed(db_schema):
+    soon = datetime.utcnow() + timedelta(hours=1)
+    db_manager.add_pool_invites(STALE_CHAT, [('https://t.me/+stale1', soon), ('https://t.me/+stale2', soon)])
+    db_manager.save_user(USER_BASE + 20, 'stale')
+    # Слишком короткий остаток срока: такую ссылку не выдаём
+    assert asyncio.run(invite_pool.take_invite(USER_BASE + 20, STALE_CHAT)) is None
+
+    bot = FakeBot()
+    assert asyncio.run(invite_pool.recycle_pool(sender(bot), min_validity=86400, batch_size=100)) >= 2
+    assert free_links(STALE_CHAT) == 0
+    assert {call.invite_link for call in bot.of(RevokeChatInviteLink)} >= {
+        'https://t.me/+stale1', 'https://t.me/+stale2'
+    }
@@ -0,0 +1,70 @@
+"""Очистка таблицы invites"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from aiogram.methods import RevokeChatInviteLink
+
+from src.database import db_manager
+from src.database.database import get_db
+from src.database.models import Invite, InviteArchive
+from src.services.invite_sweeper import sweep_invites
+from src.services.sender import ThrottledSender
+
+USER_ID = 998_000
+CHAT_ID = -900_101
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, method):
+        self.calls.append(method)
+        return True
+
+
+def add_invite(name, **fields):
+    with get_db() as db:
+        db.add(Invite(user_id=USER_ID, chat_id=CHAT_ID, invite_link=f'https://t.me/+sweep_{name}', **fields))
+
+
+def links(model):
+    with get_db() as db:
+        return {
+            link.rsplit('_', 1)[1]
+            for link, in db.query(model.invite_link).filter(model.chat_id == CHAT_ID)
+        }
+
+
+def test_sweeper_removes_dead_links_and_archives_old_used_ones(db_schema, caplog):
+    now = datetime.utcnow()
+    db_manager.save_user(USER_ID, 'sweep')
+    add_invite('expired', expires_at=now - timedelta(hours=1))
+    add_invite('legacy', created_at=now - timedelta(days=3))  # Срок неизвестен - нужен отзыв
+    add_invite('fresh', expires_at=now + timedelta(hours=5))
+    add_invite('oldused', is_used=True, used_at=now - timedelta(days=120))
+    add_invite('newused', is_used=True, used_at=now - timedelta(days=1))
+    with get_db() as db:
+        # Свободная ссылка пула - её обслуживает invite_pool
+        db.add(Invite(chat_id=CHAT_ID, invite_link='https://t.me/+sweep_pool', expires_at=now - timedelta(hours=1)))
+
+    bot = FakeBot()
+    caplog.set_level(logging.INFO, logger='src.services.invite_sweeper')
+    report = asyncio.run(sweep_invites(
+        ThrottledSender(bot, rate=10_000), legacy_ttl=86400, retention_days=90,
+        archive=True, batch_size=1, revoke_limit=10_000
+    ))
+
+    assert links(Invite) == {'fresh', 'newused', 'pool'}
+    assert links(InviteArchive) == {'oldused'}
+    assert 'https://t.me/+sweep_legacy' in {call.invite_link for call in bot.calls}
+    assert 'https://t.me/+sweep_expired' not in {call.invite_link for call in bot.calls}
+    assert all(isinstance(call, RevokeChatInviteLink) for call in bot.calls)
+
+    assert report['deleted'] >= 2 and report['archived'] >= 1
+    assert report['after']['rows'] <= report['before']['rows'] - 3
+    assert 'ix_invites_is_used' in report['before']['indexes']
+    # Размер файлов после DELETE не уменьшается - отчёт не обещает освобождённого места
+    assert 'dead_rows' in report['after']
+    assert 'освобождается после (auto)VACUUM' in caplog.text
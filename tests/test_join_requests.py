@@ -0,0 +1,85 @@
+"""Пакетная обработка заявок на вступление в каналы"""
+import asyncio
+
+from aiogram.methods import ApproveChatJoinRequest, DeclineChatJoinRequest
+
+from src.database import db_manager
+from src.handlers import join_requests
+from src.services import entitlement_index as index_module
+from src.services.entitlement_index import EntitlementIndex
+from src.services.sender import ThrottledSender
+
+USER_BASE = 996_000
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, method):
+        self.calls.append(method)
+        return True
+
+    def decisions(self):
+        return sorted(
+            (type(call).__name__, call.chat_id, call.user_id) for call in self.calls
+        )
+
+
+def subscribe(user_id, tariff):
+    payment_id = f'PAY_JOIN_{user_id}'
+    db_manager.save_payment(
+        user_id=user_id, username=f'join{user_id}', tariff=tariff,
+        amount=1900, payment_id=payment_id, method='card'
+    )
+    db_manager.save_subscription(user_id, f'join{user_id}', tariff, payment_id)
+
+
+def run_batch(monkeypatch, index, batch):
+    bot = FakeBot()
+    monkeypatch.setattr(join_requests, 'entitlement_index', index)
+    asyncio.run(join_requests.process_batch(ThrottledSender(bot, rate=10_000), batch))
+    return bot.decisions()
+
+
+def test_batch_is_checked_with_one_query_before_index_loads(db_schema, monkeypatch, query_budget):
+    subscribe(USER_BASE, 'Базовый 2 (30 дней)')
+    index = EntitlementIndex(poll_interval=1, reload_interval=3600, max_delta=1000)
+    batch = [(-2, USER_BASE), (-1, USER_BASE), (-2, USER_BASE + 1), (-2, USER_BASE)]
+
+    with query_budget(1):
+        decisions = run_batch(monkeypatch, index, batch)
+
+    assert decisions == [
+        (ApproveChatJoinRequest.__name__, -2, USER_BASE),
+        (DeclineChatJoinRequest.__name__, -2, USER_BASE + 1),
+        (DeclineChatJoinRequest.__name__, -1, USER_BASE),
+    ]
+
+
+def test_warm_index_decides_without_database(db_schema, monkeypatch, query_budget):
+    subscribe(USER_BASE + 2, 'VIP 2 (30 дней)')  # Канал -8
+    index = EntitlementIndex(poll_interval=1, reload_interval=3600, max_delta=1000)
+    asyncio.run(index.reload())
+    monkeypatch.setattr(index_module, 'NEGATIVE_RECHECK_AGE', 3600)
+
+    batch = [(-8, USER_BASE + 2)] + [(-8, USER_BASE + 100 + i) for i in range(50)]
+    with query_budget(0):
+        decisions = run_batch(monkeypatch, index, batch)
+
+    assert decisions.count((ApproveChatJoinRequest.__name__, -8, USER_BASE + 2)) == 1
+    assert sum(name == DeclineChatJoinRequest.__name__ for name, _, _ in decisions) == 50
+
+
+def test_next_batch_collects_up_to_size():
+    async def scenario():
+        queue = asyncio.Queue()
+        for i in range(5):
+            queue.put_nowait((-1, i))
+        first = await join_requests.next_batch(queue, size=3, wait=0.01)
+        rest = await join_requests.next_batch(queue, size=3, wait=0.01)
+        return first, rest
+
+    first, rest = asyncio.run(scenario())
+    assert first == [(-1, 0), (-1, 1), (-1, 2)]
+    assert rest == [(-1, 3), (-1, 4)]
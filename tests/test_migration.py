@@ -0,0 +1,97 @@
+"""Потоковая миграция CSV: пачки, апсерты и продолжение после падения"""
+import csv
+
+import pytest
+
+import migrate_csv_to_postgres as migration
+from src.database.database import get_db
+from src.database.models import Invite, Payment, Subscription, User
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+@pytest.fixture
+def tables(tmp_path, db_schema):
+    """Таблицы миграции, смотрящие на CSV во временной папке"""
+    users = [
+        {'user_id': 900_000 + i, 'username': f'mig{i}', 'registration_date': '2024-01-01 10:00:00',
+         'last_activity': '2024-01-02 10:00:00'}
+        for i in range(25)
+    ]
+    payments = [
+        {'user_id': 900_000 + i, 'payment_id': f'PAY_MIG_{i}', 'external_id': '', 'tariff': 'Базовый 1 (30 дней)',
+         'amount': '1900.0', 'status': 'completed', 'method': 'usdt', 'payment_date': '2024-01-01 10:05:00'}
+        for i in range(25)
+    ]
+    # Плохая строка не должна мешать остальным
+    payments.append({**payments[0], 'payment_id': 'PAY_MIG_BAD', 'amount': 'не число'})
+    subscriptions = [
+        {'user_id': 900_000 + i, 'payment_id': f'PAY_MIG_{i}', 'tariff': 'Базовый 1 (30 дней)',
+         'start_date': '2024-01-01 10:05:00', 'end_date': '2024-01-31 10:05:00', 'status': 'active'}
+        for i in range(25)
+    ]
+    invites = [
+        {'user_id': 900_000 + i, 'chat_id': '-1001', 'invite_link': f'https://t.me/+mig{i}',
+         'is_used': 'False', 'created_at': '2024-01-01 10:06:00'}
+        for i in range(25)
+    ]
+
+    specs = {}
+    for name, rows in (('users', users), ('payments', payments),
+                       ('subscriptions', subscriptions), ('invites', invites)):
+        specs[name] = migration.TABLES[name].with_path(write_csv(tmp_path / f'{name}.csv', rows))
+    return specs
+
+
+def count(model, prefix_column, prefix):
+    with get_db() as db:
+        return db.query(model).filter(prefix_column.like(f'{prefix}%')).count()
+
+
+def test_migration_loads_in_chunks_and_is_idempotent(tables, tmp_path):
+    checkpoint = str(tmp_path / 'checkpoint.json')
+
+    results = migration.migrate_all(chunk_size=10, checkpoint_path=checkpoint, tables=tables)
+    assert results['payments'] == {'loaded': 25, 'skipped': 1}
+
+    # Повторный запуск обновляет записи, а не дублирует их
+    migration.migrate_all(chunk_size=7, checkpoint_path=checkpoint, tables=tables)
+
+    assert count(User, User.username, 'mig') == 25
+    assert count(Payment, Payment.payment_id, 'PAY_MIG_') == 25
+    assert count(Subscription, Subscription.payment_id, 'PAY_MIG_') == 25
+    assert count(Invite, Invite.invite_link, 'https://t.me/+mig') == 25
+
+
+def test_migration_resumes_from_checkpoint(tables, tmp_path, monkeypatch):
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    spec = tables['users']
+    convert = spec.convert
+    seen = []
+
+    def crash_on_third_chunk(row):
+        seen.append(row)
+        if len(seen) == 21:
+            raise RuntimeError('обрыв соединения')
+        return convert(row)
+
+    monkeypatch.setattr(spec, 'convert', crash_on_third_chunk)
+    with pytest.raises(RuntimeError):
+        migration.migrate_table(spec, migration.Checkpoint(checkpoint), chunk_size=10)
+
+    state = migration.Checkpoint(checkpoint)
+    assert state.rows_done(spec) == 20
+
+    # Загружается только остаток файла
+    monkeypatch.setattr(spec, 'convert', convert)
+    assert migration.migrate_table(spec, state, chunk_size=10)['loaded'] == 5
+
+    # Таблица отмечена загруженной - третий запуск её пропускает
+    assert migration.migrate_table(spec, migration.Checkpoint(checkpoint), chunk_size=10)['loaded'] == 0
+    assert count(User, User.username, 'mig') == 25
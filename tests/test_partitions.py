@@ -0,0 +1,90 @@
+"""Секционирование payments (только PostgreSQL)"""
+from datetime import date, datetime
+
+import pytest
+
+import migrate_csv_to_postgres as migration
+from src.database import db_manager
+from src.database.database import engine, get_db
+from src.database.models import Payment
+from src.database import partitions
+
+pytestmark = pytest.mark.skipif(engine.dialect.name != 'postgresql', reason='секции есть только в PostgreSQL')
+
+USER_ID = 996_000
+
+
+def partition_of(payment_id):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql(
+            f"SELECT tableoid::regclass::text FROM payments WHERE payment_id = '{payment_id}'"
+        ).scalar()
+
+
+def test_online_conversion_keeps_orm_and_concurrent_changes(db_schema):
+    db_manager.save_payment(USER_ID, 'part', 'VIP 1', 100, 'PART_old', status='failed')
+    db_manager.save_payment(USER_ID, 'part', 'VIP 1', 100, 'PART_live')
+    with get_db() as db:
+        db.query(Payment).filter(Payment.payment_id == 'PART_old').update({'payment_date': datetime(2021, 3, 5)})
+    with engine.connect() as connection:
+        before = connection.exec_driver_sql("SELECT COUNT(*) FROM payments").scalar()
+
+    partitions.prepare_conversion(months_ahead=2)
+    # Изменения во время переноса доходят через триггер
+    db_manager.update_payment_status('PART_live', 'completed')
+    db_manager.save_payment(USER_ID, 'part', 'VIP 1', 100, 'PART_during')
+    partitions.backfill(batch_size=7)
+
+    # Расхождение находится сверкой до блокировки, таблицы не меняются местами
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DELETE FROM payments_new WHERE payment_id = 'PART_old'")
+    with pytest.raises(RuntimeError, match='2021-03'):
+        partitions.swap()
+    partitions.backfill(batch_size=7)
+    partitions.swap()
+
+    with engine.connect() as connection:
+        assert partitions.is_partitioned(connection)
+        assert connection.exec_driver_sql("SELECT COUNT(*) FROM payments").scalar() == before + 1
+    assert partition_of('PART_old') == 'payments_2021_03'
+    assert db_manager.get_payment('PART_live')['status'] == 'completed'
+
+    # ORM работает как раньше; смена статуса не переносит строку между секциями
+    db_manager.save_payment(USER_ID, 'part', 'VIP 1', 100, 'PART_after')
+    month = partitions.partition_name(date.today().replace(day=1))
+    assert partition_of('PART_after') == month
+    assert db_manager.update_payment_status('PART_after', 'completed')
+    assert partition_of('PART_after') == month
+
+    # Повторный запуск ничего не делает
+    partitions.convert_payments(batch_size=7, months_ahead=2)
+
+
+def test_maintenance_and_archive_of_closed_payments(db_schema):
+    report = partitions.maintain_partitions(months_ahead=4, archive_after_months=0)
+    assert report['default_rows'] == 0
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql(
+            f"SELECT to_regclass('{partitions.partition_name(partitions.add_months(date.today().replace(day=1), 4))}')"
+        ).scalar()
+
+    archived = partitions.archive_closed(date(2021, 4, 1), batch_size=1)
+    assert archived == {'payments_archive.payments_2021_03_closed': 1}
+    assert db_manager.get_payment('PART_old') is None
+
+    # Поздняя отмена старого платежа остаётся в секции месяца и уходит в архив следующим проходом
+    db_manager.save_payment(USER_ID, 'part', 'VIP 1', 100, 'PART_late')
+    with get_db() as db:
+        db.query(Payment).filter(Payment.payment_id == 'PART_late').update({'payment_date': datetime(2021, 3, 9)})
+    assert db_manager.update_payment_status('PART_late', 'cancelled')
+    assert partition_of('PART_late') == 'payments_2021_03'
+    assert partitions.archive_closed(date(2021, 4, 1)) == {'payments_archive.payments_2021_03_closed': 1}
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql(
+            "SELECT payment_id FROM payments_archive.payments_2021_03_closed ORDER BY id"
+        ).scalars().all() == ['PART_old', 'PART_late']
+
+
+def test_csv_migration_refuses_partitioned_payments(db_schema, tmp_path):
+    with pytest.raises(RuntimeError, match='секционирована'):
+        migration.migrate_all(checkpoint_path=str(tmp_path / 'checkpoint.json'))
@@ -0,0 +1,122 @@
+"""Отмена брошенных платежей"""
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.database import db_manager
+from src.database.database import get_db
+from src.database.models import Payment, Subscription
+from src.handlers import payments as payment_handlers
+from src.services import payment_sweeper
+
+USER_ID = 994_000
+
+
+def add_payment(payment_id, method, age_hours, status='pending', external_id=None):
+    db_manager.save_payment(USER_ID, 'stale', 'VIP 1', 100, payment_id, status=status,
+                            method=method, external_id=external_id)
+    with get_db() as db:
+        db.query(Payment).filter(Payment.payment_id == payment_id).update(
+            {'payment_date': datetime.utcnow() - timedelta(hours=age_hours)}
+        )
+
+
+@pytest.fixture
+def channels(monkeypatch):
+    """Выдача ссылок в каналы без Telegram"""
+    monkeypatch.setattr(payment_sweeper, 'BATCH_PAUSE', 0)
+    add_user_to_channels = AsyncMock()
+    monkeypatch.setattr(payment_handlers, 'add_user_to_channels', add_user_to_channels)
+    return add_user_to_channels
+
+
+def test_stale_pending_payments_are_cancelled_per_method(db_schema, channels):
+    add_payment('STALE_card_unpaid', 'card', 2, external_id='ext_unpaid')
+    add_payment('STALE_card_paid', 'card', 2, external_id='ext_paid')
+    add_payment('STALE_card_fresh', 'card', 0.1, external_id='ext_fresh')
+    add_payment('STALE_sbp', 'sbp', 2, external_id='ext_sbp')
+    add_payment('STALE_usdt_old', 'usdt', 30)
+    add_payment('STALE_usdt_young', 'usdt', 2)
+    add_payment('STALE_card_done', 'card', 2, status='completed', external_id='ext_done')
+
+    checked, active, peak = [], 0, 0
+
+    async def check(external_id):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.001)
+        active -= 1
+        checked.append(external_id)
+        return external_id == 'ext_paid'
+
+    report = asyncio.run(payment_sweeper.sweep_pending(
+        {'card': 3600, 'sbp': 3600, 'usdt': 86400}, batch_size=50, concurrency=2, check=check
+    ))
+
+    status = {payment_id: db_manager.get_payment(payment_id)['status'] for payment_id in [
+        'STALE_card_unpaid', 'STALE_card_paid', 'STALE_card_fresh', 'STALE_sbp',
+        'STALE_usdt_old', 'STALE_usdt_young', 'STALE_card_done'
+    ]}
+    assert status == {
+        'STALE_card_unpaid': 'cancelled', 'STALE_card_paid': 'completed', 'STALE_card_fresh': 'pending',
+        'STALE_sbp': 'cancelled', 'STALE_usdt_old': 'cancelled', 'STALE_usdt_young': 'pending',
+        'STALE_card_done': 'completed'
+    }
+    assert report['cancelled'] >= 3 and report['paid'] >= 1
+    # В эквайринг уходят только карта/СБП; USDT без внешних запросов
+    assert {'ext_unpaid', 'ext_paid', 'ext_sbp'} <= set(checked) and 'ext_fresh' not in checked
+    assert peak <= 2
+
+    # Оплаченный подтверждён: подписка и ссылки в каналы, повторно в эквайринг не уходит
+    with get_db() as db:
+        assert db.query(Subscription).filter(Subscription.payment_id == 'STALE_card_paid').count() == 1
+    assert channels.await_args.args[0]['payment_id'] == 'STALE_card_paid'
+    checked.clear()
+    asyncio.run(payment_sweeper.sweep_pending({'card': 3600}, batch_size=50, concurrency=2, check=check))
+    assert 'ext_paid' not in checked
+
+
+def test_acquirer_errors_never_cancel(db_schema, channels):
+    add_payment('STALE_outage_1', 'card', 2, external_id='ext_outage_1')
+    add_payment('STALE_outage_2', 'sbp', 2, external_id='ext_outage_2')
+
+    async def check(external_id):
+        raise TimeoutError('acquirer timeout')
+
+    report = asyncio.run(payment_sweeper.sweep_pending(
+        {'card': 3600, 'sbp': 3600}, batch_size=50, concurrency=2, check=check
+    ))
+    assert report['unknown'] >= 2
+    assert db_manager.get_payment('STALE_outage_1')['status'] == 'pending'
+    assert db_manager.get_payment('STALE_outage_2')['status'] == 'pending'
+    channels.assert_not_awaited()
+
+
+def test_button_after_sweeper_does_not_confirm_twice(db_schema, channels, monkeypatch):
+    add_payment('STALE_race', 'card', 2, external_id='ext_race')
+
+    async def check(external_id):
+        return external_id == 'ext_race'
+
+    asyncio.run(payment_sweeper.sweep_pending({'card': 3600}, batch_size=50, concurrency=2, check=check))
+    assert channels.await_count == 1
+
+    # Пользователь жмёт «Проверить оплату» уже после подтверждения
+    admin = SimpleNamespace(send_message=AsyncMock())
+    monkeypatch.setattr(payment_handlers, 'bot', admin)
+    monkeypatch.setattr(payment_handlers, 'check_payment_in_acquirer', AsyncMock(return_value=True))
+    callback = SimpleNamespace(
+        data='confirm:STALE_race', from_user=SimpleNamespace(id=USER_ID),
+        message=SimpleNamespace(edit_text=AsyncMock()), answer=AsyncMock()
+    )
+    asyncio.run(payment_handlers.confirm_payment(callback))
+
+    with get_db() as db:
+        assert db.query(Subscription).filter(Subscription.payment_id == 'STALE_race').count() == 1
+    assert channels.await_count == 1
+    admin.send_message.assert_not_awaited()
+    assert 'Оплата подтверждена' in callback.message.edit_text.await_args.kwargs['text']
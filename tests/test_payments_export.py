@@ -0,0 +1,59 @@
+"""Потоковая выгрузка платежей /api/payments/export"""
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.main import app
+from src.api.routes import payments as payments_route
+from src.database import db_manager
+
+METHODS = ['card', 'sbp', 'usdt']
+
+
+@pytest.fixture(scope='module')
+def client(db_schema):
+    for i in range(6):
+        db_manager.save_payment(
+            user_id=970_000 + i, username=f'pe{i}', tariff='VIP 1 (30 дней)',
+            amount=25235, payment_id=f'PAY_PEXP_{i}', method=METHODS[i % 3]
+        )
+    db_manager.update_payment_status('PAY_PEXP_0', 'completed')
+    db_manager.update_payment_status('PAY_PEXP_3', 'completed')
+    return TestClient(app)
+
+
+def ours(rows):
+    return [row for row in rows if row['payment_id'].startswith('PAY_PEXP_')]
+
+
+def test_ndjson_export_applies_filters_across_batches(client, monkeypatch):
+    monkeypatch.setattr(payments_route, 'EXPORT_BATCH_SIZE', 2)
+    response = client.get('/api/payments/export', params={'method': 'card'})
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row['payment_id'] for row in ours(rows)] == ['PAY_PEXP_0', 'PAY_PEXP_3']
+    assert {row['method'] for row in rows} == {'card'}
+
+    completed = client.get('/api/payments/export', params={
+        'status': 'completed', 'method': 'card', 'date_from': date.today().isoformat()
+    })
+    assert ours(json.loads(line) for line in completed.text.splitlines())[0]['status'] == 'completed'
+
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    assert client.get('/api/payments/export', params={'date_from': tomorrow}).text == ''
+
+
+def test_csv_export_has_header_and_all_rows(client):
+    response = client.get('/api/payments/export', params={'format': 'csv', 'status': 'pending'})
+    assert response.status_code == 200
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert list(rows[0]) == payments_route.EXPORT_FIELDS
+    assert [row['payment_id'] for row in ours(rows)] == ['PAY_PEXP_1', 'PAY_PEXP_2', 'PAY_PEXP_4', 'PAY_PEXP_5']
+    assert client.get('/api/payments/export', params={'status': 'unknown'}).status_code == 422
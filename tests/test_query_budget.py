@@ -0,0 +1,49 @@
+"""Бюджет SQL-запросов для горячих функций db_manager и API"""
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.main import app
+from src.database import db_manager
+
+
+@pytest.fixture(scope='module')
+def seeded(db_schema):
+    """Пользователь с несколькими платежами и подписками"""
+    for i in range(5):
+        db_manager.save_payment(
+            user_id=700 + i, username=f'user{i}', tariff='Базовый 1 (30 дней)',
+            amount=1900, payment_id=f'PAY_QB_{i}', method='usdt'
+        )
+        db_manager.save_subscription(700 + i, f'user{i}', 'Базовый 1 (30 дней)', f'PAY_QB_{i}')
+
+
+def test_get_payment_single_query(seeded, query_budget):
+    with query_budget(1, 'get_payment'):
+        payment = db_manager.get_payment('PAY_QB_0')
+    assert payment['username'] == 'user0'
+
+
+def test_get_active_subscription_single_query(seeded, query_budget):
+    with query_budget(1, 'get_active_subscription'):
+        subscription = db_manager.get_active_subscription(701)
+    assert subscription['username'] == 'user1'
+
+
+def test_get_all_active_subscriptions_no_n_plus_one(seeded, query_budget):
+    with query_budget(1, 'get_all_active_subscriptions'):
+        subscriptions = db_manager.get_all_active_subscriptions()
+    assert len(subscriptions) >= 5
+
+
+def test_api_user_detail_counts_without_loading_collections(seeded, query_budget):
+    client = TestClient(app)
+    with query_budget(3, 'GET /api/users/{id}'):
+        response = client.get('/api/users/702')
+    assert response.json()['stats'] == {'payments': 1, 'subscriptions': 1}
+
+
+def test_api_payment_detail_single_query(seeded, query_budget):
+    client = TestClient(app)
+    with query_budget(1, 'GET /api/payments/{id}'):
+        response = client.get('/api/payments/PAY_QB_3')
+    assert response.json()['username'] == 'user3'
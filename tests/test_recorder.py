@@ -0,0 +1,46 @@
+"""Обезличивание записанных апдейтов"""
+from src.middlewares.recorder import UpdateAnonymizer
+
+USER_ID = 123456789
+
+
+def test_user_ids_are_pseudonymized_everywhere():
+    anonymizer = UpdateAnonymizer('salt')
+    update = {
+        'update_id': 1,
+        'chat_join_request': {
+            'chat': {'id': -1001, 'type': 'channel', 'title': 'VIP'},
+            'from': {'id': USER_ID, 'is_bot': False, 'first_name': 'Иван', 'username': 'ivan'},
+            'user_chat_id': USER_ID,
+            'date': 1700000000,
+            'invite_link': {'invite_link': 'https://t.me/+secret', 'creator': {'id': 1, 'is_bot': True}},
+        },
+    }
+    request = anonymizer.anonymize(update)['chat_join_request']
+
+    pseudonym = anonymizer.user_id(USER_ID)
+    assert pseudonym != USER_ID
+    assert request['from'] == {'id': pseudonym, 'is_bot': False, 'first_name': 'User'}
+    assert request['user_chat_id'] == pseudonym
+    assert request['chat']['id'] == -1001
+    assert request['invite_link'] == {'invite_link': 'https://t.me/+anonymized'}
+    assert str(USER_ID) not in repr(request)
+
+
+def test_command_arguments_and_plain_text_are_dropped():
+    anonymizer = UpdateAnonymizer('salt')
+    message = {
+        'message_id': 5,
+        'chat': {'id': USER_ID, 'type': 'private'},
+        'text': '/start ref_ivan_42',
+        'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6},
+                     {'type': 'mention', 'offset': 7, 'length': 11}],
+    }
+    result = anonymizer.anonymize(message)
+    assert result['text'] == '/start'
+    assert result['entities'] == [{'type': 'bot_command', 'offset': 0, 'length': 6}]
+    assert result['chat']['id'] == anonymizer.user_id(USER_ID)
+
+    assert anonymizer.anonymize({'text': 'мой телефон 8-900-000-00-00'})['text'] == ''
+    assert anonymizer.anonymize({'data': f'check:PAY_{USER_ID}_1700000000'})['data'] == \
+        f'check:PAY_{anonymizer.user_id(USER_ID)}_1700000000'
@@ -0,0 +1,136 @@
+"""Лента истекающих подписок и напоминания о продлении"""
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+from fastapi.testclient import TestClient
+
+from src.api.main import app
+from src.api.routes import subscriptions as subscriptions_route
+from src.database import db_manager
+from src.database.database import get_db
+from src.database.models import Subscription
+from src.services import scheduler
+from src.services.sender import FAILED, SENT, THROTTLED, ThrottledSender
+
+USER_BASE = 960_000
+
+
+class FakeBot:
+    """Bot, который записывает сообщения и может ответить заданными ошибками"""
+
+    def __init__(self, errors=None):
+        self.sent = []
+        self.errors = errors or {}
+
+    async def __call__(self, method):
+        errors = self.errors.get(method.chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((method.chat_id, method.reply_markup))
+
+
+def flood_wait(retry_after=0):
+    return TelegramRetryAfter(SendMessage(chat_id=0, text=''), 'Too Many Requests', retry_after)
+
+
+@pytest.fixture(scope='module')
+def expiring(db_schema):
+    """Пять подписок, истекающих через 1..5 дней"""
+    user_ids = []
+    for i in range(5):
+        user_id = USER_BASE + i
+        payment_id = f'PAY_REM_{i}'
+        db_manager.save_payment(
+            user_id=user_id, username=f'rem{i}', tariff='Базовый 1 (30 дней)',
+            amount=1900, payment_id=payment_id, method='card'
+        )
+        db_manager.save_subscription(user_id, f'rem{i}', 'Базовый 1 (30 дней)', payment_id)
+        with get_db() as db:
+            db.query(Subscription).filter(Subscription.payment_id == payment_id).update(
+                {'end_date': datetime.utcnow() + timedelta(days=i + 1, minutes=-1)}
+            )
+        user_ids.append(user_id)
+    return user_ids
+
+
+def test_expiring_feed_streams_window_in_order(expiring, monkeypatch):
+    monkeypatch.setattr(subscriptions_route, 'EXPIRING_PAGE_SIZE', 2)
+    response = TestClient(app).get('/api/subscriptions/expiring', params={'days': 3})
+    assert response.status_code == 200
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    ours = [row['user_id'] for row in rows if row['user_id'] in expiring]
+    assert ours == expiring[:3]
+    assert [row['end_date'] for row in rows] == sorted(row['end_date'] for row in rows)
+
+
+def test_reminders_are_sent_once_with_renew_button(expiring):
+    bot = FakeBot(errors={
+        expiring[0]: [flood_wait()],  # Повтор после flood wait
+        expiring[1]: [TelegramForbiddenError(SendMessage(chat_id=0, text=''), 'bot was blocked')],
+    })
+    sender = ThrottledSender(bot, rate=10_000)
+
+    results = asyncio.run(scheduler.send_renewal_reminders(sender, days_before=3, batch_size=2))
+    assert results[FAILED] >= 1
+    sent = {chat_id: markup for chat_id, markup in bot.sent}
+    assert expiring[0] in sent and expiring[2] in sent
+    assert expiring[1] not in sent and expiring[3] not in sent
+    assert sent[expiring[0]].inline_keyboard[0][0].callback_data == 'pay:basic_1:30_days'
+
+    # Повторный проход ничего не шлёт - ни доставленным, ни заблокировавшим бота
+    bot.sent.clear()
+    asyncio.run(scheduler.send_renewal_reminders(sender, days_before=3))
+    assert not {chat_id for chat_id, _ in bot.sent} & set(expiring[:3])
+
+
+def test_reminder_released_when_flood_wait_persists(expiring):
+    bot = FakeBot(errors={expiring[3]: [flood_wait() for _ in range(10)]})
+    sender = ThrottledSender(bot, rate=10_000, max_retries=2)
+
+    results = asyncio.run(scheduler.send_renewal_reminders(sender, days_before=4))
+    assert results[THROTTLED] == 1
+
+    # Отметка снята - напоминание уйдёт в следующий проход
+    bot.errors.clear()
+    results = asyncio.run(scheduler.send_renewal_reminders(sender, days_before=4))
+    assert results[SENT] >= 1
+    assert expiring[3] in [chat_id for chat_id, _ in bot.sent]
+
+
+def test_renewed_subscription_gets_no_reminder(db_schema):
+    user_id = USER_BASE + 10
+    for i, days in enumerate((2, 32)):
+        payment_id = f'PAY_REM_RENEW_{i}'
+        db_manager.save_payment(
+            user_id=user_id, username='renewed', tariff='Базовый 1 (30 дней)',
+            amount=1900, payment_id=payment_id, method='card'
+        )
+        db_manager.save_subscription(user_id, 'renewed', 'Базовый 1 (30 дней)', payment_id)
+        with get_db() as db:
+            db.query(Subscription).filter(Subscription.payment_id == payment_id).update(
+                {'end_date': datetime.utcnow() + timedelta(days=days)}
+            )
+
+    bot = FakeBot()
+    asyncio.run(scheduler.send_renewal_reminders(ThrottledSender(bot, rate=10_000), days_before=3))
+    assert user_id not in [chat_id for chat_id, _ in bot.sent]
+
+
+def test_flood_wait_pauses_every_caller():
+    bot = FakeBot(errors={1: [flood_wait(retry_after=1)]})
+    shared = ThrottledSender(bot, rate=10_000, max_retries=0)
+    reminders, join_requests = shared.limited(10_000), shared.limited(10_000)
+
+    async def run():
+        assert await reminders.send_message(1, 'flood') == THROTTLED
+        started = time.monotonic()
+        assert await join_requests.send_message(2, 'after') == SENT
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.9
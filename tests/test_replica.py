@@ -0,0 +1,56 @@
+"""Маршрутизация чтения на реплику и защита от её отставания"""
+import pytest
+
+from src.database import database
+
+
+@pytest.fixture
+def guard(monkeypatch):
+    guard = database.ReplicaLagGuard(max_lag=10, check_interval=60)
+    monkeypatch.setattr(database, 'replica_guard', guard)
+    monkeypatch.setattr(database, 'ReplicaSessionLocal', 'replica')
+    return guard
+
+
+def test_read_only_goes_to_primary_without_replica(monkeypatch):
+    monkeypatch.setattr(database, 'ReplicaSessionLocal', None)
+    assert database._session_factory(read_only=True) is database.SessionLocal
+
+
+def test_writes_never_go_to_replica(guard, monkeypatch):
+    monkeypatch.setattr(guard, 'measure_lag', lambda: 0.0)
+    assert database._session_factory(read_only=False) is database.SessionLocal
+    assert database._session_factory(read_only=True) == 'replica'
+
+
+def test_lagging_replica_falls_back_and_lag_is_cached(guard, monkeypatch):
+    calls = []
+
+    def measure_lag():
+        calls.append(1)
+        return 42.0
+
+    monkeypatch.setattr(guard, 'measure_lag', measure_lag)
+    assert database._session_factory(read_only=True) is database.SessionLocal
+    assert database._session_factory(read_only=True) is database.SessionLocal
+    assert len(calls) == 1
+
+
+def test_unreachable_replica_falls_back(guard, monkeypatch):
+    def measure_lag():
+        raise ConnectionError('replica down')
+
+    monkeypatch.setattr(guard, 'measure_lag', measure_lag)
+    assert database._session_factory(read_only=True) is database.SessionLocal
+    assert guard.lag is None
+
+
+def test_usdt_payment_check_reads_primary(db_schema, guard, monkeypatch):
+    from src.database import db_manager
+
+    def replica_session():
+        raise AssertionError('проверка оплаты не должна читать реплику')
+
+    monkeypatch.setattr(guard, 'measure_lag', lambda: 0.0)
+    monkeypatch.setattr(database, 'ReplicaSessionLocal', replica_session)
+    assert db_manager.find_usdt_transfer('PAY_REPLICA_1', 'TAddress', 1) is None
@@ -0,0 +1,34 @@
+"""Быстрый запуск init_db по отпечатку схемы"""
+from src.database import database
+from src.database.models import SchemaVersion
+
+
+def stored_versions():
+    with database.get_engine().connect() as connection:
+        return connection.execute(SchemaVersion.__table__.select()).scalars().all()
+
+
+def test_current_schema_skips_upgrade(db_schema, monkeypatch):
+    def upgrade_schema():
+        raise AssertionError('схема уже актуальна')
+
+    monkeypatch.setattr(database, 'upgrade_schema', upgrade_schema)
+    database.init_db()
+    assert stored_versions() == [database.schema_version(database.get_engine().dialect)]
+
+
+def test_changed_models_run_upgrade_and_store_version(db_schema, monkeypatch):
+    calls = []
+    upgrade_schema = database.upgrade_schema
+    monkeypatch.setattr(database, 'upgrade_schema', lambda: calls.append(1) or upgrade_schema())
+    monkeypatch.setattr(database, 'schema_version', lambda dialect: 'changed')
+
+    database.init_db()
+    database.init_db()
+    assert calls == [1]
+    assert stored_versions() == ['changed']
+
+    # Возврат к версии текущих моделей для остальных тестов
+    monkeypatch.undo()
+    database.init_db()
+    assert stored_versions() == [database.schema_version(database.get_engine().dialect)]
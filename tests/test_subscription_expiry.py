@@ -0,0 +1,71 @@
+"""Периодическое истечение закончившихся подписок"""
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from src.database import db_manager, rollups
+from src.database.database import get_db
+from src.database.models import CohortActivity, Entitlement, Subscription, SubscriptionStatus
+from src.services import scheduler
+
+TARIFF = 'Базовый 1 (30 дней)'
+USER_BASE = 963_000
+
+
+def subscribe(user_id: int, payment_id: str, end_date: datetime):
+    db_manager.save_payment(user_id, f'exp{user_id}', TARIFF, 1900, payment_id, method='card')
+    db_manager.save_subscription(user_id, f'exp{user_id}', TARIFF, payment_id)
+    with get_db() as db:
+        db.query(Subscription).filter(Subscription.payment_id == payment_id).update({'end_date': end_date})
+
+
+def churned_this_month() -> int:
+    with get_db() as db:
+        return db.query(CohortActivity.churned).filter(
+            CohortActivity.cohort_month == rollups.month_start(datetime.utcnow()),
+            CohortActivity.period == 0
+        ).scalar() or 0
+
+
+def test_ended_subscriptions_expire_without_any_event(db_schema, monkeypatch):
+    monkeypatch.setattr(scheduler, 'EXPIRY_BATCH_PAUSE', 0)
+    lapsed, renewed = USER_BASE, USER_BASE + 1
+    now = datetime.utcnow()
+
+    subscribe(lapsed, 'PAY_END_0', now + timedelta(days=1))
+    subscribe(renewed, 'PAY_END_1', now + timedelta(days=1))
+    subscribe(renewed, 'PAY_END_2', now + timedelta(days=31))
+    # Закончившиеся подписки других тестов не должны попасть в подсчёт
+    asyncio.run(scheduler.expire_subscriptions())
+    churned_before = churned_this_month()
+
+    # Проходит время: первые подписки закончились, больше ничего не происходит
+    with get_db() as db:
+        db.query(Subscription).filter(Subscription.payment_id.in_(['PAY_END_0', 'PAY_END_1'])).update(
+            {'end_date': now - timedelta(minutes=1)}, synchronize_session=False
+        )
+
+    report = asyncio.run(scheduler.expire_subscriptions(batch_size=1))
+    assert report == {'expired': 2, 'churned': 1}
+    assert churned_this_month() - churned_before == 1
+
+    with get_db() as db:
+        statuses = dict(db.query(Subscription.payment_id, Subscription.status).filter(
+            Subscription.payment_id.in_(['PAY_END_0', 'PAY_END_1', 'PAY_END_2'])
+        ).all())
+        access = dict(db.query(Entitlement.user_id, func.max(Entitlement.valid_until)).filter(
+            Entitlement.user_id.in_([lapsed, renewed])
+        ).group_by(Entitlement.user_id).all())
+
+    assert statuses == {
+        'PAY_END_0': SubscriptionStatus.EXPIRED,
+        'PAY_END_1': SubscriptionStatus.EXPIRED,
+        'PAY_END_2': SubscriptionStatus.ACTIVE
+    }
+    assert access[lapsed] <= datetime.utcnow()
+    assert access[renewed] > now + timedelta(days=30)
+
+    # Повторный проход ничего не находит
+    assert asyncio.run(scheduler.expire_subscriptions()) == {}
+
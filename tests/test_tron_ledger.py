@@ -0,0 +1,64 @@
+"""Журнал переводов USDT из TronGrid"""
+import asyncio
+
+from loadtest.fake_bot_api import FakeBotApiState, start_server
+from src.database.database import get_db
+from src.database.db_manager import search_transfers
+from src.database.models import CryptoTransfer
+from src.services.tron_ledger import TronLedger
+
+ADDRESS = 'TLedgerTestAddress'
+
+
+def ledger(base_url, page_size=50):
+    return TronLedger(ADDRESS, base_url, None, page_size, lookback=86400, overlap=300, min_interval=0)
+
+
+def transfers_count():
+    with get_db() as db:
+        return db.query(CryptoTransfer).filter(CryptoTransfer.payment_id.like('PAY_993%')).count()
+
+
+def test_all_pages_are_loaded_once_and_checked_locally(db_schema):
+    async def scenario():
+        state = FakeBotApiState()
+        runner, base_url = await start_server(state)
+        try:
+            # Больше прежнего окна в 20 переводов и нескольких страниц
+            for i in range(130):
+                state.mark_paid(f'PAY_993{i:03d}_1', amount_usdt=10)
+            tron = ledger(base_url)
+            await tron.sync()
+            await tron.sync()
+            oldest = await tron.find('PAY_993000_1', 10)
+            too_much = await tron.find('PAY_993001_1', 20)
+            missing = await tron.find('PAY_993999_1', 10)
+            return state.calls, oldest, too_much, missing
+        finally:
+            await runner.cleanup()
+
+    calls, oldest, too_much, missing = asyncio.run(scenario())
+    assert oldest == 'tx_PAY_993000_1'
+    assert too_much is None and missing is None
+    assert transfers_count() == 130  # Повторная загрузка не создаёт дублей
+    assert search_transfers(payment_id='PAY_993000_1')[0]['amount'] == 10
+
+
+def test_unconfirmed_transfer_counts_after_confirmation(db_schema):
+    async def scenario():
+        state = FakeBotApiState()
+        runner, base_url = await start_server(state)
+        try:
+            tron = ledger(base_url)
+            state.mark_paid('PAY_993500_1', amount_usdt=5, confirmed=False)
+            before = await tron.find('PAY_993500_1', 5)
+            state.confirm('PAY_993500_1')
+            after = await tron.find('PAY_993500_1', 5)
+            return before, after
+        finally:
+            await runner.cleanup()
+
+    before, after = asyncio.run(scenario())
+    assert before is None and after == 'tx_PAY_993500_1'
+    [transfer] = search_transfers(payment_id='PAY_993500_1')
+    assert transfer['confirmed'] and transfer['confirmed_at'] is not None